@@ -2,8 +2,23 @@ from django.contrib import admin
 from .models import (
     User, PartnerProfile, Category, Activity, Profile,
     Notification, Destination, DestinationImage, Review,
-    Wallet, Booking, AIRecommendation
+    Wallet, WalletTransaction, Booking, AIRecommendation, Job
 )
+from .changelists import LargeTableAdmin
+from .search import get_backend
+from .tasks import mark_notifications_read, update_bookings
+
+# Rows handed to each background job queued by a bulk action.
+ACTION_JOB_SIZE = 1000
+
+
+def _queue(task, queryset, *args):
+    """Queue `task` over the selected rows in jobs of ACTION_JOB_SIZE ids. Returns the number of rows."""
+    ids = list(queryset.order_by('pk').values_list('pk', flat=True))
+    for offset in range(0, len(ids), ACTION_JOB_SIZE):
+        task.delay(ids[offset:offset + ACTION_JOB_SIZE], *args)
+    return len(ids)
+
 
 @admin.register(User)
 class UserAdmin(admin.ModelAdmin):
@@ -40,17 +55,21 @@ class ProfileAdmin(admin.ModelAdmin):
 
 
 @admin.register(Notification)
-class NotificationAdmin(admin.ModelAdmin):
+class NotificationAdmin(LargeTableAdmin):
     list_display = ('user', 'message', 'created_at', 'is_read')
     list_filter = ('is_read', 'created_at')
     search_fields = ('user__username', 'message')
+    list_select_related = ('user',)
+    autocomplete_fields = ('user',)
+    # Rows are inserted in created_at order, so the primary key pages them without another index.
+    cursor_field = 'id'
 
     # Action to mark notifications as read
     actions = ['mark_as_read']
 
     def mark_as_read(self, request, queryset):
-        updated = queryset.update(is_read=True)
-        self.message_user(request, f"{updated} notifications marked as read.")
+        queued = _queue(mark_notifications_read, queryset)
+        self.message_user(request, f"{queued} notifications queued to be marked as read.")
     mark_as_read.short_description = "Mark selected notifications as read"
 
 
@@ -61,6 +80,13 @@ class DestinationAdmin(admin.ModelAdmin):
     search_fields = ('name', 'location')
     ordering = ('name',)
 
+    def get_search_results(self, request, queryset, search_term):
+        # Use the full-text index instead of LIKE '%term%' scans.
+        if not search_term:
+            return queryset, False
+        hits = get_backend().search(search_term, limit=1000)
+        return queryset.filter(pk__in=[hit.destination_id for hit in hits]), False
+
 
 @admin.register(DestinationImage)
 class DestinationImageAdmin(admin.ModelAdmin):
@@ -69,10 +95,13 @@ class DestinationImageAdmin(admin.ModelAdmin):
 
 
 @admin.register(Review)
-class ReviewAdmin(admin.ModelAdmin):
+class ReviewAdmin(LargeTableAdmin):
     list_display = ('user', 'destination', 'rating', 'created_at')
     list_filter = ('rating', 'created_at')
     search_fields = ('user__username', 'destination__name')
+    list_select_related = ('user', 'destination')
+    autocomplete_fields = ('user', 'destination')
+    cursor_field = 'created_at'
 
 
 @admin.register(Wallet)
@@ -80,36 +109,64 @@ class WalletAdmin(admin.ModelAdmin):
     list_display = ('user', 'balance')
     search_fields = ('user__username',)
 
+@admin.register(WalletTransaction)
+class WalletTransactionAdmin(admin.ModelAdmin):
+    list_display = ('wallet', 'kind', 'amount', 'balance_after', 'booking', 'created_at')
+    list_filter = ('kind',)
+    search_fields = ('wallet__user__username',)
+
+    # The ledger is append-only.
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
 @admin.register(Booking)
-class BookingAdmin(admin.ModelAdmin):
+class BookingAdmin(LargeTableAdmin):
     list_display = (
         'user', 'destination', 'booking_date', 'status',
         'total_price', 'payment_status', 'payment_method'
     )
     list_filter = ('status', 'payment_status', 'payment_method', 'booking_date')
     search_fields = ('user__username', 'destination__name')
+    list_select_related = ('user', 'destination')
+    autocomplete_fields = ('user', 'destination')
+    cursor_field = 'booking_date'
 
-    # Custom actions to change booking status
+    # Custom actions to change booking status. They run as background jobs
+    # (tasks.update_bookings), which batch the calendar, rollup and
+    # notification side effects that queryset.update() would skip.
     actions = ['mark_as_confirmed', 'mark_as_canceled', 'mark_as_paid']
 
     def mark_as_confirmed(self, request, queryset):
-        updated = queryset.update(status='confirmed')
-        self.message_user(request, f"{updated} bookings marked as confirmed.")
+        queued = _queue(update_bookings, queryset, 'confirm')
+        self.message_user(request, f"{queued} bookings queued to be marked as confirmed.")
     mark_as_confirmed.short_description = "Mark selected bookings as confirmed"
 
     def mark_as_canceled(self, request, queryset):
-        updated = queryset.update(status='canceled')
-        self.message_user(request, f"{updated} bookings marked as canceled.")
+        queued = _queue(update_bookings, queryset, 'cancel')
+        self.message_user(request, f"{queued} bookings queued to be marked as canceled.")
     mark_as_canceled.short_description = "Mark selected bookings as canceled"
 
     def mark_as_paid(self, request, queryset):
-        updated = queryset.update(payment_status='paid')
-        self.message_user(request, f"{updated} bookings marked as paid.")
+        queued = _queue(update_bookings, queryset, 'pay')
+        self.message_user(request, f"{queued} bookings queued to be marked as paid.")
     mark_as_paid.short_description = "Mark selected bookings as paid"
 
 
 @admin.register(AIRecommendation)
-class AIRecommendationAdmin(admin.ModelAdmin):
+class AIRecommendationAdmin(LargeTableAdmin):
     list_display = ('user', 'recommended_destination', 'score', 'created_at')
     list_filter = ('created_at',)
     search_fields = ('user__username', 'recommended_destination__name')
+    list_select_related = ('user', 'recommended_destination')
+    autocomplete_fields = ('user', 'recommended_destination')
+    cursor_field = 'id'
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('task', 'status', 'attempts', 'run_at', 'created_at', 'finished_at')
+    list_filter = ('status', 'task')
+    search_fields = ('task', 'idempotency_key')
@@ -0,0 +1,364 @@
+"""
+Partner analytics from pre-aggregated rollups.
+
+DestinationStats and PartnerStats hold one row of counters per destination
+(or partner) and day: bookings by status, guests, paid revenue by payment
+method, and reviews. A booking counts on the day it was made, a review on
+the day it was written; canceled bookings count as canceled only, and
+revenue is the total price of paid, non-canceled bookings.
+
+The rows are maintained incrementally: Booking.save() and the Review
+signals apply the difference a change makes with F() updates, like the
+rating aggregates. Paths that bypass them (queryset.update() in admin
+actions, bulk imports) call refresh() for the days they touched.
+
+`compact()` runs nightly. It recomputes the last RECONCILE_DAYS days from
+the source tables, correcting any drift, and folds daily rows older than
+DAILY_RETENTION_DAYS into one row per month. The dashboard only reads daily
+rows of its window plus the few monthly rows, so it costs the same
+whatever the size of the Booking and Review tables.
+"""
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from functools import reduce
+from operator import add
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import TruncDate, TruncMonth
+from django.utils import timezone
+
+from .models import Booking, Destination, DestinationStats, PartnerStats, Review
+
+STATUSES = [status for status, _ in Booking.STATUS_CHOICES]
+PAYMENT_METHODS = [method for method, _ in Booking.PAYMENT_METHOD_CHOICES]
+BOOKING_COUNTERS = [f'bookings_{status}' for status in STATUSES] + ['guests'] + [
+    f'revenue_{method}' for method in PAYMENT_METHODS
+]
+REVIEW_COUNTERS = ['review_count', 'rating_sum']
+COUNTERS = BOOKING_COUNTERS + REVIEW_COUNTERS
+
+# Windows the dashboard offers, in days.
+WINDOWS = (7, 30, 90, 365)
+# Destinations listed on the dashboard, by revenue over the window.
+TOP_DESTINATIONS = 20
+DAILY_RETENTION_DAYS = getattr(settings, 'ANALYTICS_DAILY_RETENTION_DAYS', 400)
+RECONCILE_DAYS = getattr(settings, 'ANALYTICS_RECONCILE_DAYS', 3)
+
+
+def _local_day(value):
+    return timezone.localdate(value) if isinstance(value, datetime) else value
+
+
+def _month(day):
+    return day.replace(day=1)
+
+
+def _day_bounds(start, end):
+    """Aware datetimes bounding the local days start..end, end exclusive."""
+    tz = timezone.get_current_timezone()
+    return (
+        timezone.make_aware(datetime.combine(start, time.min), tz),
+        timezone.make_aware(datetime.combine(end + timedelta(days=1), time.min), tz),
+    )
+
+
+# Incremental updates
+
+def booking_counters(values):
+    """The counters a booking adds to its day, from a dict of Booking.ROLLUP_FIELDS."""
+    counters = {f"bookings_{values['status']}": 1}
+    if values['status'] != 'canceled':
+        counters['guests'] = values['guests']
+        if values['payment_status'] == 'paid':
+            counters[f"revenue_{values['payment_method']}"] = values['total_price']
+    return counters
+
+
+def record_booking(previous, current, create=True):
+    """
+    Apply a booking change to the rollups. `previous` is None for a new
+    booking, `current` None for a deleted one. A snapshot with deferred
+    (None) fields cannot be subtracted, so its day is recomputed instead.
+    """
+    record_bookings([(previous, current)], create=create)
+
+
+def record_bookings(changes, create=True):
+    """record_booking() for many (previous, current) pairs, with one update per row touched."""
+    deltas = defaultdict(lambda: defaultdict(int))
+    stale = set()
+    for previous, current in changes:
+        for values, sign in ((previous, -1), (current, 1)):
+            if values is None:
+                continue
+            if None in values.values():
+                if values.get('destination_id') and values.get('booking_date'):
+                    stale.add((values['destination_id'], _local_day(values['booking_date'])))
+                continue
+            key = (values['destination_id'], _local_day(values['booking_date']))
+            for name, value in booking_counters(values).items():
+                deltas[key][name] += sign * value
+    apply_deltas(deltas, create=create)
+    for destination_id, day in stale:
+        refresh([destination_id], day, day)
+
+
+def record_review(previous, current, create=True):
+    """Apply a review change; both are (destination_id, created_at, rating) or None."""
+    deltas = defaultdict(lambda: defaultdict(int))
+    for values, sign in ((previous, -1), (current, 1)):
+        if values is None:
+            continue
+        destination_id, created_at, rating = values
+        key = (destination_id, _local_day(created_at or timezone.now()))
+        deltas[key]['review_count'] += sign
+        deltas[key]['rating_sum'] += sign * rating
+    apply_deltas(deltas, create=create)
+
+
+def apply_deltas(deltas, create=True):
+    """
+    Add {(destination_id, day): {counter: delta}} to the destination and
+    partner rows. With create=False no row is inserted: a day without a
+    daily row is applied to its monthly row instead. Deletions cascading
+    from a destination or user use that, as rows inserted while the delete
+    runs would not be collected with it.
+    """
+    deltas = {
+        key: {name: value for name, value in counters.items() if value}
+        for key, counters in deltas.items()
+    }
+    deltas = {key: counters for key, counters in deltas.items() if counters}
+    if not deltas:
+        return
+    partners = dict(
+        Destination.objects.filter(pk__in={pk for pk, _ in deltas}).values_list('pk', 'partner_id')
+    )
+    partner_deltas = defaultdict(lambda: defaultdict(int))
+    for (destination_id, day), counters in deltas.items():
+        if destination_id in partners:
+            for name, value in counters.items():
+                partner_deltas[partners[destination_id], day][name] += value
+
+    with transaction.atomic():
+        _add(DestinationStats, 'destination_id', deltas, create=create)
+        _add(PartnerStats, 'partner_id', partner_deltas, create=create)
+
+
+def _update(model, key_field, key, period, day, counters):
+    return model.objects.filter(**{key_field: key}, period=period, day=day).update(
+        **{name: F(name) + value for name, value in counters.items()}
+    )
+
+
+def _add(model, key_field, deltas, period='day', create=True):
+    missing = [
+        (key, day) for (key, day), counters in deltas.items()
+        if not _update(model, key_field, key, period, day, counters)
+    ]
+    if not missing:
+        return
+    if not create:
+        for key, day in missing:
+            _update(model, key_field, key, 'month', _month(day), deltas[key, day])
+        return
+    # Insert empty rows, then add: a concurrent insert of the same row is not lost.
+    model.objects.bulk_create(
+        [model(**{key_field: key}, period=period, day=day) for key, day in missing], ignore_conflicts=True,
+    )
+    for key, day in missing:
+        _update(model, key_field, key, period, day, deltas[key, day])
+
+
+# Recomputation from the source tables
+
+def _booking_totals(bookings):
+    live = ~Q(status='canceled')
+    return bookings.annotate(day=TruncDate('booking_date')).values('destination_id', 'day').annotate(
+        **{f'bookings_{status}': Count('id', filter=Q(status=status)) for status in STATUSES},
+        guests=Sum('guests', filter=live, default=0),
+        **{
+            f'revenue_{method}': Sum(
+                'total_price', filter=live & Q(payment_status='paid', payment_method=method), default=Decimal(0),
+            )
+            for method in PAYMENT_METHODS
+        },
+    ).order_by()
+
+
+def _review_totals(reviews):
+    return reviews.annotate(day=TruncDate('created_at')).values('destination_id', 'day').annotate(
+        review_count=Count('id'), rating_sum=Sum('rating', default=0),
+    ).order_by()
+
+
+@transaction.atomic
+def refresh(destination_ids=None, start=None, end=None):
+    """
+    Recompute the daily rows of `destination_ids` (all destinations when
+    None) for the days start..end, and the partner rows of those days.
+    Returns the number of destination rows written.
+    """
+    end = end or timezone.localdate()
+    start = start or end
+    lower, upper = _day_bounds(start, end)
+    bookings = Booking.objects.filter(booking_date__gte=lower, booking_date__lt=upper)
+    reviews = Review.objects.filter(created_at__gte=lower, created_at__lt=upper)
+    stats = DestinationStats.objects.filter(period='day', day__range=(start, end))
+    if destination_ids is not None:
+        destination_ids = list(destination_ids)
+        bookings = bookings.filter(destination_id__in=destination_ids)
+        reviews = reviews.filter(destination_id__in=destination_ids)
+        stats = stats.filter(destination_id__in=destination_ids)
+
+    rows = defaultdict(dict)
+    for totals in (_booking_totals(bookings), _review_totals(reviews)):
+        for row in totals:
+            rows[row.pop('destination_id'), row.pop('day')].update(row)
+
+    partner_ids = set(stats.values_list('destination__partner_id', flat=True).distinct())
+    stats.delete()
+    DestinationStats.objects.bulk_create(
+        [DestinationStats(destination_id=destination_id, day=day, **counters)
+         for (destination_id, day), counters in rows.items()],
+        batch_size=1000,
+    )
+
+    # Partner rows are the sum of their destinations' rows.
+    partner_ids |= set(
+        Destination.objects.filter(pk__in={pk for pk, _ in rows}).values_list('partner_id', flat=True)
+    )
+    if destination_ids is None:
+        PartnerStats.objects.filter(period='day', day__range=(start, end)).delete()
+    else:
+        PartnerStats.objects.filter(period='day', day__range=(start, end), partner_id__in=partner_ids).delete()
+    partner_rows = DestinationStats.objects.filter(
+        period='day', day__range=(start, end), destination__partner_id__in=partner_ids,
+    ).values('destination__partner_id', 'day').annotate(**{name: Sum(name) for name in COUNTERS}).order_by()
+    PartnerStats.objects.bulk_create(
+        [PartnerStats(partner_id=row.pop('destination__partner_id'), **row) for row in partner_rows],
+        batch_size=1000,
+    )
+    return len(rows)
+
+
+def refresh_bookings(bookings):
+    """Recompute the days of `bookings` (a queryset), after a queryset.update() on them."""
+    days = defaultdict(set)
+    for destination_id, booked_at in bookings.values_list('destination_id', 'booking_date').iterator():
+        days[timezone.localdate(booked_at)].add(destination_id)
+    for day, destination_ids in days.items():
+        refresh(destination_ids, day, day)
+
+
+# Compaction
+
+def compact(today=None, retention_days=DAILY_RETENTION_DAYS, reconcile_days=RECONCILE_DAYS, batch_size=1000):
+    """
+    Reconcile the recent days and fold old daily rows into monthly ones.
+    Returns (days reconciled, daily rows folded).
+    """
+    today = today or timezone.localdate()
+    if reconcile_days:
+        refresh(start=today - timedelta(days=reconcile_days - 1), end=today)
+
+    # Whole months only, so a month row never misses some of its days.
+    cutoff = _month(today - timedelta(days=retention_days))
+    folded = 0
+    for model, key_field in ((DestinationStats, 'destination_id'), (PartnerStats, 'partner_id')):
+        old = model.objects.filter(period='day', day__lt=cutoff)
+        while True:
+            keys = list(old.order_by(key_field).values_list(key_field, flat=True).distinct()[:batch_size])
+            if not keys:
+                break
+            with transaction.atomic():
+                rows = old.filter(**{f'{key_field}__in': keys}).annotate(month=TruncMonth('day')).values(
+                    key_field, 'month',
+                ).annotate(**{name: Sum(name) for name in COUNTERS}).order_by()
+                _add(model, key_field, {
+                    (row.pop(key_field), _local_day(row.pop('month'))): row for row in rows
+                }, period='month')
+                folded += old.filter(**{f'{key_field}__in': keys}).delete()[0]
+    return reconcile_days, folded
+
+
+# Reading
+
+def _totals(rows):
+    totals = {name: 0 for name in COUNTERS}
+    for row in rows:
+        for name in COUNTERS:
+            totals[name] += row[name] or 0
+    return _describe(totals)
+
+
+def _describe(counters):
+    bookings = sum(counters[f'bookings_{status}'] for status in STATUSES)
+    revenue = sum((Decimal(counters[f'revenue_{method}']) for method in PAYMENT_METHODS), Decimal(0))
+    return {
+        'bookings': bookings,
+        'bookings_by_status': {status: counters[f'bookings_{status}'] for status in STATUSES},
+        'guests': counters['guests'],
+        'revenue': revenue,
+        'revenue_by_payment_method': {method: Decimal(counters[f'revenue_{method}']) for method in PAYMENT_METHODS},
+        'reviews': counters['review_count'],
+        'rating_avg': round(counters['rating_sum'] / counters['review_count'], 2) if counters['review_count'] else None,
+    }
+
+
+def partner_summary(partner_id, days=30, today=None):
+    """
+    Bookings, revenue and reviews of a partner over the last `days` days:
+    totals, one entry per day, the TOP_DESTINATIONS destinations with the
+    most revenue, and all-time totals. Reads at most `days` partner rows,
+    the window's rows of the partner's active destinations and the
+    partner's monthly rows, however long the history.
+    """
+    today = today or timezone.localdate()
+    start = today - timedelta(days=days - 1)
+    rows = list(PartnerStats.objects.filter(
+        partner_id=partner_id, period='day', day__range=(start, today),
+    ).values('day', *COUNTERS))
+    by_day = {row['day']: row for row in rows}
+    empty = {name: 0 for name in COUNTERS}
+    daily = []
+    for offset in range(days):
+        day = start + timedelta(days=offset)
+        counters = _describe(by_day.get(day, empty))
+        daily.append({'day': day, 'bookings': counters['bookings'], 'revenue': counters['revenue'],
+                      'reviews': counters['reviews']})
+
+    revenue = reduce(add, (F(f'revenue_{method}') for method in PAYMENT_METHODS))
+    bookings = reduce(add, (F(f'bookings_{status}') for status in STATUSES))
+    top = DestinationStats.objects.filter(
+        destination__partner_id=partner_id, period='day', day__range=(start, today),
+    ).values('destination_id').annotate(
+        **{name: Sum(name) for name in COUNTERS},
+    ).annotate(window_revenue=revenue, window_bookings=bookings).order_by('-window_revenue', '-window_bookings', 'destination_id')[:TOP_DESTINATIONS]
+    top = {row.pop('destination_id'): row for row in top}
+    names = Destination.objects.filter(pk__in=top).only('id', 'name', 'rating_avg', 'rating_count').in_bulk()
+    destinations = []
+    for destination_id, row in top.items():
+        destination = names[destination_id]
+        counters = _describe(row)
+        counters.update({
+            'id': destination.pk, 'name': destination.name,
+            'lifetime_rating_avg': round(destination.rating_avg, 2), 'lifetime_reviews': destination.rating_count,
+        })
+        destinations.append(counters)
+
+    lifetime = PartnerStats.objects.filter(partner_id=partner_id).aggregate(
+        **{name: Sum(name, default=0) for name in COUNTERS}
+    )
+    return {
+        'days': days,
+        'start': start,
+        'end': today,
+        'totals': _totals(rows),
+        'daily': daily,
+        'destinations': destinations,
+        'lifetime': _describe(lifetime),
+    }
@@ -0,0 +1,143 @@
+from ..models import Activity, Booking, Category, Destination, Review
+
+
+class Field:
+    """
+    One output field. `source` is an attribute name or a callable taking the
+    object. `select_related`/`prefetch_related` name the relations the field
+    reads, so the queryset only loads what the requested fields need.
+    """
+
+    def __init__(self, source, select_related=(), prefetch_related=()):
+        self.source = source
+        self.select_related = tuple(select_related)
+        self.prefetch_related = tuple(prefetch_related)
+
+    def get(self, obj):
+        if callable(self.source):
+            return self.source(obj)
+        return getattr(obj, self.source)
+
+
+def _isoformat(value):
+    return value.isoformat() if value is not None else None
+
+
+class Serializer:
+    model = None
+    fields = {}
+
+    def __init__(self, requested=None):
+        """`requested` is the list from ?fields=; unknown names raise KeyError."""
+        if requested:
+            unknown = [name for name in requested if name not in self.fields]
+            if unknown:
+                raise KeyError(', '.join(unknown))
+            self.selected = [name for name in self.fields if name in requested]
+        else:
+            self.selected = list(self.fields)
+        # Resolve the field objects once instead of per row.
+        self._getters = [(name, self.fields[name].get) for name in self.selected]
+
+    def queryset(self, queryset=None):
+        queryset = self.model.objects.all() if queryset is None else queryset
+        select, prefetch = [], []
+        for name in self.selected:
+            select.extend(self.fields[name].select_related)
+            prefetch.extend(self.fields[name].prefetch_related)
+        if select:
+            queryset = queryset.select_related(*dict.fromkeys(select))
+        if prefetch:
+            queryset = queryset.prefetch_related(*dict.fromkeys(prefetch))
+        return queryset
+
+    def serialize(self, obj):
+        return {name: getter(obj) for name, getter in self._getters}
+
+    def serialize_many(self, objects):
+        return [self.serialize(obj) for obj in objects]
+
+
+class CategorySerializer(Serializer):
+    model = Category
+    fields = {
+        'id': Field('pk'),
+        'name': Field('name'),
+        'description': Field('description'),
+        'updated_at': Field(lambda c: _isoformat(c.updated_at)),
+    }
+
+
+class ActivitySerializer(Serializer):
+    model = Activity
+    fields = {
+        'id': Field('pk'),
+        'name': Field('name'),
+        'category': Field('category_id'),
+        'description': Field('description'),
+        'rating': Field(lambda a: str(a.rating)),
+        'updated_at': Field(lambda a: _isoformat(a.updated_at)),
+    }
+
+
+class DestinationSerializer(Serializer):
+    model = Destination
+    fields = {
+        'id': Field('pk'),
+        'name': Field('name'),
+        'description': Field('description'),
+        'location': Field('location'),
+        'coordinates': Field(
+            lambda d: {'latitude': d.latitude, 'longitude': d.longitude} if d.latitude is not None else None,
+        ),
+        'price': Field(lambda d: str(d.price)),
+        'daily_capacity': Field('daily_capacity'),
+        'rating': Field(lambda d: {
+            'average': round(d.rating_avg, 2),
+            'count': d.rating_count,
+            'histogram': d.rating_histogram(),
+        }),
+        'partner': Field(lambda d: {'id': d.partner_id, 'username': d.partner.username}, select_related=['partner']),
+        'categories': Field(
+            lambda d: [{'id': c.pk, 'name': c.name} for c in d.categories.all()],
+            prefetch_related=['categories'],
+        ),
+        'images': Field(lambda d: [i.image.url for i in d.images.all()], prefetch_related=['images']),
+        'responsive_images': Field(
+            lambda d: [i.responsive.as_dict() for i in d.images.all()], prefetch_related=['images'],
+        ),
+        'created_at': Field(lambda d: _isoformat(d.created_at)),
+        'updated_at': Field(lambda d: _isoformat(d.updated_at)),
+    }
+
+
+class ReviewSerializer(Serializer):
+    model = Review
+    fields = {
+        'id': Field('pk'),
+        'destination': Field('destination_id'),
+        'user': Field(lambda r: r.user.username, select_related=['user']),
+        'rating': Field('rating'),
+        'content': Field('content'),
+        'created_at': Field(lambda r: _isoformat(r.created_at)),
+        'updated_at': Field(lambda r: _isoformat(r.updated_at)),
+    }
+
+
+class BookingSerializer(Serializer):
+    model = Booking
+    fields = {
+        'id': Field('pk'),
+        'destination': Field(
+            lambda b: {'id': b.destination_id, 'name': b.destination.name}, select_related=['destination']
+        ),
+        'booking_date': Field(lambda b: _isoformat(b.booking_date)),
+        'start_date': Field(lambda b: _isoformat(b.start_date)),
+        'end_date': Field(lambda b: _isoformat(b.end_date)),
+        'guests': Field('guests'),
+        'status': Field('status'),
+        'total_price': Field(lambda b: str(b.total_price)),
+        'payment_method': Field('payment_method'),
+        'payment_status': Field('payment_status'),
+        'updated_at': Field(lambda b: _isoformat(b.updated_at)),
+    }
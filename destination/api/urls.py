@@ -0,0 +1,19 @@
+from django.urls import path
+
+from . import views
+
+app_name = 'api'
+
+urlpatterns = [
+    path('destinations/', views.destination_list, name='destination-list'),
+    path('destinations/nearby/', views.destination_nearby, name='destination-nearby'),
+    path('destinations/bbox/', views.destination_bbox, name='destination-bbox'),
+    path('destinations/<int:pk>/', views.destination_detail, name='destination-detail'),
+    path('destinations/<int:destination_pk>/reviews/', views.review_list, name='destination-reviews'),
+    path('categories/', views.category_list, name='category-list'),
+    path('activities/', views.activity_list, name='activity-list'),
+    path('reviews/', views.review_list, name='review-list'),
+    path('bookings/', views.booking_list, name='booking-list'),
+    path('bookings/<int:pk>/', views.booking_detail, name='booking-detail'),
+    path('partner/stats/', views.partner_stats, name='partner-stats'),
+]
@@ -0,0 +1,237 @@
+import hashlib
+import json
+
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+from django.shortcuts import aget_object_or_404
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from django.views.decorators.http import require_GET
+
+from .. import analytics, geo
+from ..forms import BoundingBoxForm, DestinationFilterForm, NearbyForm
+from ..models import Activity, Booking, Category, Destination, Review
+from ..pagination import InvalidCursor, KeysetPaginator
+from ..routers import read_from_replica
+from .serializers import (
+    ActivitySerializer, BookingSerializer, CategorySerializer, DestinationSerializer, ReviewSerializer,
+)
+
+API_VERSION = 'v1'
+DEFAULT_PAGE_SIZE = 20
+
+
+def _error(message, status=400):
+    return JsonResponse({'error': message}, status=status)
+
+
+def _serializer(request, serializer_class):
+    requested = [name.strip() for name in request.GET.get('fields', '').split(',') if name.strip()]
+    return serializer_class(requested)
+
+
+def _page_size(request):
+    try:
+        return int(request.GET.get('page_size', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        raise ValueError("page_size must be an integer.")
+
+
+def _validators(serializer, versions, extra=None):
+    """
+    Strong ETag and Last-Modified timestamp for a representation made of the
+    rows in `versions` ((pk, updated_at) pairs) rendered with the selected
+    fields. Both are known before the rows themselves are loaded.
+    """
+    raw = json.dumps(
+        [API_VERSION, serializer.selected, [(pk, updated_at.isoformat()) for pk, updated_at in versions], extra],
+        separators=(',', ':'),
+    )
+    etag = '"%s"' % hashlib.sha1(raw.encode()).hexdigest()
+    last_modified = max((updated_at for _, updated_at in versions), default=None)
+    return etag, int(last_modified.timestamp()) if last_modified else None
+
+
+def _finish(response, etag, last_modified):
+    response.headers['ETag'] = etag
+    if last_modified is not None:
+        response.headers['Last-Modified'] = http_date(last_modified)
+    # Clients may store responses but must revalidate them every time.
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+async def _list(request, queryset, serializer_class, field):
+    """
+    Keyset-paginated list with conditional GET support. A narrow query reads
+    only (pk, cursor field, updated_at) for the page; when the client already
+    has that version the response is a 304 and nothing else is loaded.
+    Otherwise the page rows are fetched once with just the relations the
+    requested fields need.
+
+    Lists carry an ETag only. Their newest updated_at does not change when a
+    row is deleted or leaves the filter, and Last-Modified has one-second
+    resolution, so If-Modified-Since could answer 304 for a changed page.
+    """
+    try:
+        serializer = _serializer(request, serializer_class)
+    except KeyError as exc:
+        return _error(f"Unknown fields: {exc.args[0]}")
+    try:
+        paginator = KeysetPaginator(queryset.only('pk', field, 'updated_at'), _page_size(request), field=field)
+        page = await paginator.aget_page(request.GET.get('cursor'))
+    except (ValueError, InvalidCursor) as exc:
+        return _error(str(exc))
+
+    versions = [(obj.pk, obj.updated_at) for obj in page]
+    etag, _ = _validators(serializer, versions, page.next_cursor)
+    response = get_conditional_response(request, etag=etag)
+    if response is not None:
+        return _finish(response, etag, None)
+
+    objects = await serializer.queryset().ain_bulk([pk for pk, _ in versions])
+    response = JsonResponse({
+        'results': serializer.serialize_many(objects[pk] for pk, _ in versions if pk in objects),
+        'next_cursor': page.next_cursor,
+    })
+    return _finish(response, etag, None)
+
+
+async def _detail(request, queryset, serializer_class, pk):
+    try:
+        serializer = _serializer(request, serializer_class)
+    except KeyError as exc:
+        return _error(f"Unknown fields: {exc.args[0]}")
+    updated_at = await aget_object_or_404(queryset.values_list('updated_at', flat=True), pk=pk)
+    etag, last_modified = _validators(serializer, [(pk, updated_at)])
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is not None:
+        return _finish(response, etag, last_modified)
+    obj = await serializer.queryset(queryset).aget(pk=pk)
+    return _finish(JsonResponse(serializer.serialize(obj)), etag, last_modified)
+
+
+@require_GET
+@read_from_replica
+async def destination_list(request):
+    form = DestinationFilterForm(request.GET)
+    if not form.is_valid():
+        return JsonResponse({'errors': form.errors}, status=400)
+    return await _list(request, form.filter(Destination.objects.all()), DestinationSerializer, 'created_at')
+
+
+@require_GET
+@read_from_replica
+async def destination_detail(request, pk):
+    return await _detail(request, Destination.objects.all(), DestinationSerializer, pk)
+
+
+async def _located(request, find, *args, limit=None):
+    """
+    Destinations found by `find` (a geo query taking *args, `limit` and
+    `queryset`), nearest first, each with its distance_km.
+    """
+    try:
+        serializer = _serializer(request, DestinationSerializer)
+    except KeyError as exc:
+        return _error(f"Unknown fields: {exc.args[0]}")
+    # The spatial backends use raw cursors, which the async ORM does not cover.
+    results = await sync_to_async(find)(
+        *args, limit=limit or DEFAULT_PAGE_SIZE, queryset=serializer.queryset(),
+    )
+    return JsonResponse({'results': [
+        {**serializer.serialize(result.destination), 'distance_km': round(result.distance_km, 3)}
+        for result in results
+    ]})
+
+
+@require_GET
+async def destination_nearby(request):
+    """Destinations within ?radius= km (default 25) of ?lat=&lng=, nearest first."""
+    form = NearbyForm(request.GET)
+    if not form.is_valid():
+        return JsonResponse({'errors': form.errors}, status=400)
+    data = form.cleaned_data
+    return await _located(
+        request, geo.nearby_destinations, data['lat'], data['lng'], data['radius'] or NearbyForm.DEFAULT_RADIUS,
+        limit=data['limit'],
+    )
+
+
+@require_GET
+async def destination_bbox(request):
+    """
+    Destinations inside ?bbox=west,south,east,north, nearest first to
+    ?lat=&lng= when given, to the centre of the box otherwise.
+    """
+    form = BoundingBoxForm(request.GET)
+    if not form.is_valid():
+        return JsonResponse({'errors': form.errors}, status=400)
+    data = form.cleaned_data
+    origin = (data['lat'], data['lng']) if data.get('lat') is not None else None
+
+    def find(box, limit, queryset):
+        return geo.destinations_in_box(box, limit=limit, origin=origin, queryset=queryset)
+    return await _located(request, find, data['bbox'], limit=data['limit'])
+
+
+@require_GET
+@read_from_replica
+async def category_list(request):
+    return await _list(request, Category.objects.all(), CategorySerializer, 'id')
+
+
+@require_GET
+@read_from_replica
+async def activity_list(request):
+    activities = Activity.objects.all()
+    if request.GET.get('category', '').isdigit():
+        activities = activities.filter(category_id=request.GET['category'])
+    return await _list(request, activities, ActivitySerializer, 'id')
+
+
+@require_GET
+@read_from_replica
+async def review_list(request, destination_pk=None):
+    reviews = Review.objects.all()
+    destination = destination_pk or request.GET.get('destination')
+    if destination:
+        if not str(destination).isdigit():
+            return _error("destination must be an id.")
+        reviews = reviews.filter(destination_id=destination)
+    return await _list(request, reviews, ReviewSerializer, 'created_at')
+
+
+@require_GET
+async def booking_list(request):
+    user = await request.auser()
+    if not user.is_authenticated:
+        return _error("Authentication required.", status=401)
+    return await _list(request, Booking.objects.filter(user=user), BookingSerializer, 'booking_date')
+
+
+@require_GET
+async def booking_detail(request, pk):
+    user = await request.auser()
+    if not user.is_authenticated:
+        return _error("Authentication required.", status=401)
+    return await _detail(request, Booking.objects.filter(user=user), BookingSerializer, pk)
+
+
+@require_GET
+async def partner_stats(request):
+    """The partner's analytics over the last ?days= days (one of analytics.WINDOWS), from the rollups."""
+    user = await request.auser()
+    if not user.is_authenticated:
+        return _error("Authentication required.", status=401)
+    if not user.is_partner():
+        return _error("Only partners have statistics.", status=403)
+    try:
+        days = int(request.GET.get('days', 30))
+    except ValueError:
+        return _error("days must be an integer.")
+    if days not in analytics.WINDOWS:
+        return _error(f"days must be one of {', '.join(map(str, analytics.WINDOWS))}.")
+    response = JsonResponse(await sync_to_async(analytics.partner_summary)(user.pk, days))
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
@@ -0,0 +1,62 @@
+"""
+Authentication without a database query per request.
+
+Sessions use the cached_db backend, so a request reads its session from
+the cache, and CachedModelBackend loads `request.user` from the cache too.
+The cached user comes with its profile, wallet and partner profile, so
+`request.user.wallet` costs no query either. The entry is deleted when any
+of those rows changes, and again when that transaction commits (see
+destination/signals.py and Wallet._record()). USER_CACHE_TIMEOUT bounds
+how long a change made some other way can stay unseen.
+"""
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+from django.db import transaction
+
+USER_CACHE_TIMEOUT = getattr(settings, 'USER_CACHE_TIMEOUT', 300)
+# Reverse one-to-one relations loaded (and cached) with the user
+USER_RELATED = ('profile', 'wallet', 'partner_profile')
+
+
+def _user_key(user_id):
+    return f'user:{user_id}'
+
+
+def _users():
+    return get_user_model()._default_manager.select_related(*USER_RELATED)
+
+
+def get_cached_user(user_id):
+    """The user with its USER_RELATED rows, from the cache when possible. None if there is no such user."""
+    key = _user_key(user_id)
+    user = cache.get(key)
+    if user is None:
+        user = _users().filter(pk=user_id).first()
+        if user is not None:
+            cache.set(key, user, USER_CACHE_TIMEOUT)
+    return user
+
+
+def invalidate_user(*user_ids):
+    """
+    Drop the cached users now and again once the current transaction
+    commits, so that a request that read the old rows in the meantime
+    cannot leave them cached.
+    """
+    keys = [_user_key(user_id) for user_id in user_ids if user_id is not None]
+    if keys:
+        cache.delete_many(keys)
+        transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+class CachedModelBackend(ModelBackend):
+    """
+    ModelBackend whose get_user(), the lookup behind request.user and
+    request.auser(), reads the user cache.
+    """
+
+    def get_user(self, user_id):
+        user = get_cached_user(user_id)
+        return user if user is not None and self.user_can_authenticate(user) else None
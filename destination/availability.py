@@ -0,0 +1,74 @@
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Booking, Destination, DestinationAvailability
+
+
+def available_destinations(start_date, end_date, slots=1, queryset=None):
+    """
+    Destinations with at least `slots` free places on every day from
+    start_date to end_date (inclusive).
+
+    Days nobody has booked yet have no calendar row and are free up to the
+    destination's daily capacity, so only the (indexed) calendar rows in the
+    date range that are too full need to be looked at.
+    """
+    if queryset is None:
+        queryset = Destination.objects.all()
+    full = DestinationAvailability.objects.filter(
+        date__range=(start_date, end_date),
+        capacity__isnull=False,
+        capacity__lt=F('booked') + slots,
+    ).values('destination_id')
+    return queryset.filter(
+        Q(daily_capacity__isnull=True) | Q(daily_capacity__gte=slots)
+    ).exclude(pk__in=full)
+
+
+def destination_calendar(destination, start_date, end_date):
+    """
+    Free places per day for one destination, as a list of (date, free)
+    pairs. `free` is None when the destination has unlimited capacity.
+    """
+    rows = {
+        row.date: row
+        for row in DestinationAvailability.objects.filter(
+            destination=destination, date__range=(start_date, end_date)
+        )
+    }
+    calendar = []
+    for day in DestinationAvailability.days(start_date, end_date):
+        row = rows.get(day)
+        calendar.append((day, row.free if row else destination.daily_capacity))
+    return calendar
+
+
+@transaction.atomic
+def rebuild_calendar(from_date=None, batch_size=1000):
+    """
+    Recompute the calendar from the bookings, for `from_date` (default:
+    today) and after; earlier days are left as they are. Returns the number
+    of calendar rows written.
+    """
+    from_date = from_date or timezone.localdate()
+    bookings = Booking.objects.exclude(status='canceled').filter(end_date__gte=from_date).values_list(
+        'destination_id', 'start_date', 'end_date', 'guests',
+    )
+    counts = Counter()
+    for destination_id, start_date, end_date, guests in bookings.iterator(chunk_size=batch_size):
+        for day in DestinationAvailability.days(max(start_date, from_date), end_date):
+            counts[destination_id, day] += guests
+    capacities = dict(Destination.objects.values_list('pk', 'daily_capacity'))
+    DestinationAvailability.objects.filter(date__gte=from_date).delete()
+    DestinationAvailability.objects.bulk_create(
+        [
+            DestinationAvailability(destination_id=destination_id, date=day, booked=booked,
+                                    capacity=capacities[destination_id])
+            for (destination_id, day), booked in counts.items()
+        ],
+        batch_size=batch_size,
+    )
+    return len(counts)
@@ -0,0 +1,865 @@
+"""
+Synthetic data and a URL benchmark.
+
+`seed` fills the database with realistic volume: customers and partners
+with their profiles and wallets, destinations with categories and images,
+reviews, bookings (and the availability calendar they occupy) and
+notifications (and the inboxes counting them). Rows are written with
+bulk_create in batches, so signals do not fire; the denormalized data they
+maintain (rating aggregates, search index, inboxes, calendar) is rebuilt
+in bulk at the end. Every row hangs off a user whose username starts with
+BENCH_PREFIX, which is how `clear` finds them again.
+
+Seed a dedicated database rather than a real one:
+
+    DATABASE_URL=sqlite:////tmp/bench.sqlite3 python manage.py migrate
+    DATABASE_URL=sqlite:////tmp/bench.sqlite3 python manage.py seed_bench --scale 10
+
+`run_benchmark` requests every URL of destination/urls.py through the test
+client, one request at a time, and records the latency percentiles and the
+queries per request of each. `compare` checks the results against a
+stored baseline (see `manage.py benchmark`).
+
+`run_template_benchmark` renders every template with the context its view
+gives it and reports render times with and without the cached loader and
+fragment caching, and the memory a render allocates (see
+`manage.py bench_templates`).
+
+`MICROBENCHMARKS` time single operations in isolation, in nanoseconds per
+call (see `manage.py microbench`).
+"""
+import itertools
+import locale
+import platform
+import random
+import statistics
+import time
+import timeit
+from datetime import datetime, timedelta
+from decimal import Decimal
+from io import BytesIO
+from pathlib import Path
+
+import django
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from django.db.models import Count, Max, Q
+from django.test import Client, override_settings
+from django.urls import URLResolver, reverse
+from django.utils import timezone
+
+from . import analytics
+from .caching import bump_generation
+from .geo import Gazetteer, default_gazetteer_path
+from .models import (
+    Activity, Booking, Category, Destination, DestinationAvailability, DestinationImage, Notification,
+    NotificationInbox, PartnerProfile, Profile, Review, User, Wallet,
+)
+from .profiling import capture
+from .search import rebuild_index
+from .tasks import rebuild_rating_aggregates
+
+BENCH_PREFIX = 'bench-'
+BENCH_PASSWORD = 'bench'
+
+# Rows per unit of --scale. Scale 100 gives 2M notifications, 1M reviews.
+COUNTS = {
+    'customers': 1000,
+    'partners': 20,
+    'destinations': 1000,
+    'images': 2000,
+    'reviews': 10000,
+    'bookings': 5000,
+    'notifications': 20000,
+}
+
+CATEGORIES = {
+    'Nature': ['Hiking', 'Bird watching', 'Waterfalls'],
+    'Wildlife': ['Safari', 'Primate tracking', 'Boat safari'],
+    'Beach': ['Swimming', 'Kayaking', 'Sunset cruise'],
+    'Culture': ['Drumming show', 'Village visit', 'Craft market'],
+    'History': ['Museum tour', 'Monument visit'],
+    'Food': ['Coffee farm tour', 'Cooking class', 'Street food walk'],
+    'Adventure': ['Rafting', 'Climbing', 'Mountain biking'],
+    'Wellness': ['Hot springs', 'Yoga retreat'],
+}
+PLACES = [
+    'Bujumbura', 'Gitega', 'Ngozi', 'Rumonge', 'Kayanza', 'Muramvya', 'Bururi', 'Makamba',
+    'Cibitoke', 'Kirundo', 'Muyinga', 'Rutana', 'Karuzi', 'Cankuzo', 'Bubanza', 'Mwaro',
+]
+SIGHTS = [
+    'Lake', 'Falls', 'Forest', 'Hills', 'Beach', 'Park', 'Reserve', 'Springs',
+    'Gorge', 'Market', 'Museum', 'Sanctuary', 'Valley', 'Plantation',
+]
+WORDS = (
+    'beautiful quiet friendly guide view lake sunset trip family price clean food '
+    'early morning boat walk river village coffee drums music hike easy long worth'
+).split()
+NOTIFICATION_MESSAGES = [
+    "Your booking for {name} has been confirmed.",
+    "Your booking for {name} has been successfully paid and confirmed!",
+    "New dates are available at {name}.",
+    "{name} has a new review.",
+]
+IMAGE_SOURCES = 8
+
+
+def scaled_counts(scale=1, **overrides):
+    counts = {name: int(count * scale) for name, count in COUNTS.items()}
+    counts.update({name: value for name, value in overrides.items() if value is not None})
+    return counts
+
+
+def has_bench_data():
+    return User.objects.filter(username__startswith=BENCH_PREFIX).exists()
+
+
+def clear(batch_size=500):
+    """Delete every bench user and, by cascade, everything that belongs to them."""
+    users = User.objects.filter(username__startswith=BENCH_PREFIX).order_by('pk')
+    deleted = 0
+    # In chunks, so the delete collector never holds millions of rows.
+    while True:
+        chunk = list(users.values_list('pk', flat=True)[:batch_size])
+        if not chunk:
+            break
+        deleted += User.objects.filter(pk__in=chunk).delete()[0]
+    bump_generation('destinations', 'categories')
+    return deleted
+
+
+def _insert(model, rows, batch_size):
+    count = 0
+    rows = iter(rows)
+    while batch := list(itertools.islice(rows, batch_size)):
+        model.objects.bulk_create(batch, batch_size=batch_size)
+        count += len(batch)
+    return count
+
+
+def _skewed(rng, items):
+    # Earlier items are picked more often, like popular destinations and
+    # active users; the first item is about √n times as likely as average.
+    return items[int(len(items) * rng.random() ** 2)]
+
+
+def _source_images(rng):
+    """A few small JPEGs shared by every bench image row."""
+    from PIL import Image
+
+    names = []
+    for number in range(IMAGE_SOURCES):
+        name = f'destination_images/{BENCH_PREFIX}{number}.jpg'
+        if not default_storage.exists(name):
+            color = tuple(rng.randrange(256) for _ in range(3))
+            buffer = BytesIO()
+            Image.new('RGB', (1280, 853), color).save(buffer, 'JPEG', quality=80)
+            name = default_storage.save(name, ContentFile(buffer.getvalue()))
+        names.append(name)
+    return names
+
+
+def seed(counts, batch_size=5000, seed=0, log=None):
+    """
+    Generate `counts` rows (see COUNTS for the keys). The same `seed` and
+    counts give the same data, give or take the dates, which are relative
+    to today. Returns the number of rows written per model.
+    """
+    log = log or (lambda message: None)
+    rng = random.Random(seed)
+    now = timezone.now()
+    today = timezone.localdate()
+    written = {}
+
+    def stage(name, function):
+        started = time.perf_counter()
+        with transaction.atomic():
+            written[name] = function()
+        log(f"{name}: {written[name]} rows in {time.perf_counter() - started:.1f}s")
+
+    # Catalogue, shared with real data.
+    def categories():
+        Category.objects.bulk_create([Category(name=name) for name in CATEGORIES], ignore_conflicts=True)
+        created = 0
+        for category in Category.objects.filter(name__in=CATEGORIES).exclude(activities__isnull=False):
+            created += len(Activity.objects.bulk_create([
+                Activity(name=name, category=category, description=f"{name} around Burundi.",
+                         rating=Decimal(rng.randint(30, 50)) / 10)
+                for name in CATEGORIES[category.name]
+            ]))
+        return created
+    stage('activities', categories)
+    category_ids = list(Category.objects.order_by('pk').values_list('pk', flat=True))
+
+    # Users, with the profile, wallet and partner profile the views expect.
+    password = make_password(BENCH_PASSWORD)
+
+    def users():
+        def rows():
+            for role, count in (('partner', counts['partners']), ('customer', counts['customers'])):
+                for number in range(count):
+                    username = f'{BENCH_PREFIX}{role}-{number}'
+                    yield User(
+                        username=username, email=f'{username}@example.com', password=password, role=role,
+                        first_name=rng.choice(PLACES), date_joined=now - timedelta(days=rng.randint(0, 1500)),
+                    )
+        return _insert(User, rows(), batch_size)
+    stage('users', users)
+    if counts['destinations'] and not counts['partners']:
+        raise ValueError("Destinations need at least one partner.")
+    bench_users = User.objects.filter(username__startswith=BENCH_PREFIX).order_by('pk')
+    partner_ids = list(bench_users.filter(role='partner').values_list('pk', flat=True))
+    customer_ids = list(bench_users.filter(role='customer').values_list('pk', flat=True))
+
+    def profiles():
+        user_ids = partner_ids + customer_ids
+        count = _insert(Profile, (
+            Profile(user_id=user_id, location=rng.choice(PLACES), bio="Travels a lot.") for user_id in user_ids
+        ), batch_size)
+        count += _insert(Wallet, (
+            Wallet(user_id=user_id, balance=Decimal(rng.randint(0, 50000)) / 100) for user_id in user_ids
+        ), batch_size)
+        count += _insert(PartnerProfile, (
+            PartnerProfile(user_id=user_id, company_name=f"{rng.choice(PLACES)} Tours {number}",
+                           contact_email=f'partner-{number}@example.com')
+            for number, user_id in enumerate(partner_ids)
+        ), batch_size)
+        return count
+    stage('profiles', profiles)
+
+    # Destinations, scattered around their town (a separate generator, so the
+    # rest of the data does not depend on the coordinates).
+    def destinations():
+        gazetteer = Gazetteer.load(default_gazetteer_path())
+        geo_rng = random.Random(seed)
+
+        def rows():
+            for number in range(counts['destinations']):
+                place = rng.choice(PLACES)
+                latitude, longitude = gazetteer.lookup(place) or (None, None)
+                if latitude is not None:
+                    latitude += geo_rng.gauss(0, 0.1)
+                    longitude += geo_rng.gauss(0, 0.1)
+                yield Destination(
+                    name=f"{place} {rng.choice(SIGHTS)} {number}",
+                    description=' '.join(rng.choices(WORDS, k=40)),
+                    location=place,
+                    latitude=latitude,
+                    longitude=longitude,
+                    price=Decimal(rng.randint(500, 50000)) / 100,
+                    partner_id=rng.choice(partner_ids),
+                    daily_capacity=rng.choice([None, 20, 50, 100]),
+                    created_at=now - timedelta(minutes=rng.randint(0, 1500 * 24 * 60)),
+                )
+        return _insert(Destination, rows(), batch_size)
+    stage('destinations', destinations)
+    destinations_by_id = {
+        pk: (price, capacity)
+        for pk, price, capacity in Destination.objects.filter(partner__username__startswith=BENCH_PREFIX)
+        .order_by('pk').values_list('pk', 'price', 'daily_capacity')
+    }
+    destination_ids = list(destinations_by_id)
+
+    def destination_categories():
+        through = Destination.categories.through
+        return _insert(through, (
+            through(destination_id=destination_id, category_id=category_id)
+            for destination_id in destination_ids
+            for category_id in rng.sample(category_ids, min(len(category_ids), rng.randint(1, 3)))
+        ), batch_size)
+    stage('destination categories', destination_categories)
+
+    def images():
+        if not destination_ids or not counts['images']:
+            return 0
+        sources = _source_images(rng)
+        return _insert(DestinationImage, (
+            DestinationImage(destination_id=_skewed(rng, destination_ids), image=rng.choice(sources),
+                             created_at=now - timedelta(days=rng.randint(0, 1500)))
+            for _ in range(counts['images'])
+        ), batch_size)
+    stage('images', images)
+
+    def reviews():
+        if not destination_ids or not customer_ids:
+            return 0
+        return _insert(Review, (
+            Review(user_id=_skewed(rng, customer_ids), destination_id=_skewed(rng, destination_ids),
+                   content=' '.join(rng.choices(WORDS, k=rng.randint(5, 60))).capitalize() + '.',
+                   rating=rng.choices([1, 2, 3, 4, 5], weights=[1, 1, 3, 6, 6])[0])
+            for _ in range(counts['reviews'])
+        ), batch_size)
+    stage('reviews', reviews)
+
+    # Bookings over the last two years and the next three months. Upcoming
+    # ones fill the availability calendar; those that would overbook a day
+    # are canceled instead.
+    calendar = {}
+
+    def bookings():
+        if not destination_ids or not customer_ids:
+            return 0
+
+        def rows():
+            for _ in range(counts['bookings']):
+                destination_id = _skewed(rng, destination_ids)
+                price, capacity = destinations_by_id[destination_id]
+                start = today + timedelta(days=rng.randint(-730, 90))
+                end = start + timedelta(days=rng.randint(0, 4))
+                guests = rng.randint(1, 4)
+                status = rng.choices(['confirmed', 'pending', 'canceled'], weights=[14, 4, 1])[0]
+                if start < today and status == 'pending':
+                    status = 'confirmed'
+                if end >= today and status != 'canceled':
+                    days = DestinationAvailability.days(max(start, today), end)
+                    if capacity is not None and any(calendar.get((destination_id, day), 0) + guests > capacity
+                                                    for day in days):
+                        status = 'canceled'
+                    else:
+                        for day in days:
+                            calendar[destination_id, day] = calendar.get((destination_id, day), 0) + guests
+                booked_on = min(now, timezone.make_aware(datetime.combine(start, datetime.min.time()))
+                                - timedelta(days=rng.randint(1, 120)))
+                yield Booking(
+                    user_id=_skewed(rng, customer_ids), destination_id=destination_id, booking_date=booked_on,
+                    status=status, total_price=price * guests, start_date=start, end_date=end, guests=guests,
+                    payment_method=rng.choice(['cod', 'bank_transfer', 'wallet', 'online']),
+                    payment_status='paid' if status == 'confirmed' else 'unpaid',
+                )
+        return _insert(Booking, rows(), batch_size)
+    stage('bookings', bookings)
+
+    def availability():
+        return _insert(DestinationAvailability, (
+            DestinationAvailability(destination_id=destination_id, date=day, booked=booked,
+                                    capacity=destinations_by_id[destination_id][1])
+            for (destination_id, day), booked in calendar.items()
+        ), batch_size)
+    stage('availability', availability)
+
+    # Notifications, then the inboxes that count them.
+    def notifications():
+        if not customer_ids:
+            return 0
+        names = [f"{place} {sight}" for place in PLACES for sight in SIGHTS]
+        return _insert(Notification, (
+            Notification(user_id=_skewed(rng, customer_ids), is_read=rng.random() < 0.7,
+                         message=rng.choice(NOTIFICATION_MESSAGES).format(name=rng.choice(names)))
+            for _ in range(counts['notifications'])
+        ), batch_size)
+    stage('notifications', notifications)
+
+    def inboxes():
+        count = 0
+        for offset in range(0, len(customer_ids), batch_size):
+            user_ids = customer_ids[offset:offset + batch_size]
+            totals = Notification.objects.filter(user_id__in=user_ids).values('user_id').annotate(
+                latest=Max('id'), unread=Count('id', filter=Q(is_read=False)),
+            ).order_by()
+            count += len(NotificationInbox.objects.bulk_create([
+                NotificationInbox(user_id=row['user_id'], latest_id=row['latest'], unread_count=row['unread'])
+                for row in totals
+            ]))
+        return count
+    stage('inboxes', inboxes)
+
+    # The denormalized data the signals would have kept up to date.
+    started = time.perf_counter()
+    rebuild_rating_aggregates(batch_size=batch_size)
+    rebuild_index(batch_size=batch_size)
+    for offset in range(0, len(destination_ids), batch_size):
+        analytics.refresh(destination_ids[offset:offset + batch_size], start=today - timedelta(days=1500), end=today)
+    bump_generation('destinations', 'categories')
+    log(f"rating aggregates, search index and analytics rollups rebuilt in {time.perf_counter() - started:.1f}s")
+    return written
+
+
+# Benchmark
+
+# URLs the harness does not request, with the reason.
+SKIPPED = {
+    'logout': "logs the benchmark client out",
+    'notifications_mark_read': "POST only",
+    'notifications_poll': "long-polls until a notification arrives",
+    'notification_stream': "streams for as long as the client stays connected",
+    'metrics': "only served with PROFILING_ENABLED",
+}
+
+
+class Targets:
+    """The rows the parametrized URLs point at, chosen among the bench data."""
+
+    def __init__(self, user):
+        self.user = user
+        # Partner-only URLs are requested as the first bench partner.
+        self.partner = (
+            User.objects.filter(username=f'{BENCH_PREFIX}partner-0', role='partner').first()
+            if user is not None else None
+        )
+        self.destination = Destination.objects.order_by('-rating_count', 'pk').only('pk', 'name').first()
+        self.booking = (
+            Booking.objects.filter(user=user).order_by('-booking_date', '-pk').only('pk').first()
+            if user is not None else None
+        )
+        self.start = timezone.localdate() + timedelta(days=7)
+        self.end = self.start + timedelta(days=6)
+
+    def dates(self):
+        return {'start': self.start.isoformat(), 'end': self.end.isoformat()}
+
+
+# URL arguments and query strings, by URL name. A new parametrized URL
+# shows up as skipped until it is given arguments here.
+ARGUMENTS = {
+    'destination_availability': lambda targets: {'pk': targets.destination.pk},
+    'api:destination-detail': lambda targets: {'pk': targets.destination.pk},
+    'api:destination-reviews': lambda targets: {'destination_pk': targets.destination.pk},
+    'api:booking-detail': lambda targets: {'pk': targets.booking.pk},
+}
+QUERIES = {
+    'search': lambda targets: {'q': targets.destination.name.split()[0]},
+    # 50 km around Bujumbura, and a box over the west of the country.
+    'api:destination-nearby': lambda targets: {'lat': -3.3822, 'lng': 29.3644, 'radius': 50},
+    'api:destination-bbox': lambda targets: {'bbox': '29.0,-3.8,29.8,-3.0'},
+    'availability': Targets.dates,
+    'destination_availability': Targets.dates,
+}
+
+
+# URLs that only partners may open; the logged-in customer would get a 403.
+PARTNER_URLS = {'partner_dashboard', 'api:partner-stats'}
+
+
+def url_patterns(patterns=None, namespace=''):
+    """(name, pattern) for every named URL of destination/urls.py."""
+    if patterns is None:
+        from . import urls
+        patterns = urls.urlpatterns
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            prefix = f'{namespace}{pattern.namespace}:' if pattern.namespace else namespace
+            yield from url_patterns(pattern.url_patterns, prefix)
+        elif pattern.name:
+            yield namespace + pattern.name, pattern
+
+
+def build_path(name, pattern, targets):
+    """The path to request for URL `name`, or raise LookupError with the reason to skip it."""
+    if name in SKIPPED:
+        raise LookupError(SKIPPED[name])
+    kwargs = {}
+    if getattr(pattern.pattern, 'converters', None):
+        if name not in ARGUMENTS:
+            raise LookupError("no arguments known, add it to bench.ARGUMENTS")
+        try:
+            kwargs = ARGUMENTS[name](targets)
+        except AttributeError:
+            raise LookupError("no bench data to point it at")
+    path = reverse(name, kwargs=kwargs)
+    if name in QUERIES:
+        try:
+            query = QUERIES[name](targets)
+        except AttributeError:
+            raise LookupError("no bench data to point it at")
+        path += '?' + '&'.join(f'{key}={value}' for key, value in query.items())
+    return path
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def measure(client, path, iterations, warmup):
+    for _ in range(warmup):
+        client.get(path)
+    latencies, queries, statuses = [], [], set()
+    for _ in range(iterations):
+        with capture() as stats:
+            started = time.perf_counter()
+            response = client.get(path)
+            latencies.append(time.perf_counter() - started)
+        queries.append(stats.queries)
+        statuses.add(response.status_code)
+    return {
+        'path': path,
+        'status': sorted(statuses)[-1],
+        'p50_ms': round(statistics.median(latencies) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+        'mean_ms': round(statistics.fmean(latencies) * 1000, 2),
+        'queries': max(queries),
+    }
+
+
+def row_counts():
+    return {
+        model._meta.model_name: model.objects.count()
+        for model in (User, Destination, DestinationImage, Review, Booking, Notification)
+    }
+
+
+def run_benchmark(user=None, iterations=50, warmup=5, only=None, progress=None):
+    """
+    Request every URL of destination/urls.py `warmup` times, then
+    `iterations` times measured, logged in as `user` (anonymous when None;
+    PARTNER_URLS are requested as the first bench partner instead).
+    Requests run one at a time so that the numbers are comparable between
+    runs; `manage.py loadtest` is the tool for throughput under concurrency.
+    """
+    targets = Targets(user)
+    results = {
+        'meta': {
+            'created': timezone.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'iterations': iterations,
+            'warmup': warmup,
+            'user': user.username if user is not None else None,
+            'partner': targets.partner.username if targets.partner is not None else None,
+            'rows': row_counts(),
+        },
+        'urls': {},
+        'skipped': {},
+    }
+    # The test client sends "Host: testserver". The profiling middleware
+    # would take over the stats that measure() collects, so it stays off.
+    with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'], PROFILING_ENABLED=False):
+        # A failing view is recorded with its 500 rather than ending the run.
+        client = Client(raise_request_exception=False)
+        partner_client = Client(raise_request_exception=False)
+        if user is not None:
+            client.force_login(user)
+        if targets.partner is not None:
+            partner_client.force_login(targets.partner)
+        for name, pattern in url_patterns():
+            if only and name not in only:
+                continue
+            try:
+                path = build_path(name, pattern, targets)
+            except LookupError as reason:
+                results['skipped'][name] = str(reason)
+                continue
+            if name in PARTNER_URLS and user is not None:
+                if targets.partner is None:
+                    results['skipped'][name] = "no bench partner to log in as"
+                    continue
+                result = measure(partner_client, path, iterations, warmup)
+            else:
+                result = measure(client, path, iterations, warmup)
+            results['urls'][name] = result
+            if progress is not None:
+                progress(name, result)
+    return results
+
+
+# A p99 regression must be this many milliseconds as well as over the
+# tolerance, so that sub-millisecond jitter does not count.
+MIN_REGRESSION_MS = 1.0
+
+
+def compare(results, baseline, tolerance=0.5):
+    """
+    Regressions of `results` against `baseline`, as {name: [reason, ...]}:
+    more queries, a different status, or a p99 over the tolerance.
+    """
+    regressions = {}
+    for name, result in results['urls'].items():
+        before = baseline.get('urls', {}).get(name)
+        if before is None:
+            continue
+        reasons = []
+        if result['status'] != before['status']:
+            reasons.append(f"status {before['status']} -> {result['status']}")
+        if result['queries'] > before['queries']:
+            reasons.append(f"queries {before['queries']} -> {result['queries']}")
+        if (result['p99_ms'] > before['p99_ms'] * (1 + tolerance)
+                and result['p99_ms'] - before['p99_ms'] >= MIN_REGRESSION_MS):
+            reasons.append(f"p99 {before['p99_ms']}ms -> {result['p99_ms']}ms")
+        if reasons:
+            regressions[name] = reasons
+    return regressions
+
+
+# Template rendering
+
+# Context each template is rendered with, by template name, built from the
+# bench data the way its view builds it. Templates not listed are rendered
+# with the request context alone.
+TEMPLATE_CONTEXTS = {}
+
+
+def template_context(*names):
+    def decorator(func):
+        for name in names:
+            TEMPLATE_CONTEXTS[name] = func
+        return func
+    return decorator
+
+
+@template_context('destinations.html')
+def _destinations_context(targets):
+    from .caching import get_generation
+    from .forms import DestinationFilterForm
+    from .pagination import KeysetPaginator
+
+    destinations = Destination.objects.select_related('partner').prefetch_related('images', 'categories')
+    page = KeysetPaginator(destinations, page_size=20).get_page()
+    return {
+        'destinations': page.object_list,
+        'page': page,
+        'next_query': f'cursor={page.next_cursor}' if page.has_next else '',
+        'filter_form': DestinationFilterForm({}),
+        'categories': list(Category.objects.order_by('name')),
+        'card_generation': get_generation('categories'),
+    }
+
+
+@template_context('partials/destination_card.html')
+def _card_context(targets):
+    from .caching import get_generation
+
+    destination = Destination.objects.select_related('partner').prefetch_related('images', 'categories').get(
+        pk=targets.destination.pk,
+    )
+    return {'destination': destination, 'card_generation': get_generation('categories')}
+
+
+@template_context('search.html')
+def _search_context(targets):
+    from .search import search_destinations
+
+    query = targets.destination.name.split()[0]
+    return {'query': query, 'results': search_destinations(query, limit=20)}
+
+
+@template_context('bookings.html')
+def _bookings_context(targets):
+    from .pagination import KeysetPaginator
+
+    page = KeysetPaginator(
+        Booking.objects.filter(user=targets.user).select_related('destination'), page_size=20, field='booking_date',
+    ).get_page()
+    return {'bookings': page.object_list, 'page': page}
+
+
+@template_context('notifications.html')
+def _notifications_context(targets):
+    notifications = list(Notification.objects.filter(user=targets.user).order_by('-pk')[:20])
+    for notification in notifications:
+        notification.unread = not notification.is_read
+    return {'notifications': notifications, 'page': None, 'last_id': notifications[0].pk if notifications else None}
+
+
+@template_context('partner_dashboard.html')
+def _partner_dashboard_context(targets):
+    partner = Destination.objects.filter(pk=targets.destination.pk).values_list('partner_id', flat=True).get()
+    return {'summary': analytics.partner_summary(partner, 30), 'windows': analytics.WINDOWS}
+
+
+@template_context('auth/profile.html')
+def _profile_context(targets):
+    return {'user': targets.user}
+
+
+def template_names():
+    """Every template under the TEMPLATES DIRS, except the admin overrides."""
+    from django.template import engines
+
+    for directory in engines['django'].engine.dirs:
+        for path in sorted(Path(directory).rglob('*.html')):
+            name = path.relative_to(directory).as_posix()
+            if not name.startswith('admin/'):
+                yield name
+
+
+def _uncached_engine():
+    """The configured Django template engine without the cached loader, which compiles on every render."""
+    from django.template.backends.django import DjangoTemplates
+
+    config = next(
+        template for template in settings.TEMPLATES if template['BACKEND'].endswith('DjangoTemplates')
+    )
+    options = {**config.get('OPTIONS', {}), 'loaders': [
+        'django.template.loaders.filesystem.Loader', 'django.template.loaders.app_directories.Loader',
+    ]}
+    return DjangoTemplates({'NAME': 'uncached', 'DIRS': config.get('DIRS', []), 'APP_DIRS': False, 'OPTIONS': options})
+
+
+def _median_ms(func, iterations):
+    timings = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return round(statistics.median(timings) * 1000, 3)
+
+
+def measure_template(name, context, request, uncached_engine, iterations):
+    """
+    Render times of one template, in milliseconds (median of `iterations`):
+
+    * render_ms: as served, compiled by the cached loader, fragments cached;
+    * no_fragment_cache_ms: with every {% cache %} block rendered afresh;
+    * no_cached_loader_ms: read from disk and compiled on every render;
+
+    and the memory one render allocates at its peak (alloc_kib) and the
+    queries it runs.
+    """
+    import tracemalloc
+
+    from django.template.loader import get_template
+
+    template = get_template(name)
+
+    def render():
+        return template.render(context, request)
+
+    render()  # compile the includes and fill the fragment cache
+    with capture() as stats:
+        render()
+    result = {'render_ms': _median_ms(render, iterations)}
+    fragments_off = {**settings.CACHES, 'template_fragments': {
+        'BACKEND': 'django.core.cache.backends.dummy.DummyCache',
+    }}
+    with override_settings(CACHES=fragments_off):
+        result['no_fragment_cache_ms'] = _median_ms(render, iterations)
+    result['no_cached_loader_ms'] = _median_ms(
+        lambda: uncached_engine.get_template(name).render(context, request), iterations,
+    )
+
+    tracing = tracemalloc.is_tracing()
+    if not tracing:
+        tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        baseline = tracemalloc.get_traced_memory()[0]
+        render()
+        result['alloc_kib'] = round((tracemalloc.get_traced_memory()[1] - baseline) / 1024, 1)
+    finally:
+        if not tracing:
+            tracemalloc.stop()
+    result['queries'] = stats.queries
+    return result
+
+
+def run_template_benchmark(user=None, names=None, iterations=50, progress=None):
+    """
+    Render every template (or those in `names`) with its TEMPLATE_CONTEXTS
+    context and a request from `user`, and measure it with
+    measure_template(). Templates that fail to render are recorded in
+    'skipped' with the error.
+    """
+    from django.contrib.auth.models import AnonymousUser
+    from django.test import RequestFactory
+
+    targets = Targets(user)
+    request = RequestFactory().get('/')
+    request.user = user if user is not None else AnonymousUser()
+    request.session = {}
+    uncached_engine = _uncached_engine()
+    results = {'templates': {}, 'skipped': {}}
+    for name in names or template_names():
+        try:
+            context = TEMPLATE_CONTEXTS[name](targets) if name in TEMPLATE_CONTEXTS else {}
+            result = measure_template(name, context, request, uncached_engine, iterations)
+        except Exception as exc:
+            results['skipped'][name] = f"{type(exc).__name__}: {exc}"
+            continue
+        results['templates'][name] = result
+        if progress is not None:
+            progress(name, result)
+    return results
+
+
+# Microbenchmarks: name -> function returning {case: zero-argument callable}
+
+MICROBENCHMARKS = {}
+
+
+def microbenchmark(name):
+    def decorator(func):
+        MICROBENCHMARKS[name] = func
+        return func
+    return decorator
+
+
+def time_per_call(func, number=10000, repeat=5):
+    """Nanoseconds per call of `func`: the best of `repeat` runs of `number` calls."""
+    return min(timeit.repeat(func, number=number, repeat=repeat)) / number * 1e9
+
+
+def run_microbenchmark(name, number=10000, repeat=5):
+    """{case: nanoseconds per call, or the reason it could not run} for MICROBENCHMARKS[name]."""
+    try:
+        cases = MICROBENCHMARKS[name]()
+    except LookupError as reason:
+        return {name: f"skipped: {reason}"}
+    results = {}
+    for case, func in cases.items():
+        try:
+            func()
+        except Exception as exc:
+            results[case] = f"skipped: {exc}"
+            continue
+        results[case] = round(time_per_call(func, number, repeat), 1)
+    return results
+
+
+@microbenchmark('money')
+def money_cases():
+    from .money import MoneyFormatter, format_money
+    from .templatetags.money import money
+
+    amount = Decimal('1234567.891')
+    return {
+        'format_money USD en': lambda: format_money(amount, 'USD', 'en'),
+        'format_money BIF fr': lambda: format_money(amount, 'BIF', 'fr'),
+        '|money (active language)': lambda: money(amount),
+        'MoneyFormatter, not cached': lambda: MoneyFormatter('EUR', 'fr').format(amount),
+        # What Wallet.formatted_balance used to do, under whatever locale the process has.
+        'locale.currency': lambda: locale.currency(amount, grouping=True),
+    }
+
+
+@microbenchmark('auth')
+def auth_cases():
+    """What a logged-in request costs before its view runs: loading the session, then the user."""
+    from django.contrib.auth import HASH_SESSION_KEY, SESSION_KEY
+    from django.contrib.auth.backends import ModelBackend
+    from django.contrib.sessions.backends import cached_db, db
+    from django.utils.crypto import constant_time_compare
+
+    from .auth import CachedModelBackend
+
+    user = User.objects.filter(username=f'{BENCH_PREFIX}customer-0').first() or User.objects.order_by('pk').first()
+    if user is None:
+        raise LookupError("no user to log in as; run seed_bench first")
+
+    def case(store_class, backend):
+        session = store_class()
+        session[SESSION_KEY] = str(user.pk)
+        session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+        session.set_expiry(300)  # left for clearsessions
+        session.save()
+
+        # django.contrib.auth.get_user(), minus the backend lookup
+        def request_user():
+            session = store_class(session_key)
+            found = backend.get_user(int(session[SESSION_KEY]))
+            assert constant_time_compare(session[HASH_SESSION_KEY], found.get_session_auth_hash())
+            return found
+        session_key = session.session_key
+        return request_user
+
+    return {
+        'db session + User query': case(db.SessionStore, ModelBackend()),
+        'cached_db session + cached user': case(cached_db.SessionStore, CachedModelBackend()),
+    }
+
@@ -0,0 +1,236 @@
+"""
+Page and fragment caching with precise invalidation.
+
+Whole pages are cached for anonymous visitors under keys that embed a
+"generation" number per namespace (e.g. 'destinations'). Bumping a
+generation makes every page that depends on it miss at once, without having
+to know which keys exist. Destination cards are cached with the
+`{% cache %}` template tag, once per money locale (the only part of a card
+that depends on the language), and deleted individually when their
+destination changes; see destination/signals.py for the wiring. The navbar is cached
+the same way, once per login state and unread count.
+
+Misses are coalesced: concurrent requests for the same cold key wait for
+the one computing it instead of all hitting the database.
+"""
+import asyncio
+import hashlib
+import threading
+import time
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+
+from .money import LOCALES
+
+PAGE_TIMEOUT = getattr(settings, 'PAGE_CACHE_TIMEOUT', 300)
+CARD_FRAGMENT = 'destination_card'
+
+_MISSING = object()
+
+
+# Generations
+
+def _generation_key(namespace):
+    return f'generation:{namespace}'
+
+
+def get_generation(namespace):
+    key = _generation_key(namespace)
+    generation = cache.get(key)
+    if generation is None:
+        # Start from the clock so a flushed cache never reuses old numbers.
+        cache.add(key, int(time.time() * 1000), timeout=None)
+        generation = cache.get(key)
+    return generation
+
+
+async def aget_generation(namespace):
+    key = _generation_key(namespace)
+    generation = await cache.aget(key)
+    if generation is None:
+        await cache.aadd(key, int(time.time() * 1000), timeout=None)
+        generation = await cache.aget(key)
+    return generation
+
+
+def bump_generation(*namespaces):
+    for namespace in namespaces:
+        try:
+            cache.incr(_generation_key(namespace))
+        except ValueError:
+            get_generation(namespace)
+
+
+def card_fragment_key(destination_id, locale):
+    return make_template_fragment_key(CARD_FRAGMENT, [destination_id, get_generation('categories'), locale])
+
+
+def invalidate_destination_cards(destination_ids):
+    cache.delete_many([card_fragment_key(pk, locale) for pk in destination_ids for locale in LOCALES])
+
+
+# Stampede protection
+
+_local_locks = {}
+_local_locks_guard = threading.Lock()
+
+
+def get_or_set_coalesced(key, producer, timeout=PAGE_TIMEOUT, lock_timeout=10, wait=5.0):
+    """
+    Return the cached value for `key`, computing it with `producer()` on a
+    miss. Only one caller recomputes a missing key: threads of this process
+    queue on a local lock, and other processes on a short-lived lock key in
+    the cache itself, polling for the value until `wait` seconds pass.
+    """
+    value = cache.get(key, _MISSING)
+    if value is not _MISSING:
+        return value
+
+    with _local_locks_guard:
+        local_lock = _local_locks.setdefault(key, threading.Lock())
+    with local_lock:
+        try:
+            value = cache.get(key, _MISSING)
+            if value is not _MISSING:
+                return value
+
+            lock_key = f'lock:{key}'
+            if not cache.add(lock_key, 1, timeout=lock_timeout):
+                deadline = time.monotonic() + wait
+                while time.monotonic() < deadline:
+                    time.sleep(0.05)
+                    value = cache.get(key, _MISSING)
+                    if value is not _MISSING:
+                        return value
+                # The other process is too slow or died: compute it ourselves.
+            try:
+                value = producer()
+                cache.set(key, value, timeout)
+            finally:
+                cache.delete(lock_key)
+            return value
+        finally:
+            with _local_locks_guard:
+                _local_locks.pop(key, None)
+
+
+_async_locks = {}
+
+
+async def aget_or_set_coalesced(key, producer, timeout=PAGE_TIMEOUT, lock_timeout=10, wait=5.0):
+    """
+    Async version of get_or_set_coalesced(); `producer` is a coroutine
+    function. Tasks of this process wait on an asyncio lock instead of
+    blocking a thread.
+    """
+    value = await cache.aget(key, _MISSING)
+    if value is not _MISSING:
+        return value
+
+    local_lock = _async_locks.setdefault(key, asyncio.Lock())
+    async with local_lock:
+        try:
+            value = await cache.aget(key, _MISSING)
+            if value is not _MISSING:
+                return value
+
+            lock_key = f'lock:{key}'
+            if not await cache.aadd(lock_key, 1, timeout=lock_timeout):
+                deadline = time.monotonic() + wait
+                while time.monotonic() < deadline:
+                    await asyncio.sleep(0.05)
+                    value = await cache.aget(key, _MISSING)
+                    if value is not _MISSING:
+                        return value
+            try:
+                value = await producer()
+                await cache.aset(key, value, timeout)
+            finally:
+                await cache.adelete(lock_key)
+            return value
+        finally:
+            _async_locks.pop(key, None)
+
+
+# Page cache
+
+def _page_key(request, generations):
+    path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+    return f'page:{request.resolver_match.url_name}:{".".join(map(str, generations))}:{path}'
+
+
+def _is_cacheable(request, response):
+    # Responses that set cookies (e.g. a fresh CSRF token) or are not plain
+    # successes are served but never cached.
+    return not (
+        response.status_code != 200
+        or response.cookies
+        or request.META.get('CSRF_COOKIE_NEEDS_UPDATE')
+        or getattr(response, 'streaming', False)
+    )
+
+
+def cache_anonymous_page(*namespaces, timeout=PAGE_TIMEOUT):
+    """
+    Cache a view's response for anonymous GET requests. The cache entry is
+    dropped as soon as any of `namespaces` has its generation bumped. Works
+    on both sync and async views.
+    """
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                if request.method not in ('GET', 'HEAD') or (await request.auser()).is_authenticated:
+                    return await view(request, *args, **kwargs)
+
+                uncacheable = []
+
+                async def produce():
+                    response = await view(request, *args, **kwargs)
+                    if not _is_cacheable(request, response):
+                        uncacheable.append(response)
+                        return None
+                    return response
+
+                generations = [await aget_generation(namespace) for namespace in namespaces]
+                key = _page_key(request, generations)
+                response = await aget_or_set_coalesced(key, produce, timeout=timeout)
+                if uncacheable:
+                    await cache.adelete(key)
+                    return uncacheable[0]
+                if response is None:
+                    return await view(request, *args, **kwargs)
+                return response
+
+            return markcoroutinefunction(async_wrapper)
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD') or request.user.is_authenticated:
+                return view(request, *args, **kwargs)
+
+            uncacheable = []
+
+            def produce():
+                response = view(request, *args, **kwargs)
+                if not _is_cacheable(request, response):
+                    uncacheable.append(response)
+                    return None
+                return response
+
+            key = _page_key(request, [get_generation(namespace) for namespace in namespaces])
+            response = get_or_set_coalesced(key, produce, timeout=timeout)
+            if uncacheable:
+                cache.delete(key)
+                return uncacheable[0]
+            if response is None:
+                # Another request found the page uncacheable; render our own.
+                return view(request, *args, **kwargs)
+            return response
+        return wrapper
+    return decorator
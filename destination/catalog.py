@@ -0,0 +1,586 @@
+"""
+Catalog import and export in CSV or JSONL.
+
+Four kinds of rows are supported: categories, activities, destinations
+and images. Each has a fixed set of columns (see CatalogKind.columns);
+references use natural keys, so files can move between databases:
+
+    categories    id, name, description
+    activities    id, category (name), name, description, rating
+    destinations  id, partner (username), name, description, location, price,
+                  daily_capacity, categories (names, '|'-separated in CSV)
+    images        id, destination (id), image (storage name of an uploaded file)
+
+Imports are upserts. A row with the id of an existing row updates it;
+otherwise the natural key decides (category name, category + activity
+name, partner + destination name, destination + image), and unknown rows
+are created. Rows are read as a stream and written in chunks of
+`batch_size` with one bulk_create and one bulk_update each, so memory does
+not grow with the file. Every row is validated against the model fields;
+invalid rows are reported with their line number and skipped, the rest
+of the chunk is still written.
+
+Bulk writes do not send signals, so each chunk does the signals' work in
+bulk: reindexing for search, cache invalidation, calendar capacity and
+image variants.
+
+Exports stream from QuerySet.iterator() and never hold more than one
+chunk of rows.
+"""
+import csv
+import json
+from dataclasses import dataclass
+from itertools import islice
+
+from django.core.exceptions import ValidationError
+from django.core.files.storage import default_storage
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections, router, transaction
+from django.db.models import Prefetch
+from django.utils import timezone
+
+from . import caching, tasks
+from .images import needs_variants
+from .models import Activity, Category, Destination, DestinationAvailability, DestinationImage, User
+
+FORMATS = ('csv', 'jsonl')
+CSV_LIST_SEPARATOR = '|'
+
+
+class InvalidRow(str):
+    """A record that could not be parsed, in place of its row."""
+
+
+@dataclass
+class ImportResult:
+    created: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    failed: int = 0
+
+
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def _blank(value):
+    return value is None or (isinstance(value, str) and not value.strip())
+
+
+def _messages(error):
+    return error.messages if isinstance(error, ValidationError) else [str(error)]
+
+
+class _Echo:
+    """A file-like object csv.writer can write to, returning each line."""
+
+    def write(self, value):
+        return value
+
+
+# Kinds
+
+class CatalogKind:
+    model = None
+    columns = ()
+    # Model fields imported from the column of the same name.
+    fields = ()
+    # Kinds a partner may import into, limited to their own destinations.
+    partner_scoped = False
+
+    def export_queryset(self, partner=None):
+        raise NotImplementedError
+
+    def export_row(self, obj):
+        return {column: getattr(obj, column) for column in self.columns}
+
+    def clean(self, row):
+        """The model field values of `row`, or raise ValidationError."""
+        values, errors = {}, []
+        for name in self.fields:
+            field = self.model._meta.get_field(name)
+            value = row.get(name)
+            if _blank(value):
+                value = '' if field.empty_strings_allowed and not field.null else None
+            elif isinstance(value, str):
+                value = value.strip()
+            try:
+                values[field.attname] = field.clean(value, None)
+            except ValidationError as error:
+                errors.extend(f"{name}: {message}" for message in error.messages)
+        if errors:
+            raise ValidationError(errors)
+        return values
+
+    def resolve(self, rows, partner):
+        """Look up the references of a chunk of rows, one query per kind of reference."""
+        return {}
+
+    def reference(self, row, values, references, partner):
+        """Complete `values` with resolved references, or raise ValidationError."""
+
+    def key(self, values):
+        raise NotImplementedError
+
+    def existing(self, ids, keys, partner):
+        """Existing rows of a chunk, by pk and by natural key."""
+        queryset = self.model.objects.all()
+        by_id = queryset.in_bulk(ids) if ids else {}
+        by_key = {}
+        for obj in self.natural_lookup(queryset, keys).order_by('-pk'):
+            # The oldest row wins; one instance per row, whichever way it is found.
+            by_key[self.key(obj.__dict__)] = by_id.get(obj.pk, obj)
+        return by_id, by_key
+
+    def natural_lookup(self, queryset, keys):
+        raise NotImplementedError
+
+    def changed(self, obj, values):
+        """Whether importing `values` into the existing `obj` changes it."""
+        return any(getattr(obj, attname) != value for attname, value in values.items() if attname != 'categories')
+
+    def after_chunk(self, created, updated, values, batch_size):
+        """
+        Side effects of the chunk, in place of the signals bulk writes skip.
+        `values` holds the imported field values by id() of each object.
+        """
+
+    def update_fields(self):
+        fields = [self.model._meta.get_field(name).attname for name in self.fields]
+        if any(field.name == 'updated_at' for field in self.model._meta.concrete_fields):
+            fields.append('updated_at')
+        return fields
+
+
+def _update_rows(model, objects, attnames):
+    """
+    Write `attnames` of `objects` with one prepared UPDATE run by
+    executemany. bulk_update would build a CASE WHEN per row and field,
+    which costs several times more than the statement itself.
+    """
+    connection = connections[router.db_for_write(model)]
+    quote = connection.ops.quote_name
+    fields = [model._meta.get_field(attname) for attname in attnames]
+    sql = 'UPDATE {} SET {} WHERE {} = %s'.format(
+        quote(model._meta.db_table),
+        ', '.join(f'{quote(field.column)} = %s' for field in fields),
+        quote(model._meta.pk.column),
+    )
+    params = [
+        [field.get_db_prep_save(getattr(obj, field.attname), connection) for field in fields] + [obj.pk]
+        for obj in objects
+    ]
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, params)
+
+
+def _reindex_destinations(queryset, batch_size):
+    ids = queryset.values_list('pk', flat=True).distinct().order_by('pk')
+    for chunk in _chunks(ids.iterator(chunk_size=batch_size), batch_size):
+        Destination.touch(chunk)
+        tasks.index_destinations.delay(chunk)
+
+
+class Categories(CatalogKind):
+    model = Category
+    columns = ('id', 'name', 'description')
+    fields = ('name', 'description')
+
+    def export_queryset(self, partner=None):
+        return Category.objects.order_by('pk')
+
+    def key(self, values):
+        return values['name']
+
+    def natural_lookup(self, queryset, keys):
+        return queryset.filter(name__in=keys)
+
+    def after_chunk(self, created, updated, values, batch_size):
+        if updated:
+            _reindex_destinations(Destination.objects.filter(categories__in=[obj.pk for obj in updated]), batch_size)
+        transaction.on_commit(lambda: caching.bump_generation('categories', 'destinations'))
+
+
+class Activities(CatalogKind):
+    model = Activity
+    columns = ('id', 'category', 'name', 'description', 'rating')
+    fields = ('name', 'description', 'rating')
+
+    def export_queryset(self, partner=None):
+        return Activity.objects.select_related('category').only(
+            'id', 'name', 'description', 'rating', 'category__name',
+        ).order_by('pk')
+
+    def export_row(self, obj):
+        return {**super().export_row(obj), 'category': obj.category.name}
+
+    def resolve(self, rows, partner):
+        names = {str(row['category']).strip() for row in rows if not _blank(row.get('category'))}
+        return {'categories': dict(Category.objects.filter(name__in=names).values_list('name', 'pk'))}
+
+    def reference(self, row, values, references, partner):
+        name = str(row.get('category') or '').strip()
+        if not name:
+            raise ValidationError("category: This field cannot be blank.")
+        if name not in references['categories']:
+            raise ValidationError(f"category: Unknown category {name!r}.")
+        values['category_id'] = references['categories'][name]
+
+    def key(self, values):
+        return (values['category_id'], values['name'])
+
+    def natural_lookup(self, queryset, keys):
+        return queryset.filter(
+            category_id__in={category_id for category_id, _ in keys}, name__in={name for _, name in keys},
+        )
+
+    def update_fields(self):
+        return super().update_fields() + ['category_id']
+
+    def after_chunk(self, created, updated, values, batch_size):
+        category_ids = {obj.category_id for obj in created + updated}
+        _reindex_destinations(Destination.objects.filter(categories__in=category_ids), batch_size)
+        transaction.on_commit(lambda: caching.bump_generation('destinations'))
+
+
+class Destinations(CatalogKind):
+    model = Destination
+    columns = ('id', 'partner', 'name', 'description', 'location', 'price', 'daily_capacity', 'categories')
+    fields = ('name', 'description', 'location', 'price', 'daily_capacity')
+    partner_scoped = True
+
+    def export_queryset(self, partner=None):
+        queryset = Destination.objects.select_related('partner').only(
+            'id', 'name', 'description', 'location', 'price', 'daily_capacity', 'partner__username',
+        ).prefetch_related(
+            Prefetch('categories', queryset=Category.objects.only('id', 'name').order_by('name')),
+        ).order_by('pk')
+        return queryset.filter(partner=partner) if partner is not None else queryset
+
+    def export_row(self, obj):
+        return {
+            **super().export_row(obj),
+            'partner': obj.partner.username,
+            'categories': [category.name for category in obj.categories.all()],
+        }
+
+    def _category_names(self, value):
+        if isinstance(value, str):
+            value = value.split(CSV_LIST_SEPARATOR)
+        if not isinstance(value, list):
+            raise ValidationError("categories: Expected a list of category names.")
+        return {str(name).strip() for name in value if str(name).strip()}
+
+    def resolve(self, rows, partner):
+        categories = set()
+        for row in rows:
+            try:
+                categories |= self._category_names(row.get('categories') or [])
+            except ValidationError:
+                pass
+        references = {'categories': dict(Category.objects.filter(name__in=categories).values_list('name', 'pk'))}
+        if partner is None:
+            usernames = {str(row['partner']).strip() for row in rows if not _blank(row.get('partner'))}
+            references['partners'] = dict(
+                User.objects.filter(username__in=usernames, role='partner').values_list('username', 'pk')
+            )
+        return references
+
+    def reference(self, row, values, references, partner):
+        username = str(row.get('partner') or '').strip()
+        if partner is not None:
+            if username and username != partner.username:
+                raise ValidationError(f"partner: Rows must belong to {partner.username!r}.")
+            values['partner_id'] = partner.pk
+        elif not username:
+            raise ValidationError("partner: This field cannot be blank.")
+        elif username not in references['partners']:
+            raise ValidationError(f"partner: No partner named {username!r}.")
+        else:
+            values['partner_id'] = references['partners'][username]
+
+        # A missing column leaves the categories of existing rows alone.
+        if 'categories' in row:
+            names = self._category_names(row['categories'] or [])
+            unknown = names - references['categories'].keys()
+            if unknown:
+                raise ValidationError(f"categories: Unknown categories {', '.join(sorted(unknown))}.")
+            values['categories'] = sorted(references['categories'][name] for name in names)
+
+    def key(self, values):
+        return (values['partner_id'], values['name'])
+
+    def existing(self, ids, keys, partner):
+        by_id, by_key = super().existing(ids, keys, partner)
+        if partner is not None:
+            by_id = {pk: obj for pk, obj in by_id.items() if obj.partner_id == partner.pk}
+        # Current categories, to tell which rows change them.
+        objects = {obj.pk: obj for obj in [*by_id.values(), *by_key.values()]}
+        for obj in objects.values():
+            obj._category_ids = []
+        through = Destination.categories.through
+        for destination_id, category_id in through.objects.filter(destination_id__in=objects).order_by(
+            'category_id',
+        ).values_list('destination_id', 'category_id'):
+            objects[destination_id]._category_ids.append(category_id)
+        return by_id, by_key
+
+    def changed(self, obj, values):
+        return super().changed(obj, values) or self._categories_changed(obj, values)
+
+    def _categories_changed(self, obj, values):
+        return 'categories' in values and values['categories'] != getattr(obj, '_category_ids', [])
+
+    def natural_lookup(self, queryset, keys):
+        return queryset.filter(
+            partner_id__in={partner_id for partner_id, _ in keys}, name__in={name for _, name in keys},
+        )
+
+    def update_fields(self):
+        return super().update_fields() + ['partner_id']
+
+    def after_chunk(self, created, updated, values, batch_size):
+        through = Destination.categories.through
+        with_categories = [
+            obj for obj in created + updated if self._categories_changed(obj, values[id(obj)])
+        ]
+        through.objects.filter(destination_id__in=[
+            obj.pk for obj in updated if self._categories_changed(obj, values[id(obj)])
+        ]).delete()
+        through.objects.bulk_create([
+            through(destination_id=obj.pk, category_id=category_id)
+            for obj in with_categories for category_id in values[id(obj)]['categories']
+        ], batch_size=batch_size)
+
+        # Upcoming days follow a capacity change, as in sync_calendar_capacity.
+        by_capacity = {}
+        for obj in updated:
+            by_capacity.setdefault(obj.daily_capacity, []).append(obj.pk)
+        for capacity, ids in by_capacity.items():
+            DestinationAvailability.objects.filter(
+                destination_id__in=ids, date__gte=timezone.localdate(),
+            ).exclude(capacity=capacity).update(capacity=capacity)
+
+        ids = [obj.pk for obj in created + updated]
+        tasks.index_destinations.delay(ids)
+        transaction.on_commit(lambda: (
+            caching.invalidate_destination_cards(ids),
+            caching.bump_generation('destinations'),
+        ))
+
+
+class Images(CatalogKind):
+    model = DestinationImage
+    columns = ('id', 'destination', 'image')
+    fields = ('image',)
+    partner_scoped = True
+
+    def export_queryset(self, partner=None):
+        queryset = DestinationImage.objects.only('id', 'destination_id', 'image').order_by('pk')
+        return queryset.filter(destination__partner=partner) if partner is not None else queryset
+
+    def export_row(self, obj):
+        return {'id': obj.pk, 'destination': obj.destination_id, 'image': obj.image.name}
+
+    def clean(self, row):
+        values = super().clean(row)
+        # Imports reference uploaded files; they do not upload them.
+        if not default_storage.exists(values['image']):
+            raise ValidationError(f"image: No file {values['image']!r} in storage.")
+        return values
+
+    def resolve(self, rows, partner):
+        ids = set()
+        for row in rows:
+            try:
+                ids.add(int(row.get('destination')))
+            except (TypeError, ValueError):
+                pass
+        destinations = Destination.objects.filter(pk__in=ids)
+        if partner is not None:
+            destinations = destinations.filter(partner=partner)
+        return {'destinations': set(destinations.values_list('pk', flat=True))}
+
+    def reference(self, row, values, references, partner):
+        try:
+            destination_id = int(row.get('destination'))
+        except (TypeError, ValueError):
+            raise ValidationError("destination: Expected a destination id.")
+        if destination_id not in references['destinations']:
+            raise ValidationError(f"destination: No destination {destination_id}.")
+        values['destination_id'] = destination_id
+
+    def key(self, values):
+        image = values['image']
+        return (values['destination_id'], getattr(image, 'name', image))
+
+    def existing(self, ids, keys, partner):
+        by_id, by_key = super().existing(ids, keys, partner)
+        if partner is not None:
+            allowed = set(Destination.objects.filter(
+                pk__in={obj.destination_id for obj in by_id.values()}, partner=partner,
+            ).values_list('pk', flat=True))
+            by_id = {pk: obj for pk, obj in by_id.items() if obj.destination_id in allowed}
+        return by_id, by_key
+
+    def natural_lookup(self, queryset, keys):
+        return queryset.filter(
+            destination_id__in={destination_id for destination_id, _ in keys}, image__in={image for _, image in keys},
+        )
+
+    def update_fields(self):
+        return ['image', 'destination_id']
+
+    def after_chunk(self, created, updated, values, batch_size):
+        for obj in created + updated:
+            if needs_variants(obj.image, obj.image_variants):
+                tasks.queue_image_variants(DestinationImage._meta.label, obj.pk, 'image')
+        ids = list({obj.destination_id for obj in created + updated})
+        Destination.touch(ids)
+        transaction.on_commit(lambda: (
+            caching.invalidate_destination_cards(ids),
+            caching.bump_generation('destinations'),
+        ))
+
+
+KINDS = {
+    'categories': Categories(),
+    'activities': Activities(),
+    'destinations': Destinations(),
+    'images': Images(),
+}
+
+
+# Export
+
+def export_rows(kind, fmt, partner=None, chunk_size=2000):
+    """The rows of `kind` as a stream of text in `fmt`, read `chunk_size` rows at a time."""
+    spec = KINDS[kind]
+    rows = (spec.export_row(obj) for obj in spec.export_queryset(partner).iterator(chunk_size=chunk_size))
+    if fmt == 'csv':
+        writer = csv.DictWriter(_Echo(), fieldnames=spec.columns)
+        yield writer.writeheader()
+        for row in rows:
+            yield writer.writerow({
+                column: CSV_LIST_SEPARATOR.join(value) if isinstance(value, list) else value
+                for column, value in row.items()
+            })
+    else:
+        for row in rows:
+            yield json.dumps(row, cls=DjangoJSONEncoder, ensure_ascii=False) + '\n'
+
+
+# Import
+
+def read_rows(stream, fmt):
+    """(line number, row) for each record of a text stream; unparsable records come as InvalidRow."""
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            # DictReader keys extra values by None and fills missing ones with None.
+            if None in row or None in row.values():
+                yield reader.line_num, InvalidRow(f"Expected {len(reader.fieldnames)} columns.")
+            else:
+                yield reader.line_num, row
+        return
+    for number, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as error:
+            yield number, InvalidRow(f"Invalid JSON: {error}")
+            continue
+        yield number, row if isinstance(row, dict) else InvalidRow("Expected a JSON object.")
+
+
+def import_rows(kind, rows, partner=None, batch_size=1000, on_error=None, dry_run=False):
+    """
+    Upsert `rows`, (line number, row) pairs as from read_rows(), into the
+    catalog of `kind`. With `partner`, destinations and images are limited
+    to theirs. `on_error(line, messages)` is called for each rejected row.
+    """
+    spec = KINDS[kind]
+    if partner is not None and not spec.partner_scoped:
+        raise ValueError(f"Partners cannot import {kind}.")
+    result = ImportResult()
+
+    for chunk in _chunks(rows, batch_size):
+        rejected = []
+        with transaction.atomic():
+            _import_chunk(spec, chunk, partner, batch_size, lambda *error: rejected.append(error), result)
+            if dry_run:
+                transaction.set_rollback(True)
+        result.failed += len(rejected)
+        if on_error is not None:
+            for line, messages in sorted(rejected):
+                on_error(line, messages)
+    return result
+
+
+def _import_chunk(spec, chunk, partner, batch_size, reject, result):
+    parsed = []
+    for line, row in chunk:
+        if isinstance(row, InvalidRow):
+            reject(line, [row])
+            continue
+        try:
+            values = spec.clean(row)
+            pk = None if _blank(row.get('id')) else int(row['id'])
+        except (ValidationError, TypeError, ValueError) as error:
+            reject(line, _messages(error) if isinstance(error, ValidationError) else ["id: Expected an integer."])
+            continue
+        parsed.append((line, row, values, pk))
+
+    references = spec.resolve([row for _, row, _, _ in parsed], partner)
+    valid = []
+    for line, row, values, pk in parsed:
+        try:
+            spec.reference(row, values, references, partner)
+        except ValidationError as error:
+            reject(line, error.messages)
+            continue
+        valid.append((line, row, values, pk))
+
+    by_id, by_key = spec.existing(
+        [pk for _, _, _, pk in valid if pk is not None], {spec.key(values) for _, _, values, _ in valid}, partner,
+    )
+    # Field values by target object (unsaved objects are not hashable, so
+    # by id()); a later row for the same object wins.
+    targets = {}
+    new = {}
+    changed = set()
+    for line, row, values, pk in valid:
+        if pk is not None and pk in by_id:
+            obj = by_id[pk]
+        elif pk is not None and partner is not None and spec.model.objects.filter(pk=pk).exists():
+            reject(line, [f"id: {spec.model._meta.verbose_name} {pk} belongs to another partner."])
+            continue
+        else:
+            key = spec.key(values)
+            obj = by_key.get(key) or new.get(key)
+            if obj is None:
+                obj = new[key] = spec.model()
+        if obj.pk is None or spec.changed(obj, values):
+            changed.add(id(obj))
+        for attname, value in values.items():
+            if attname != 'categories':
+                setattr(obj, attname, value)
+        targets[id(obj)] = (obj, values)
+
+    created = [obj for obj, _ in targets.values() if obj.pk is None]
+    updated = [obj for obj, _ in targets.values() if obj.pk is not None and id(obj) in changed]
+    if created:
+        spec.model.objects.bulk_create(created, batch_size=batch_size)
+    if updated:
+        now = timezone.now()
+        for obj in updated:
+            if hasattr(obj, 'updated_at'):
+                obj.updated_at = now
+        _update_rows(spec.model, updated, spec.update_fields())
+    spec.after_chunk(created, updated, {key: values for key, (_, values) in targets.items()}, batch_size)
+    result.created += len(created)
+    result.updated += len(updated)
+    result.unchanged += len(targets) - len(created) - len(updated)
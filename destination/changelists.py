@@ -0,0 +1,142 @@
+"""
+Admin changelists for tables too big to count or page through with OFFSET.
+
+`LargeTableAdmin` replaces the admin's exact COUNT(*) with the planner's
+row estimate when the list is unfiltered (and caps it when filtered), drops
+the second "full result" count and the filter facets, and pages through
+the default ordering with a keyset cursor on `cursor_field`, so the last
+page costs the same as the first. Sorting on a column falls back to
+numbered pages.
+"""
+from django.contrib import admin
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.views.main import ORDER_VAR, ChangeList
+from django.core.paginator import Paginator
+from django.db import DatabaseError, connections, transaction
+from django.utils.functional import cached_property
+
+from .pagination import InvalidCursor, KeysetPaginator
+
+CURSOR_VAR = 'cursor'
+# Below this many rows an exact count is cheap enough.
+ESTIMATE_ABOVE = 100_000
+# Filtered lists count at most this many rows.
+COUNT_LIMIT = 10_000
+
+
+def estimate_count(model, using='default'):
+    """
+    The database's estimate of the number of rows in `model`'s table, or
+    None when it has none: pg_class.reltuples on PostgreSQL, the statistics
+    gathered by ANALYZE on SQLite.
+    """
+    connection = connections[using]
+    table = model._meta.db_table
+    try:
+        with transaction.atomic(using=using), connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute('SELECT reltuples FROM pg_class WHERE oid = %s::regclass', [table])
+            elif connection.vendor == 'sqlite':
+                cursor.execute('SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1', [table])
+            else:
+                return None
+            row = cursor.fetchone()
+    except DatabaseError:
+        # No sqlite_stat1 until ANALYZE has run once.
+        return None
+    if row is None:
+        return None
+    estimate = int(float(str(row[0]).split()[0]))
+    # reltuples is -1 for a table never vacuumed or analyzed.
+    return estimate if estimate >= 0 else None
+
+
+class EstimatedCountPaginator(Paginator):
+    """A Paginator whose count is estimated for big unfiltered lists and capped for filtered ones."""
+
+    estimated = False
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = estimate_count(queryset.model, queryset.db)
+            if estimate is not None and estimate > ESTIMATE_ABOVE:
+                self.estimated = True
+                return estimate
+        count = queryset.order_by()[:COUNT_LIMIT + 1].count()
+        if count > COUNT_LIMIT:
+            self.estimated = True
+            return COUNT_LIMIT
+        return count
+
+
+class CursorChangeList(ChangeList):
+    """A ChangeList that pages through its default ordering with ?cursor= instead of ?p=."""
+
+    cursor = None
+    next_cursor = None
+
+    def get_filters_params(self, params=None):
+        lookup_params = super().get_filters_params(params)
+        lookup_params.pop(CURSOR_VAR, None)
+        return lookup_params
+
+    def get_query_string(self, new_params=None, remove=None):
+        # Links to other filters, searches or orderings start from the first page.
+        return super().get_query_string(new_params, [*(remove or []), CURSOR_VAR])
+
+    @property
+    def cursor_paginated(self):
+        return self.model_admin.cursor_field is not None and ORDER_VAR not in self.params and not self.show_all
+
+    @property
+    def next_page_url(self):
+        return self.get_query_string({CURSOR_VAR: self.next_cursor})
+
+    def get_results(self, request):
+        if not self.cursor_paginated:
+            return super().get_results(request)
+
+        paginator = self.model_admin.get_paginator(request, self.queryset, self.list_per_page)
+        keyset = KeysetPaginator(
+            self.queryset, self.list_per_page, field=self.model_admin.cursor_field, max_page_size=self.list_per_page,
+        )
+        self.cursor = request.GET.get(CURSOR_VAR)
+        try:
+            page = keyset.get_page(self.cursor)
+        except InvalidCursor:
+            raise IncorrectLookupParameters
+        self.next_cursor = page.next_cursor
+
+        self.result_count = paginator.count
+        self.full_result_count = None
+        self.show_full_result_count = False
+        self.show_admin_actions = True
+        self.result_list = page.object_list
+        self.can_show_all = False
+        self.multi_page = bool(self.cursor or self.next_cursor)
+        self.paginator = paginator
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """
+    ModelAdmin defaults for big tables. Subclasses set `list_select_related`
+    for the foreign keys they display and `autocomplete_fields` for those
+    they edit, and `cursor_field` (newest first, ties broken on pk) to page
+    with a cursor.
+    """
+
+    cursor_field = None
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    show_facets = admin.ShowFacets.NEVER
+    list_per_page = 50
+
+    def get_changelist(self, request, **kwargs):
+        return CursorChangeList
+
+    def get_ordering(self, request):
+        if self.cursor_field:
+            return (f'-{self.cursor_field}', '-pk')
+        return super().get_ordering(request)
@@ -0,0 +1,13 @@
+from functools import cache, partial
+
+from .inbox import unread_count
+
+
+def notifications(request):
+    """
+    `unread_notifications` for the navbar badge. It is only looked up if a
+    template uses it, and then comes from the cached inbox counter.
+    """
+    if not request.user.is_authenticated:
+        return {}
+    return {'unread_notifications': cache(partial(unread_count, request.user.pk))}
@@ -1,5 +1,6 @@
 # destinations/forms.py
 from django import forms
+from .geo import MAX_RADIUS_KM, MAX_RESULTS, BoundingBox
 from .models import Booking, Category, Destination, DestinationImage, Review, User,Profile
 
 
@@ -37,7 +38,7 @@ class DestinationForm(forms.ModelForm):
 
     class Meta:
         model = Destination
-        fields = ['name', 'description', 'location', 'price', 'categories']
+        fields = ['name', 'description', 'location', 'latitude', 'longitude', 'price', 'categories']
     
     # Customizing the category field (optional)
     categories = forms.ModelMultipleChoiceField(
@@ -73,7 +74,7 @@ class BookingForm(forms.ModelForm):
 
     class Meta:
         model = Booking
-        fields = ['start_date', 'end_date', 'payment_method']  # Add payment_method to the fields list
+        fields = ['start_date', 'end_date', 'guests', 'payment_method']  # Add payment_method to the fields list
         widgets = {
             'start_date': forms.DateInput(attrs={'type': 'date'}),
             'end_date': forms.DateInput(attrs={'type': 'date'}),
@@ -84,3 +85,77 @@ class BookingForm(forms.ModelForm):
         super().__init__(*args, **kwargs)
         self.fields['payment_method'].widget = forms.Select(choices=Booking.PAYMENT_METHOD_CHOICES)
         self.fields['payment_method'].label = "Payment Method"
+
+
+class DestinationFilterForm(forms.Form):
+    category = forms.IntegerField(required=False, min_value=1)
+    location = forms.CharField(required=False, max_length=255)
+    min_price = forms.DecimalField(required=False, min_value=0, max_digits=10, decimal_places=2)
+    max_price = forms.DecimalField(required=False, min_value=0, max_digits=10, decimal_places=2)
+    cursor = forms.CharField(required=False)
+    page_size = forms.IntegerField(required=False, min_value=1, max_value=100)
+
+    def filter(self, queryset):
+        data = self.cleaned_data
+        if data.get('category'):
+            queryset = queryset.filter(categories__id=data['category'])
+        if data.get('location'):
+            queryset = queryset.filter(location__icontains=data['location'])
+        if data.get('min_price') is not None:
+            queryset = queryset.filter(price__gte=data['min_price'])
+        if data.get('max_price') is not None:
+            queryset = queryset.filter(price__lte=data['max_price'])
+        return queryset
+
+
+class AvailabilityForm(forms.Form):
+    start = forms.DateField()
+    end = forms.DateField()
+    slots = forms.IntegerField(required=False, min_value=1)
+    cursor = forms.CharField(required=False)
+
+    # Longest range a single availability query may cover
+    MAX_DAYS = 366
+
+    def clean(self):
+        cleaned_data = super().clean()
+        start, end = cleaned_data.get('start'), cleaned_data.get('end')
+        if start and end:
+            if end < start:
+                raise forms.ValidationError("The end date must not be before the start date.")
+            if (end - start).days >= self.MAX_DAYS:
+                raise forms.ValidationError(f"Ranges are limited to {self.MAX_DAYS} days.")
+        return cleaned_data
+
+
+class NearbyForm(forms.Form):
+    lat = forms.FloatField(min_value=-90, max_value=90)
+    lng = forms.FloatField(min_value=-180, max_value=180)
+    radius = forms.FloatField(required=False, min_value=0.01, max_value=MAX_RADIUS_KM)
+    limit = forms.IntegerField(required=False, min_value=1, max_value=MAX_RESULTS)
+
+    # Kilometres searched when no radius is given
+    DEFAULT_RADIUS = 25
+
+
+class BoundingBoxForm(forms.Form):
+    # GeoJSON order: west,south,east,north
+    bbox = forms.CharField()
+    lat = forms.FloatField(required=False, min_value=-90, max_value=90)
+    lng = forms.FloatField(required=False, min_value=-180, max_value=180)
+    limit = forms.IntegerField(required=False, min_value=1, max_value=MAX_RESULTS)
+
+    def clean_bbox(self):
+        try:
+            west, south, east, north = (float(value) for value in self.cleaned_data['bbox'].split(','))
+        except ValueError:
+            raise forms.ValidationError("Expected west,south,east,north in degrees.")
+        if not (-180 <= west <= east <= 180 and -90 <= south <= north <= 90):
+            raise forms.ValidationError("Expected west <= east and south <= north, within the world.")
+        return BoundingBox(south, west, north, east)
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if (cleaned_data.get('lat') is None) != (cleaned_data.get('lng') is None):
+            raise forms.ValidationError("Give both lat and lng, or neither.")
+        return cleaned_data
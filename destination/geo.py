@@ -0,0 +1,394 @@
+"""
+Destination coordinates and "near me" queries.
+
+Destinations have an optional latitude and longitude (WGS84 degrees), set
+by partners or by `manage.py geocode_destinations` from a local gazetteer.
+`nearby_destinations()` returns the destinations within a radius of a
+point, nearest first, and `destinations_in_box()` those inside a bounding
+box, nearest to its centre (or to a given point) first.
+
+Both ask a spatial backend for candidates, chosen like the search backend
+(settings.GEO_BACKEND, or by database vendor):
+
+* RTreeGeoBackend, on SQLite: the points live in an R-tree virtual table,
+  destination_geo. Triggers on the destination table keep it in sync, so
+  bulk_create() and queryset.update() are covered too, which signals
+  would miss. Candidates are found and ranked inside the R-tree, and only
+  the winners' rows are read.
+* DatabaseGeoBackend, elsewhere: range filters on the (latitude, longitude)
+  index.
+
+Candidates are ranked on an equirectangular approximation of the distance,
+which is within 0.1% of the great-circle distance at the scale of a
+country. The exact (haversine) distance is then computed for the winners
+only and used for the radius cut and the final order. Ranking still reads
+every point in the box, so a nearby search starts with a small box and
+grows it until it holds enough points closer than its half-width, rather
+than ranking the whole radius around a busy town. Boxes are clamped
+at the antimeridian rather than wrapped around it.
+
+`geocode_destinations()` (`manage.py geocode_destinations`) fills in
+missing coordinates offline by matching each destination's free-text
+location against a gazetteer file: GAZETTEER_PATH by default, the
+approximate centres of Burundi's provincial capitals and main sites, or any
+GeoNames country dump.
+"""
+import csv
+import math
+import re
+import unicodedata
+from collections import Counter
+from dataclasses import dataclass
+from pathlib import Path
+from typing import NamedTuple
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F, FloatField
+from django.db.models.expressions import ExpressionWrapper
+from django.utils.module_loading import import_string
+
+from .models import Destination
+
+GEO_TABLE = 'destination_geo'
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+MAX_RADIUS_KM = 500
+MAX_RESULTS = 100
+# First search radius of nearby_destinations(), and how fast it grows.
+INITIAL_RADIUS_KM = 2
+RADIUS_GROWTH = 2
+# Column positions in a GeoNames dump (tab-separated, no header).
+GEONAMES_COLUMNS = {'name': 1, 'asciiname': 2, 'alternate_names': 3, 'latitude': 4, 'longitude': 5}
+
+# Keep GEO_TABLE in step with the destination table. Also created by
+# migration 0013, and recreated by RTreeGeoBackend.install() when a table
+# rebuild by a later migration drops them.
+_POINT = "NEW.id, NEW.latitude, NEW.latitude, NEW.longitude, NEW.longitude"
+TRIGGERS = {
+    'destination_geo_insert': (
+        "AFTER INSERT ON {table} "
+        "WHEN NEW.latitude IS NOT NULL AND NEW.longitude IS NOT NULL BEGIN "
+        f"INSERT INTO {GEO_TABLE} VALUES ({_POINT}); END"
+    ),
+    'destination_geo_update': (
+        "AFTER UPDATE OF id, latitude, longitude ON {table} BEGIN "
+        f"DELETE FROM {GEO_TABLE} WHERE id = OLD.id; "
+        f"INSERT INTO {GEO_TABLE} SELECT {_POINT} "
+        "WHERE NEW.latitude IS NOT NULL AND NEW.longitude IS NOT NULL; END"
+    ),
+    'destination_geo_delete': (
+        f"AFTER DELETE ON {{table}} BEGIN DELETE FROM {GEO_TABLE} WHERE id = OLD.id; END"
+    ),
+}
+
+
+class BoundingBox(NamedTuple):
+    south: float
+    west: float
+    north: float
+    east: float
+
+    @classmethod
+    def around(cls, latitude, longitude, radius_km):
+        """The smallest box holding every point within `radius_km` of (latitude, longitude)."""
+        dlat = radius_km / KM_PER_DEGREE
+        scale = math.cos(math.radians(latitude))
+        dlng = 180.0 if scale < 1e-9 else min(radius_km / (KM_PER_DEGREE * scale), 180.0)
+        return cls(
+            max(latitude - dlat, -90.0), max(longitude - dlng, -180.0),
+            min(latitude + dlat, 90.0), min(longitude + dlng, 180.0),
+        )
+
+    @property
+    def center(self):
+        return (self.south + self.north) / 2, (self.west + self.east) / 2
+
+
+@dataclass
+class GeoResult:
+    destination: Destination
+    distance_km: float
+
+
+def validate_point(latitude, longitude):
+    if not -90 <= latitude <= 90 or not -180 <= longitude <= 180:
+        raise ValueError(f"({latitude}, {longitude}) is not a latitude and longitude.")
+
+
+def haversine_km(latitude1, longitude1, latitude2, longitude2):
+    """Great-circle distance between two points, in kilometres."""
+    phi1, phi2 = math.radians(latitude1), math.radians(latitude2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(longitude2 - longitude1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def _longitude_scale(latitude):
+    """Squared length of a degree of longitude at `latitude`, in degrees of latitude."""
+    return math.cos(math.radians(latitude)) ** 2
+
+
+class BaseGeoBackend:
+    def candidates(self, box, origin, limit):
+        """
+        (id, approximate distance in km) for up to `limit` destinations
+        inside `box`, nearest to `origin` (a (latitude, longitude) pair) first.
+        """
+        raise NotImplementedError
+
+    def rebuild(self):
+        """Rebuild the spatial index from the destination table. Returns the number of points indexed."""
+        raise NotImplementedError
+
+    def install(self):
+        """Repair the index after migrations, if the backend needs to."""
+
+
+class DatabaseGeoBackend(BaseGeoBackend):
+    """Portable fallback: the latitude range narrows the scan through destination_coordinates_idx."""
+
+    def candidates(self, box, origin, limit):
+        latitude, longitude = origin
+        dlat = F('latitude') - latitude
+        dlng = F('longitude') - longitude
+        distance = ExpressionWrapper(
+            dlat * dlat + dlng * dlng * _longitude_scale(latitude), output_field=FloatField(),
+        )
+        return list(
+            Destination.objects.filter(
+                latitude__range=(box.south, box.north), longitude__range=(box.west, box.east),
+            )
+            .annotate(approximate_distance=distance)
+            .order_by('approximate_distance', 'pk')
+            .values_list('pk', 'approximate_distance')[:limit]
+        )
+
+    def rebuild(self):
+        return Destination.objects.filter(latitude__isnull=False, longitude__isnull=False).count()
+
+
+class RTreeGeoBackend(BaseGeoBackend):
+    """
+    SQLite R-tree of destination points (min = max on both axes). The
+    R-tree stores 32-bit floats, about a metre at these magnitudes, which
+    is fine for ranking; exact distances come from the destination rows.
+    """
+
+    def candidates(self, box, origin, limit):
+        latitude, longitude = origin
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT id, (min_lat - %s) * (min_lat - %s) + (min_lng - %s) * (min_lng - %s) * %s AS d '
+                f'FROM {GEO_TABLE} '
+                'WHERE min_lat <= %s AND max_lat >= %s AND min_lng <= %s AND max_lng >= %s '
+                'ORDER BY d, id LIMIT %s',
+                [latitude, latitude, longitude, longitude, _longitude_scale(latitude),
+                 box.north, box.south, box.east, box.west, limit],
+            )
+            return cursor.fetchall()
+
+    @transaction.atomic
+    def rebuild(self):
+        table = Destination._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {GEO_TABLE}')
+            cursor.execute(
+                f'INSERT INTO {GEO_TABLE} SELECT id, latitude, latitude, longitude, longitude FROM {table} '
+                'WHERE latitude IS NOT NULL AND longitude IS NOT NULL'
+            )
+            return cursor.rowcount
+
+    def install(self):
+        """
+        Recreate the triggers if a migration rebuilt the destination table
+        (SQLite drops a table's triggers with it), and refill the R-tree
+        they would have maintained in the meantime.
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT name FROM sqlite_master WHERE type IN ('table', 'trigger') AND name IN (%s, %s, %s, %s)",
+                [GEO_TABLE, *TRIGGERS],
+            )
+            existing = {row[0] for row in cursor.fetchall()}
+            if GEO_TABLE not in existing or existing.issuperset(TRIGGERS):
+                return
+            for name, body in TRIGGERS.items():
+                cursor.execute(
+                    f'CREATE TRIGGER IF NOT EXISTS {name} {body.format(table=Destination._meta.db_table)}'
+                )
+        self.rebuild()
+
+
+_backend = None
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        path = getattr(settings, 'GEO_BACKEND', None)
+        if path is None:
+            path = (
+                'destination.geo.RTreeGeoBackend'
+                if connection.vendor == 'sqlite'
+                else 'destination.geo.DatabaseGeoBackend'
+            )
+        _backend = import_string(path)()
+    return _backend
+
+
+def _candidates(box, origin, limit):
+    """The backend's candidates, with the approximate distance converted from squared degrees to km."""
+    return [(pk, math.sqrt(distance) * KM_PER_DEGREE) for pk, distance in get_backend().candidates(box, origin, limit)]
+
+
+def _results(ids, origin, radius_km=None, queryset=None):
+    destinations = (queryset if queryset is not None else Destination.objects.select_related('partner')).in_bulk(ids)
+    results = []
+    for pk in ids:
+        destination = destinations.get(pk)
+        if destination is None or destination.latitude is None or destination.longitude is None:
+            continue
+        distance = haversine_km(*origin, destination.latitude, destination.longitude)
+        if radius_km is None or distance <= radius_km:
+            results.append(GeoResult(destination, distance))
+    results.sort(key=lambda result: (result.distance_km, result.destination.pk))
+    return results
+
+
+def nearby_destinations(latitude, longitude, radius_km, limit=20, queryset=None):
+    """
+    GeoResults for the `limit` destinations nearest to (latitude,
+    longitude) within `radius_km`, nearest first. `queryset` (default:
+    destinations with their partner) loads the rows.
+    """
+    validate_point(latitude, longitude)
+    origin = (latitude, longitude)
+    search_km = min(INITIAL_RADIUS_KM, radius_km)
+    while True:
+        candidates = _candidates(BoundingBox.around(latitude, longitude, search_km), origin, limit)
+        # Every point within search_km is in the box, so once `limit` of
+        # them are that close, no point outside the box can rank higher.
+        if search_km >= radius_km or (len(candidates) == limit and candidates[-1][1] <= search_km):
+            break
+        search_km = min(search_km * RADIUS_GROWTH, radius_km)
+    return _results([pk for pk, _ in candidates], origin, radius_km, queryset)
+
+
+def destinations_in_box(box, limit=20, origin=None, queryset=None):
+    """GeoResults for up to `limit` destinations inside `box`, nearest to `origin` (default: its centre) first."""
+    origin = origin or box.center
+    validate_point(*origin)
+    return _results([pk for pk, _ in _candidates(box, origin, limit)], origin, queryset=queryset)
+
+
+# Offline geocoding
+
+def normalize_place(name):
+    """'Chutes de la Karéra ' -> 'chutes de la karera': lowercase, no accents or punctuation."""
+    decomposed = unicodedata.normalize('NFKD', name)
+    stripped = ''.join(ch for ch in decomposed if not unicodedata.combining(ch)).lower()
+    return ' '.join(re.findall(r'\w+', stripped))
+
+
+class Gazetteer:
+    """Place names (and alternate names) mapped to coordinates, loaded from a local file."""
+
+    def __init__(self, places=None):
+        self.places = places or {}
+
+    @classmethod
+    def load(cls, path):
+        """
+        Read a CSV file with a header naming at least name, latitude and
+        longitude columns, plus an optional '|'-separated alternate_names,
+        or a GeoNames dump (.txt, tab-separated). The first place listed
+        under a name wins.
+        """
+        path = Path(path)
+        places = {}
+        with path.open(newline='', encoding='utf-8') as file:
+            if path.suffix == '.txt':
+                rows = (
+                    {key: row[index] for key, index in GEONAMES_COLUMNS.items()}
+                    for row in csv.reader(file, delimiter='\t', quoting=csv.QUOTE_NONE)
+                    if len(row) > GEONAMES_COLUMNS['longitude']
+                )
+                separator = ','
+            else:
+                rows = csv.DictReader(file)
+                separator = '|'
+            for row in rows:
+                point = (float(row['latitude']), float(row['longitude']))
+                validate_point(*point)
+                names = [row['name'], row.get('asciiname') or '', *(row.get('alternate_names') or '').split(separator)]
+                for name in names:
+                    key = normalize_place(name)
+                    if key:
+                        places.setdefault(key, point)
+        return cls(places)
+
+    def lookup(self, location):
+        """
+        Coordinates for a free-text location, or None. The whole text is
+        tried first, then each comma-separated part ('Saga Beach,
+        Bujumbura'), then each run of words within them, longest first.
+        """
+        key = normalize_place(location or '')
+        if not key:
+            return None
+        if key in self.places:
+            return self.places[key]
+        for part in re.split(r'[,;/()]', location):
+            part = normalize_place(part)
+            if part in self.places:
+                return self.places[part]
+        words = key.split()
+        for size in range(len(words) - 1, 0, -1):
+            for start in range(len(words) - size + 1):
+                point = self.places.get(' '.join(words[start:start + size]))
+                if point is not None:
+                    return point
+        return None
+
+
+def default_gazetteer_path():
+    return getattr(settings, 'GAZETTEER_PATH', Path(__file__).resolve().parent / 'data' / 'gazetteer.csv')
+
+
+def geocode_destinations(gazetteer, overwrite=False, batch_size=1000, dry_run=False):
+    """
+    Set the coordinates of destinations without any (or of all, with
+    `overwrite`) from `gazetteer`, matching on the location and then the
+    name. Returns (the number geocoded, a Counter of the locations not
+    found). The R-tree follows through its triggers.
+    """
+    destinations = Destination.objects.only('pk', 'name', 'location', 'latitude', 'longitude').order_by('pk')
+    if not overwrite:
+        destinations = destinations.filter(latitude__isnull=True)
+    cache = {}
+    geocoded = 0
+    unmatched = Counter()
+    batch = []
+
+    def flush():
+        if batch and not dry_run:
+            with transaction.atomic():
+                Destination.objects.bulk_update(batch, ['latitude', 'longitude'])
+        batch.clear()
+
+    for destination in destinations.iterator(chunk_size=batch_size):
+        if destination.location not in cache:
+            cache[destination.location] = gazetteer.lookup(destination.location)
+        point = cache[destination.location] or gazetteer.lookup(destination.name)
+        if point is None:
+            unmatched[destination.location] += 1
+            continue
+        destination.latitude, destination.longitude = point
+        batch.append(destination)
+        geocoded += 1
+        if len(batch) >= batch_size:
+            flush()
+    flush()
+    return geocoded, unmatched
@@ -0,0 +1,185 @@
+"""
+Responsive image variants.
+
+Uploaded images are kept as-is, and a background task writes resized
+copies next to them in modern formats: one file per width bucket and
+format, plus a tiny inline placeholder (LQIP) that is shown while the real
+image loads. The result is stored in a JSON field named
+`<image field>_variants` on the same model:
+
+    {
+        "source": "destination_images/falls.jpg",
+        "width": 4032, "height": 3024,
+        "formats": {"avif": {"320": "variants/destination_images/falls-320.avif", ...},
+                    "webp": {...}},
+        "placeholder": "data:image/webp;base64,...",
+    }
+
+`ResponsiveImage` turns that into `srcset` strings for templates and the
+API. Until the variants exist it simply falls back to the original.
+"""
+import base64
+import posixpath
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps, features
+
+WIDTHS = (320, 640, 960, 1280, 1920)
+PLACEHOLDER_WIDTH = 16
+VARIANTS_DIR = 'variants'
+
+# Preferred first; formats this Pillow build cannot encode are left out.
+FORMATS = [fmt for fmt in ('avif', 'webp') if features.check(fmt)]
+MIME_TYPES = {'avif': 'image/avif', 'webp': 'image/webp'}
+SAVE_OPTIONS = {
+    'avif': {'quality': 50, 'speed': 6},
+    'webp': {'quality': 75, 'method': 4},
+}
+
+# (model label, image field) for every image that gets variants.
+IMAGE_FIELDS = (
+    ('destination.DestinationImage', 'image'),
+    ('destination.PartnerProfile', 'logo'),
+    ('destination.Profile', 'profile_picture'),
+)
+
+
+def variants_field(field_name):
+    return f'{field_name}_variants'
+
+
+def needs_variants(field_file, variants):
+    """True when `field_file` holds an image whose variants are missing or stale."""
+    return bool(field_file) and (variants or {}).get('source') != field_file.name
+
+
+def _variant_name(source_name, width, fmt):
+    stem, _ = posixpath.splitext(source_name)
+    return posixpath.join(VARIANTS_DIR, f'{stem}-{width}.{fmt}')
+
+
+def _open(field_file):
+    with field_file.open('rb') as handle:
+        image = Image.open(handle)
+        # Apply the camera orientation before resizing, then drop metadata.
+        image = ImageOps.exif_transpose(image)
+        image.load()
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'transparency' in image.info or image.mode in ('LA', 'PA') else 'RGB')
+    return image
+
+
+def _encode(image, fmt, **options):
+    buffer = BytesIO()
+    image.save(buffer, format=fmt.upper(), **options)
+    return buffer.getvalue()
+
+
+def _resize(image, width):
+    height = max(1, round(image.height * width / image.width))
+    return image.resize((width, height), Image.Resampling.LANCZOS)
+
+
+def placeholder(image):
+    """A PLACEHOLDER_WIDTH-pixel WebP data: URI (a few hundred bytes) that browsers stretch into a blur."""
+    small = _resize(image, min(PLACEHOLDER_WIDTH, image.width))
+    data = _encode(small.convert('RGB'), 'webp', quality=30)
+    return 'data:image/webp;base64,' + base64.b64encode(data).decode('ascii')
+
+
+def bucket_widths(width):
+    """Width buckets to generate for an image `width` pixels wide; never upscales."""
+    widths = [bucket for bucket in WIDTHS if bucket < width]
+    if width <= WIDTHS[-1]:
+        widths.append(width)
+    return widths
+
+
+def generate_variants(field_file):
+    """
+    Write every width bucket of `field_file` in every supported format to the
+    field's storage and return the variants description. The source image
+    is decoded once and each bucket is resized from the previous, larger one.
+    """
+    storage = field_file.storage
+    image = _open(field_file)
+    formats = {fmt: {} for fmt in FORMATS}
+    current = image
+    for width in sorted(bucket_widths(image.width), reverse=True):
+        if width != current.width:
+            current = _resize(current, width)
+        for fmt in FORMATS:
+            name = _variant_name(field_file.name, width, fmt)
+            if storage.exists(name):
+                storage.delete(name)
+            formats[fmt][str(width)] = storage.save(name, ContentFile(_encode(current, fmt, **SAVE_OPTIONS[fmt])))
+    return {
+        'source': field_file.name,
+        'width': image.width,
+        'height': image.height,
+        'formats': formats,
+        'placeholder': placeholder(image),
+    }
+
+
+def delete_variants(storage, variants):
+    for names in (variants or {}).get('formats', {}).values():
+        for name in names.values():
+            storage.delete(name)
+
+
+class ResponsiveImage:
+    """Template/API view of an image field and its stored variants."""
+
+    def __init__(self, field_file, variants=None):
+        self.file = field_file
+        variants = variants or {}
+        # Variants of a previous upload must not be served for the new one.
+        self.variants = variants if field_file and variants.get('source') == field_file.name else {}
+
+    def __bool__(self):
+        return bool(self.file)
+
+    @property
+    def src(self):
+        return self.file.url if self.file else ''
+
+    @property
+    def width(self):
+        return self.variants.get('width')
+
+    @property
+    def height(self):
+        return self.variants.get('height')
+
+    @property
+    def placeholder(self):
+        return self.variants.get('placeholder', '')
+
+    def srcset(self, fmt):
+        storage = self.file.storage
+        names = self.variants.get('formats', {}).get(fmt, {})
+        return ', '.join(
+            f'{storage.url(name)} {width}w'
+            for width, name in sorted(names.items(), key=lambda item: int(item[0]))
+        )
+
+    @property
+    def sources(self):
+        """[{'type': mime type, 'srcset': ...}] in order of preference, for <picture>."""
+        sources = []
+        for fmt in self.variants.get('formats', {}):
+            srcset = self.srcset(fmt)
+            if srcset:
+                sources.append({'type': MIME_TYPES.get(fmt, f'image/{fmt}'), 'srcset': srcset})
+        return sources
+
+    def as_dict(self):
+        return {
+            'url': self.src,
+            'width': self.width,
+            'height': self.height,
+            'placeholder': self.placeholder or None,
+            'sources': self.sources,
+        }
@@ -0,0 +1,219 @@
+"""
+Notification inbox: paginated reads, unread counters and retention.
+
+Each user has a NotificationInbox row. A notification is read when its id
+is at or below the inbox's `read_up_to` high-water mark or when it was
+marked read on its own (`is_read`). Opening the inbox moves the mark
+instead of updating rows, and the unread count is adjusted as
+notifications are written and read, so showing the badge never counts
+rows. The count is also kept in the cache, where most page renders find
+it without touching the database at all.
+
+Every change bumps the user's 'notifications:<id>' cache generation, which
+is what open notification streams watch (see views.notification_stream).
+"""
+import asyncio
+import time
+from collections import defaultdict
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Case, F, Q, Value, When
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .caching import aget_generation, bump_generation
+from .models import Notification, NotificationInbox
+
+UNREAD_CACHE_TIMEOUT = 300
+UPDATE_BATCH_SIZE = 250
+RETENTION_DAYS = getattr(settings, 'NOTIFICATION_RETENTION_DAYS', 90)
+
+
+def _unread_key(user_id):
+    return f'notifications:unread:{user_id}'
+
+
+def generation_namespace(user_id):
+    return f'notifications:{user_id}'
+
+
+def _changed(user_ids, unread=None):
+    """After commit: refresh the cached counters and wake the users' streams."""
+    user_ids = list(user_ids)
+
+    def publish():
+        if unread is None:
+            cache.delete_many([_unread_key(user_id) for user_id in user_ids])
+        else:
+            cache.set_many({_unread_key(user_id): unread for user_id in user_ids}, UNREAD_CACHE_TIMEOUT)
+        bump_generation(*(generation_namespace(user_id) for user_id in user_ids))
+
+    transaction.on_commit(publish)
+
+
+# Counters
+
+def unread_count(user_id):
+    count = cache.get(_unread_key(user_id))
+    if count is None:
+        count = NotificationInbox.objects.filter(user_id=user_id).values_list('unread_count', flat=True).first() or 0
+        cache.add(_unread_key(user_id), count, UNREAD_CACHE_TIMEOUT)
+    return count
+
+
+def get_inbox(user_id):
+    return NotificationInbox.objects.get_or_create(user_id=user_id)[0]
+
+
+def record_delivered(notifications):
+    """Count freshly written notifications as unread for their users."""
+    per_user = defaultdict(list)
+    for notification in notifications:
+        per_user[notification.user_id].append(notification.pk)
+    if not per_user:
+        return
+
+    NotificationInbox.objects.bulk_create(
+        [NotificationInbox(user_id=user_id) for user_id in per_user], ignore_conflicts=True,
+    )
+    # Users who received the same number share an UPDATE (one per
+    # UPDATE_BATCH_SIZE users, to stay under the query parameter limit), so
+    # a bulk message to many users is one statement. Each user's own newest
+    # id is picked with a CASE.
+    by_count = defaultdict(list)
+    for user_id, ids in per_user.items():
+        by_count[len(ids)].append(user_id)
+    with transaction.atomic():
+        for count, user_ids in by_count.items():
+            for start in range(0, len(user_ids), UPDATE_BATCH_SIZE):
+                batch = user_ids[start:start + UPDATE_BATCH_SIZE]
+                latest = Case(
+                    *[When(user_id=user_id, then=Value(max(per_user[user_id]))) for user_id in batch],
+                    default=F('latest_id'),
+                    output_field=NotificationInbox._meta.get_field('latest_id'),
+                )
+                NotificationInbox.objects.filter(user_id__in=batch).update(
+                    unread_count=F('unread_count') + count,
+                    latest_id=Greatest(F('latest_id'), latest),
+                )
+
+    def publish():
+        for user_id, ids in per_user.items():
+            try:
+                cache.incr(_unread_key(user_id), len(ids))
+            except ValueError:
+                pass  # Not cached; the next read loads it from the inbox row.
+        bump_generation(*(generation_namespace(user_id) for user_id in per_user))
+
+    transaction.on_commit(publish)
+
+
+def mark_read(user_id, up_to=None):
+    """
+    Mark every notification of the user with an id up to `up_to` (default:
+    all of them) as read. Returns the new unread count.
+    """
+    with transaction.atomic():
+        get_inbox(user_id)
+        inbox = NotificationInbox.objects.select_for_update().get(user_id=user_id)
+        up_to = inbox.latest_id if up_to is None else min(up_to, inbox.latest_id)
+        if up_to <= inbox.read_up_to:
+            return inbox.unread_count
+        if up_to >= inbox.latest_id:
+            unread = 0
+        else:
+            # Only the range between the old and the new mark is looked at.
+            newly_read = Notification.objects.filter(
+                user_id=user_id, pk__gt=inbox.read_up_to, pk__lte=up_to, is_read=False,
+            ).count()
+            unread = max(0, inbox.unread_count - newly_read)
+        NotificationInbox.objects.filter(pk=inbox.pk).update(read_up_to=up_to, unread_count=unread)
+        _changed([user_id], unread)
+    return unread
+
+
+def mark_one_read(notification):
+    with transaction.atomic():
+        updated = Notification.objects.filter(pk=notification.pk, is_read=False).update(is_read=True)
+        notification.is_read = True
+        if not updated:
+            return
+        decremented = NotificationInbox.objects.filter(
+            user_id=notification.user_id, read_up_to__lt=notification.pk, unread_count__gt=0,
+        ).update(unread_count=F('unread_count') - 1)
+        if decremented:
+            _changed([notification.user_id])
+
+
+def recount(user_ids):
+    """
+    Recompute the inboxes of `user_ids` from the notification rows. Used
+    after bulk changes that bypass the counters, e.g. admin actions.
+    """
+    user_ids = list(user_ids)
+    with transaction.atomic():
+        NotificationInbox.objects.bulk_create(
+            [NotificationInbox(user_id=user_id) for user_id in user_ids], ignore_conflicts=True,
+        )
+        for inbox in NotificationInbox.objects.select_for_update().filter(user_id__in=user_ids):
+            notifications = Notification.objects.filter(user_id=inbox.user_id)
+            inbox.latest_id = max(inbox.latest_id, notifications.order_by('-pk').values_list('pk', flat=True).first() or 0)
+            inbox.unread_count = notifications.filter(pk__gt=inbox.read_up_to, is_read=False).count()
+            inbox.save(update_fields=['latest_id', 'unread_count'])
+        _changed(user_ids)
+
+
+# Reading
+
+def is_unread(notification, read_up_to):
+    return not notification.is_read and notification.pk > read_up_to
+
+
+async def anew_notifications(user_id, after, limit=100):
+    return [
+        notification
+        async for notification in Notification.objects.filter(user_id=user_id, pk__gt=after)
+        .order_by('pk').only('pk', 'message', 'created_at')[:limit]
+    ]
+
+
+async def await_change(user_id, generation, timeout, poll_interval=1.0):
+    """
+    Wait until the user's notification generation differs from `generation`
+    or `timeout` seconds pass, and return the current generation.
+    """
+    deadline = time.monotonic() + timeout
+    namespace = generation_namespace(user_id)
+    while True:
+        current = await aget_generation(namespace)
+        remaining = deadline - time.monotonic()
+        if current != generation or remaining <= 0:
+            return current
+        await asyncio.sleep(min(poll_interval, remaining))
+
+
+aunread_count = sync_to_async(unread_count)
+amark_read = sync_to_async(mark_read)
+
+
+# Retention
+
+def purge_read(days=RETENTION_DAYS, batch_size=1000):
+    """
+    Delete read notifications older than `days`, in batches, so the table
+    stays bounded. Unread ones are kept whatever their age, so no counter
+    changes. Returns the number deleted.
+    """
+    cutoff = timezone.now() - timedelta(days=days)
+    read = Q(is_read=True) | Q(pk__lte=F('user__notification_inbox__read_up_to'))
+    candidates = Notification.objects.filter(read, created_at__lt=cutoff).order_by('pk')
+    deleted = 0
+    while True:
+        batch = list(candidates.values_list('pk', flat=True)[:batch_size])
+        if not batch:
+            return deleted
+        deleted += Notification.objects.filter(pk__in=batch).delete()[0]
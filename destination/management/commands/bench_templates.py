@@ -0,0 +1,55 @@
+import json
+from pathlib import Path
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from destination.bench import BENCH_PREFIX, run_template_benchmark
+
+
+class Command(BaseCommand):
+    help = (
+        "Render every template with the context its view gives it and report the "
+        "render time as served, without fragment caching and without the cached "
+        "loader, and the memory one render allocates. Run it against a database "
+        "filled by seed_bench."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('names', nargs='*', metavar='TEMPLATE', help="Templates to render (default: all).")
+        parser.add_argument('--iterations', type=int, default=50, help="Measured renders per template and setup.")
+        parser.add_argument(
+            '--user', default=f'{BENCH_PREFIX}customer-0',
+            help="Username the request comes from (default: the busiest bench customer).",
+        )
+        parser.add_argument('--anonymous', action='store_true', help="Render for a logged-out visitor.")
+        parser.add_argument('--output', help="Write the results as JSON to this file.")
+
+    def handle(self, *args, **options):
+        user = None
+        if not options['anonymous']:
+            try:
+                user = get_user_model().objects.get(username=options['user'])
+            except get_user_model().DoesNotExist:
+                raise CommandError(f"No user named {options['user']!r}; run seed_bench first or pass --user.")
+
+        self.stdout.write(
+            f"{'template':<32} {'render ms':>10} {'no fragments':>13} {'no loader cache':>16} "
+            f"{'alloc KiB':>10} {'queries':>8}"
+        )
+
+        def progress(name, result):
+            self.stdout.write(
+                f"{name:<32} {result['render_ms']:>10.3f} {result['no_fragment_cache_ms']:>13.3f} "
+                f"{result['no_cached_loader_ms']:>16.3f} {result['alloc_kib']:>10.1f} {result['queries']:>8}"
+            )
+
+        results = run_template_benchmark(
+            user, names=options['names'] or None, iterations=options['iterations'], progress=progress,
+        )
+        for name, reason in results['skipped'].items():
+            self.stdout.write(f"{name:<32} skipped: {reason}")
+
+        if options['output']:
+            Path(options['output']).write_text(json.dumps(results, indent=2) + '\n')
+            self.stdout.write(f"Results written to {options['output']}.")
@@ -0,0 +1,94 @@
+import json
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from destination.bench import BENCH_PREFIX, compare, run_benchmark
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure p50/p99 latency and queries per request of every URL in "
+        "destination/urls.py, one request at a time, and compare them with the "
+        "stored baseline. Run it against a database filled by seed_bench."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=50, help="Measured requests per URL.")
+        parser.add_argument('--warmup', type=int, default=5, help="Unmeasured requests sent first, to fill caches.")
+        parser.add_argument(
+            '--user', default=f'{BENCH_PREFIX}customer-0',
+            help="Username to log in as (default: the busiest bench customer).",
+        )
+        parser.add_argument('--anonymous', action='store_true', help="Request the URLs logged out.")
+        parser.add_argument('--only', nargs='+', metavar='NAME', help="URL names to measure, e.g. destinations api:destination-list.")
+        parser.add_argument('--output', help="Write the results as JSON to this file.")
+        parser.add_argument(
+            '--baseline', default=str(settings.BENCHMARK_BASELINE),
+            help="Baseline to compare with (default: settings.BENCHMARK_BASELINE).",
+        )
+        parser.add_argument('--update-baseline', action='store_true', help="Store the results as the new baseline.")
+        parser.add_argument(
+            '--tolerance', type=float, default=0.5,
+            help="Allowed p99 slowdown against the baseline, as a fraction (default 0.5).",
+        )
+        parser.add_argument(
+            '--fail-on-regression', action='store_true',
+            help="Exit with an error when a URL regressed, e.g. in CI.",
+        )
+
+    def handle(self, *args, **options):
+        user = None
+        if not options['anonymous']:
+            try:
+                user = get_user_model().objects.get(username=options['user'])
+            except get_user_model().DoesNotExist:
+                raise CommandError(f"No user named {options['user']!r}; run seed_bench first or pass --user.")
+
+        baseline_path = Path(options['baseline'])
+        baseline = json.loads(baseline_path.read_text()) if baseline_path.exists() else None
+
+        self.stdout.write(f"{'url':<28} {'status':>6} {'p50 ms':>8} {'p99 ms':>8} {'queries':>8}  {'baseline p99/queries'}")
+
+        def progress(name, result):
+            before = (baseline or {}).get('urls', {}).get(name)
+            reference = f"{before['p99_ms']:>8.2f} {before['queries']:>4}" if before else ''
+            self.stdout.write(
+                f"{name:<28} {result['status']:>6} {result['p50_ms']:>8.2f} {result['p99_ms']:>8.2f} "
+                f"{result['queries']:>8}  {reference}"
+            )
+
+        results = run_benchmark(
+            user, iterations=options['iterations'], warmup=options['warmup'], only=options['only'], progress=progress,
+        )
+        for name, reason in results['skipped'].items():
+            self.stdout.write(f"{name:<28} skipped: {reason}")
+
+        if options['output']:
+            Path(options['output']).write_text(json.dumps(results, indent=2) + '\n')
+            self.stdout.write(f"Results written to {options['output']}.")
+
+        if options['update_baseline']:
+            baseline_path.parent.mkdir(parents=True, exist_ok=True)
+            baseline_path.write_text(json.dumps(results, indent=2) + '\n')
+            self.stdout.write(self.style.SUCCESS(f"Baseline updated: {baseline_path}."))
+            return
+        if baseline is None:
+            self.stdout.write(f"No baseline at {baseline_path}; store one with --update-baseline.")
+            return
+
+        if baseline['meta']['rows'] != results['meta']['rows']:
+            self.stdout.write(self.style.WARNING(
+                "The baseline was measured on different data "
+                f"({baseline['meta']['rows']}); the comparison may not mean much."
+            ))
+        regressions = compare(results, baseline, tolerance=options['tolerance'])
+        if not regressions:
+            self.stdout.write(self.style.SUCCESS("No regressions against the baseline."))
+            return
+        for name, reasons in regressions.items():
+            self.stdout.write(self.style.ERROR(f"{name}: {', '.join(reasons)}"))
+        if options['fail_on_regression']:
+            raise CommandError(f"{len(regressions)} URLs regressed against {baseline_path}.")
@@ -0,0 +1,56 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from destination import analytics
+from destination.tasks import compact_rollups
+
+
+class Command(BaseCommand):
+    help = (
+        "Reconcile the recent analytics rollups with the booking and review tables, and fold "
+        "daily rows past the retention period into monthly ones. Run it nightly, e.g. from cron."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--retention-days', type=int, default=analytics.DAILY_RETENTION_DAYS,
+            help="Keep daily rows for at least this many days.",
+        )
+        parser.add_argument(
+            '--reconcile-days', type=int, default=analytics.RECONCILE_DAYS,
+            help="Recompute this many recent days from the source tables.",
+        )
+        parser.add_argument(
+            '--rebuild', type=int, metavar='DAYS',
+            help="Recompute the daily rows of the last DAYS days instead, e.g. after a bulk import.",
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help="Number of destinations (or partners) folded per transaction.",
+        )
+        parser.add_argument(
+            '--async', action='store_true', dest='run_async',
+            help="Queue the compaction for a worker instead of running it now.",
+        )
+
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            today = timezone.localdate()
+            rows = analytics.refresh(start=today - timedelta(days=options['rebuild'] - 1), end=today)
+            self.stdout.write(self.style.SUCCESS(f"Rebuilt {rows} daily destination rows."))
+            return
+
+        kwargs = {
+            'retention_days': options['retention_days'],
+            'reconcile_days': options['reconcile_days'],
+            'batch_size': options['batch_size'],
+        }
+        if options['run_async']:
+            compact_rollups.apply_async(kwargs=kwargs, idempotency_key=compact_rollups.name)
+            self.stdout.write(self.style.SUCCESS("Queued a rollup compaction."))
+            return
+
+        days, folded = compact_rollups(**kwargs)
+        self.stdout.write(self.style.SUCCESS(f"Reconciled {days} days and folded {folded} daily rows."))
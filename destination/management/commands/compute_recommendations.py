@@ -0,0 +1,38 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from destination.recommendations import RecommendationEngine
+from destination.tasks import refresh_recommendations
+
+
+class Command(BaseCommand):
+    help = "Score every user against every destination and store the top-K as AIRecommendation rows."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top-k', type=int, default=10, help="Recommendations kept per user.")
+        parser.add_argument('--chunk-size', type=int, default=512, help="Users scored per matrix product.")
+        parser.add_argument('--workers', type=int, default=None, help="Scoring threads (default: CPU count).")
+        parser.add_argument(
+            '--async', action='store_true', dest='run_async',
+            help="Queue the refresh for a worker instead of running it now.",
+        )
+
+    def handle(self, *args, **options):
+        if options['run_async']:
+            refresh_recommendations.apply_async(
+                kwargs={'top_k': options['top_k'], 'chunk_size': options['chunk_size'], 'workers': options['workers']},
+                idempotency_key=refresh_recommendations.name,
+            )
+            self.stdout.write(self.style.SUCCESS("Queued a recommendation refresh."))
+            return
+
+        started = time.monotonic()
+        engine = RecommendationEngine(
+            top_k=options['top_k'],
+            chunk_size=options['chunk_size'],
+            workers=options['workers'],
+        )
+        written = engine.run()
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(f"Wrote {written} recommendations in {elapsed:.1f}s."))
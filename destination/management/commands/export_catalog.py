@@ -0,0 +1,41 @@
+import sys
+from pathlib import Path
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from destination.catalog import FORMATS, KINDS, export_rows
+
+
+class Command(BaseCommand):
+    help = (
+        "Stream categories, activities, destinations or images to CSV or JSONL "
+        "without loading the table into memory."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=list(KINDS))
+        parser.add_argument('--format', choices=FORMATS, help="Output format (default: from the file extension, else csv).")
+        parser.add_argument('--output', '-o', help="File to write (default: standard output).")
+        parser.add_argument('--partner', help="Only export the destinations or images of this partner (username).")
+        parser.add_argument('--chunk-size', type=int, default=2000, help="Rows read from the database at a time.")
+
+    def handle(self, *args, **options):
+        partner = None
+        if options['partner']:
+            if not KINDS[options['kind']].partner_scoped:
+                raise CommandError(f"{options['kind']} are shared by all partners; drop --partner.")
+            try:
+                partner = get_user_model().objects.get(username=options['partner'], role='partner')
+            except get_user_model().DoesNotExist:
+                raise CommandError(f"No partner named {options['partner']!r}.")
+
+        output = options['output']
+        fmt = options['format'] or ('jsonl' if output and Path(output).suffix in ('.jsonl', '.ndjson') else 'csv')
+        chunks = export_rows(options['kind'], fmt, partner=partner, chunk_size=options['chunk_size'])
+        if not output:
+            sys.stdout.writelines(chunks)
+            return
+        with open(output, 'w', encoding='utf-8', newline='') as stream:
+            stream.writelines(chunks)
+        self.stderr.write(self.style.SUCCESS(f"Exported {options['kind']} to {output}."))
@@ -0,0 +1,54 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from destination.images import IMAGE_FIELDS, needs_variants, variants_field
+from destination.tasks import generate_image_variants, queue_image_variants
+
+
+class Command(BaseCommand):
+    help = "Generate the responsive variants of uploaded images that do not have them yet."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force', action='store_true',
+            help="Regenerate variants even where they are up to date.",
+        )
+        parser.add_argument(
+            '--async', action='store_true', dest='run_async',
+            help="Queue one background job per image instead of processing them here.",
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help="Number of rows read from the database at a time.",
+        )
+
+    def handle(self, *args, **options):
+        total = 0
+        for label, field_name in IMAGE_FIELDS:
+            model = apps.get_model(label)
+            field = variants_field(field_name)
+            rows = (
+                model.objects.exclude(Q(**{f'{field_name}__isnull': True}) | Q(**{field_name: ''}))
+                .only('pk', field_name, field)
+                .order_by('pk')
+            )
+            count = 0
+            for instance in rows.iterator(chunk_size=options['batch_size']):
+                field_file = getattr(instance, field_name)
+                if not (options['force'] or needs_variants(field_file, getattr(instance, field))):
+                    continue
+                args = (label, instance.pk, field_name, options['force'])
+                if options['run_async']:
+                    queue_image_variants(*args)
+                else:
+                    try:
+                        generate_image_variants(*args)
+                    except (OSError, ValueError) as exc:
+                        self.stderr.write(f"{label} {instance.pk}: {exc}")
+                        continue
+                count += 1
+            self.stdout.write(f"{label}.{field_name}: {count}")
+            total += count
+        verb = "Queued" if options['run_async'] else "Processed"
+        self.stdout.write(self.style.SUCCESS(f"{verb} {total} images."))
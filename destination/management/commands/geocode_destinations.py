@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from destination.geo import Gazetteer, default_gazetteer_path, geocode_destinations
+
+
+class Command(BaseCommand):
+    help = (
+        "Set destination coordinates offline, by matching locations against a local "
+        "gazetteer file (CSV with name,latitude,longitude[,alternate_names], or a GeoNames dump)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--gazetteer', default=None,
+            help="Gazetteer file (default: settings.GAZETTEER_PATH).",
+        )
+        parser.add_argument('--overwrite', action='store_true', help="Geocode destinations that already have coordinates too.")
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--dry-run', action='store_true', help="Report what would be geocoded without saving.")
+
+    def handle(self, *args, **options):
+        path = options['gazetteer'] or default_gazetteer_path()
+        try:
+            gazetteer = Gazetteer.load(path)
+        except (OSError, KeyError, ValueError) as exc:
+            raise CommandError(f"Could not read the gazetteer {path}: {exc}")
+        geocoded, unmatched = geocode_destinations(
+            gazetteer, overwrite=options['overwrite'], batch_size=options['batch_size'], dry_run=options['dry_run'],
+        )
+        for location, count in unmatched.most_common(10):
+            self.stdout.write(f"  not found: {location!r} ({count} destinations)")
+        verb = "Would geocode" if options['dry_run'] else "Geocoded"
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {geocoded} destinations from {len(gazetteer.places)} place names; "
+            f"{sum(unmatched.values())} left without coordinates."
+        ))
@@ -0,0 +1,77 @@
+import csv
+import sys
+from pathlib import Path
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from destination.catalog import FORMATS, KINDS, import_rows, read_rows
+
+
+class Command(BaseCommand):
+    help = (
+        "Upsert categories, activities, destinations or images from a CSV or JSONL "
+        "file, in chunks. Invalid rows are reported by line number and skipped."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=list(KINDS))
+        parser.add_argument('path', help="File to read, or - for standard input.")
+        parser.add_argument('--format', choices=FORMATS, help="Input format (default: from the file extension, else csv).")
+        parser.add_argument(
+            '--partner',
+            help="Import destinations or images on behalf of this partner (username); "
+                 "rows of other partners are rejected.",
+        )
+        parser.add_argument('--batch-size', type=int, default=1000, help="Rows written per bulk_create/bulk_update.")
+        parser.add_argument('--errors', help="Also write the rejected rows' line numbers and errors to this CSV file.")
+        parser.add_argument('--dry-run', action='store_true', help="Validate and report without writing anything.")
+
+    def handle(self, *args, **options):
+        partner = None
+        if options['partner']:
+            if not KINDS[options['kind']].partner_scoped:
+                raise CommandError(f"{options['kind']} are shared by all partners; drop --partner.")
+            try:
+                partner = get_user_model().objects.get(username=options['partner'], role='partner')
+            except get_user_model().DoesNotExist:
+                raise CommandError(f"No partner named {options['partner']!r}.")
+
+        path = options['path']
+        fmt = options['format'] or ('jsonl' if Path(path).suffix in ('.jsonl', '.ndjson') else 'csv')
+        error_file = open(options['errors'], 'w', encoding='utf-8', newline='') if options['errors'] else None
+        error_writer = csv.writer(error_file) if error_file else None
+        if error_writer:
+            error_writer.writerow(['line', 'errors'])
+        shown = 0
+
+        def on_error(line, messages):
+            nonlocal shown
+            if error_writer:
+                error_writer.writerow([line, '; '.join(messages)])
+            # The first errors go to the terminal; --errors keeps them all.
+            if shown < 20:
+                self.stderr.write(f"line {line}: {'; '.join(messages)}")
+                shown += 1
+
+        # utf-8-sig accepts the byte order mark spreadsheet programs write.
+        stream = sys.stdin if path == '-' else open(path, encoding='utf-8-sig', newline='')
+        try:
+            result = import_rows(
+                options['kind'], read_rows(stream, fmt), partner=partner,
+                batch_size=options['batch_size'], on_error=on_error, dry_run=options['dry_run'],
+            )
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+            if error_file:
+                error_file.close()
+
+        summary = (
+            f"{result.created} created, {result.updated} updated, {result.unchanged} unchanged, "
+            f"{result.failed} rejected"
+        )
+        if options['dry_run']:
+            summary += " (dry run, nothing written)"
+        style = self.style.WARNING if result.failed else self.style.SUCCESS
+        self.stdout.write(style(f"{options['kind'].capitalize()}: {summary}."))
@@ -0,0 +1,113 @@
+import asyncio
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+from django.test import AsyncClient, Client, override_settings
+
+from destination.bench import percentile
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the WSGI and ASGI request paths on this machine by sending the "
+        "same concurrent load through Django's sync handler (one thread per "
+        "in-flight request, like a threaded WSGI server) and its async handler "
+        "(one event loop, like an ASGI server). No network server is involved, "
+        "so the numbers isolate Django, the views and the database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='+', help="URL paths to request, e.g. /destinations/")
+        parser.add_argument('--interface', choices=['wsgi', 'asgi', 'both'], default='both')
+        parser.add_argument('--concurrency', type=int, default=32, help="Requests in flight at once.")
+        parser.add_argument('--requests', type=int, default=500, help="Requests per path and interface.")
+        parser.add_argument('--warmup', type=int, default=20, help="Unmeasured requests sent first.")
+        parser.add_argument('--user', help="Username to log in as, for pages that require a login.")
+
+    def handle(self, *args, **options):
+        user = None
+        if options['user']:
+            try:
+                user = get_user_model().objects.get(username=options['user'])
+            except get_user_model().DoesNotExist:
+                raise CommandError(f"No user named {options['user']!r}.")
+
+        interfaces = ['wsgi', 'asgi'] if options['interface'] == 'both' else [options['interface']]
+        self.stdout.write(
+            f"{'path':<32} {'iface':<5} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}"
+        )
+        # The test clients send "Host: testserver", as under the test runner.
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+            for path in options['paths']:
+                for interface in interfaces:
+                    self.report(path, interface, user, options)
+
+    def report(self, path, interface, user, options):
+        run = self.run_wsgi if interface == 'wsgi' else self.run_asgi
+        latencies, errors, elapsed = run(path, user, options)
+        self.stdout.write(
+            f"{path:<32} {interface:<5} {len(latencies) / elapsed:>9.1f} "
+            f"{statistics.median(latencies) * 1000:>8.1f} "
+            f"{percentile(latencies, 95) * 1000:>8.1f} "
+            f"{percentile(latencies, 99) * 1000:>8.1f} {errors:>7}"
+        )
+
+    def run_wsgi(self, path, user, options):
+        def make_client():
+            client = Client()
+            if user is not None:
+                client.force_login(user)
+            return client
+
+        def worker(count):
+            client = make_client()
+            latencies, errors = [], 0
+            for _ in range(count):
+                started = time.perf_counter()
+                response = client.get(path)
+                latencies.append(time.perf_counter() - started)
+                errors += response.status_code >= 400
+            close_old_connections()
+            return latencies, errors
+
+        client = make_client()
+        for _ in range(options['warmup']):
+            client.get(path)
+
+        concurrency = options['concurrency']
+        shares = [options['requests'] // concurrency + (i < options['requests'] % concurrency) for i in range(concurrency)]
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            results = list(executor.map(worker, shares))
+        elapsed = time.perf_counter() - started
+        return [lat for lats, _ in results for lat in lats], sum(errs for _, errs in results), elapsed
+
+    def run_asgi(self, path, user, options):
+        async def main():
+            client = AsyncClient()
+            if user is not None:
+                await client.aforce_login(user)
+            for _ in range(options['warmup']):
+                await client.get(path)
+
+            semaphore = asyncio.Semaphore(options['concurrency'])
+            latencies, errors = [], 0
+
+            async def one():
+                nonlocal errors
+                async with semaphore:
+                    started = time.perf_counter()
+                    response = await client.get(path)
+                    latencies.append(time.perf_counter() - started)
+                    errors += response.status_code >= 400
+
+            started = time.perf_counter()
+            await asyncio.gather(*(one() for _ in range(options['requests'])))
+            return latencies, errors, time.perf_counter() - started
+
+        return asyncio.run(main())
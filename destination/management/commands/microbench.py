@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from destination.bench import MICROBENCHMARKS, run_microbenchmark
+
+
+class Command(BaseCommand):
+    help = "Time single operations (e.g. money formatting) in nanoseconds per call."
+
+    def add_arguments(self, parser):
+        parser.add_argument('names', nargs='*', metavar='NAME', help="Microbenchmarks to run (default: all).")
+        parser.add_argument('--number', type=int, default=10000, help="Calls per timed run.")
+        parser.add_argument('--repeat', type=int, default=5, help="Timed runs; the fastest is reported.")
+
+    def handle(self, *args, **options):
+        names = options['names'] or sorted(MICROBENCHMARKS)
+        unknown = set(names) - set(MICROBENCHMARKS)
+        if unknown:
+            raise CommandError(f"Unknown microbenchmarks: {', '.join(sorted(unknown))}. "
+                               f"Known: {', '.join(sorted(MICROBENCHMARKS))}.")
+        for name in names:
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            for case, result in run_microbenchmark(name, options['number'], options['repeat']).items():
+                if isinstance(result, str):
+                    self.stdout.write(f"  {case:<32} {result}")
+                else:
+                    self.stdout.write(f"  {case:<32} {result:>10,.1f} ns/call")
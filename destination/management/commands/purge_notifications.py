@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+
+from destination.inbox import RETENTION_DAYS
+from destination.tasks import purge_notifications
+
+
+class Command(BaseCommand):
+    help = "Delete read notifications older than the retention period. Run it daily, e.g. from cron."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=RETENTION_DAYS,
+            help="Keep read notifications younger than this many days.",
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help="Number of notifications deleted per statement.",
+        )
+        parser.add_argument(
+            '--async', action='store_true', dest='run_async',
+            help="Queue the purge for a worker instead of running it now.",
+        )
+
+    def handle(self, *args, **options):
+        if options['run_async']:
+            purge_notifications.apply_async(
+                kwargs={'days': options['days'], 'batch_size': options['batch_size']},
+                idempotency_key=purge_notifications.name,
+            )
+            self.stdout.write(self.style.SUCCESS("Queued a notification purge."))
+            return
+
+        deleted = purge_notifications(days=options['days'], batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} read notifications."))
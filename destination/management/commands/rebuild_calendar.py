@@ -0,0 +1,20 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand
+
+from destination.availability import rebuild_calendar
+
+
+class Command(BaseCommand):
+    help = "Recompute the availability calendar from the bookings, from today (or --from) on."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--from', dest='from_date', type=date.fromisoformat, default=None,
+            help="First day to rebuild, YYYY-MM-DD (default: today). Earlier days are left alone.",
+        )
+        parser.add_argument('--batch-size', type=int, default=1000, help="Calendar rows written per bulk_create.")
+
+    def handle(self, *args, **options):
+        rows = rebuild_calendar(from_date=options['from_date'], batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {rows} calendar days."))
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from destination.tasks import rebuild_rating_aggregates
+
+
+class Command(BaseCommand):
+    help = "Recompute the stored rating aggregates of every destination from its reviews."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help="Number of destinations written per bulk_update.",
+        )
+        parser.add_argument(
+            '--async', action='store_true', dest='run_async',
+            help="Queue the rebuild for a worker instead of running it now.",
+        )
+
+    def handle(self, *args, **options):
+        if options['run_async']:
+            rebuild_rating_aggregates.apply_async(
+                kwargs={'batch_size': options['batch_size']}, idempotency_key=rebuild_rating_aggregates.name,
+            )
+            self.stdout.write(self.style.SUCCESS("Queued a rating aggregate rebuild."))
+            return
+
+        updated = rebuild_rating_aggregates(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt rating aggregates for {updated} destinations."))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from destination.search import rebuild_index
+
+
+class Command(BaseCommand):
+    help = "Rebuild the destination full-text search index from scratch."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help="Number of destinations indexed per batch.",
+        )
+
+    def handle(self, *args, **options):
+        count = rebuild_index(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Indexed {count} destinations."))
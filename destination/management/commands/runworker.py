@@ -0,0 +1,65 @@
+import multiprocessing
+import signal
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from destination.queue import Worker
+
+
+def _run_worker(options):
+    worker = Worker(
+        poll_interval=options['poll_interval'],
+        batch_size=options['batch_size'],
+        lock_timeout=options['lock_timeout'],
+    )
+
+    def stop(signum, frame):
+        worker.stopping = True
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    worker.run()
+
+
+class Command(BaseCommand):
+    help = "Run background job workers that process the Job table."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=1, help="Number of worker processes.")
+        parser.add_argument('--poll-interval', type=float, default=1.0, help="Seconds to sleep when idle.")
+        parser.add_argument('--batch-size', type=int, default=10, help="Jobs claimed per poll.")
+        parser.add_argument(
+            '--lock-timeout', type=int, default=600,
+            help="Seconds after which a running job is assumed dead and retried.",
+        )
+        parser.add_argument('--once', action='store_true', help="Run all due jobs, then exit.")
+
+    def handle(self, *args, **options):
+        if options['once']:
+            processed = Worker(batch_size=options['batch_size']).run_once()
+            self.stdout.write(self.style.SUCCESS(f"Processed {processed} jobs."))
+            return
+
+        if options['processes'] <= 1:
+            self.stdout.write("Worker started. Press Ctrl+C to stop.")
+            _run_worker(options)
+            return
+
+        # Connections must not be shared across forked processes.
+        connections.close_all()
+        processes = [
+            multiprocessing.Process(target=_run_worker, args=(options,), daemon=False)
+            for _ in range(options['processes'])
+        ]
+        for process in processes:
+            process.start()
+        self.stdout.write(f"Started {len(processes)} worker processes. Press Ctrl+C to stop.")
+        try:
+            for process in processes:
+                process.join()
+        except KeyboardInterrupt:
+            for process in processes:
+                process.terminate()
+            for process in processes:
+                process.join()
@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from destination.bench import BENCH_PASSWORD, BENCH_PREFIX, COUNTS, clear, has_bench_data, scaled_counts, seed
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill the database with synthetic users, partners, destinations, images, "
+        "reviews, bookings and notifications for benchmarking. Use a dedicated "
+        "database (DATABASE_URL), never a real one."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scale', type=float, default=1,
+            help="Multiplier of the default counts: " + ', '.join(f'{count} {name}' for name, count in COUNTS.items()),
+        )
+        for name in COUNTS:
+            parser.add_argument(f'--{name}', type=int, help=f"Number of {name}, overriding --scale.")
+        parser.add_argument('--seed', type=int, default=0, help="Random seed; the same seed gives the same data.")
+        parser.add_argument('--batch-size', type=int, default=5000, help="Rows written per bulk_create.")
+        parser.add_argument(
+            '--replace', action='store_true',
+            help="Delete the data of a previous run first (slow at millions of rows; prefer a fresh database).",
+        )
+
+    def handle(self, *args, **options):
+        if has_bench_data():
+            if not options['replace']:
+                raise CommandError("The database already holds bench data; pass --replace to delete it first.")
+            deleted = clear()
+            self.stdout.write(f"Deleted {deleted} rows of previous bench data.")
+
+        counts = scaled_counts(options['scale'], **{name: options[name] for name in COUNTS})
+        try:
+            written = seed(counts, batch_size=options['batch_size'], seed=options['seed'], log=self.stdout.write)
+        except ValueError as error:
+            raise CommandError(error)
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {sum(written.values())} rows. Bench users are named {BENCH_PREFIX}customer-<n> "
+            f"and {BENCH_PREFIX}partner-<n>, password {BENCH_PASSWORD!r}."
+        ))
@@ -0,0 +1,80 @@
+# Generated by Django 5.1.15 on 2026-10-18 10:38
+
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+
+
+def fill_rating_aggregates(apps, schema_editor):
+    # A frozen copy of tasks.rebuild_rating_aggregates().
+    Destination = apps.get_model('destination', 'Destination')
+    Review = apps.get_model('destination', 'Review')
+    fields = ['rating_avg', 'rating_count', 'rating_sum'] + [f'rating_{star}_count' for star in range(1, 6)]
+    rows = Review.objects.values('destination_id').annotate(
+        count=Count('id'),
+        total=Sum('rating'),
+        **{f'star_{star}': Count('id', filter=Q(rating=star)) for star in range(1, 6)},
+    ).order_by()
+    batch = []
+    for row in rows.iterator():
+        destination = Destination(
+            pk=row['destination_id'], rating_count=row['count'], rating_sum=row['total'],
+            rating_avg=row['total'] / row['count'],
+            **{f'rating_{star}_count': row[f'star_{star}'] for star in range(1, 6)},
+        )
+        batch.append(destination)
+        if len(batch) >= 1000:
+            Destination.objects.bulk_update(batch, fields)
+            batch = []
+    if batch:
+        Destination.objects.bulk_update(batch, fields)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('destination', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='destination',
+            name='rating_1_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='destination',
+            name='rating_2_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='destination',
+            name='rating_3_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='destination',
+            name='rating_4_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='destination',
+            name='rating_5_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='destination',
+            name='rating_avg',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddField(
+            model_name='destination',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='destination',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(fill_rating_aggregates, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,44 @@
+from django.db import migrations
+
+
+def create_search_tables(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS destination_search USING fts5("
+        "name, description, location, categories, activities, "
+        "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+    )
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS destination_search_vocab "
+        "USING fts5vocab(destination_search, 'row')"
+    )
+    # Index the destinations that already exist; a frozen copy of
+    # search.destination_document() in SQL.
+    schema_editor.execute(
+        "INSERT INTO destination_search (rowid, name, description, location, categories, activities) "
+        "SELECT d.id, d.name, d.description, d.location, "
+        "COALESCE((SELECT group_concat(c.name, ' ') FROM destination_destination_categories dc "
+        "          JOIN destination_category c ON c.id = dc.category_id WHERE dc.destination_id = d.id), ''), "
+        "COALESCE((SELECT group_concat(a.name, ' ') FROM destination_destination_categories dc "
+        "          JOIN destination_activity a ON a.category_id = dc.category_id WHERE dc.destination_id = d.id), '') "
+        "FROM destination_destination d"
+    )
+
+
+def drop_search_tables(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute("DROP TABLE IF EXISTS destination_search_vocab")
+    schema_editor.execute("DROP TABLE IF EXISTS destination_search")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('destination', '0002_destination_rating_aggregates'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_tables, drop_search_tables),
+    ]
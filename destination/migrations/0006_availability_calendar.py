@@ -0,0 +1,67 @@
+# Generated by Django 5.1.15 on 2026-10-18 10:53
+
+from collections import Counter
+from datetime import timedelta
+
+import django.core.validators
+import django.db.models.deletion
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def fill_calendar(apps, schema_editor):
+    # A frozen copy of availability.rebuild_calendar(): the places held by
+    # existing bookings on upcoming days. Capacities are all unlimited at
+    # this point; setting one later applies it to these rows.
+    Booking = apps.get_model('destination', 'Booking')
+    DestinationAvailability = apps.get_model('destination', 'DestinationAvailability')
+    today = timezone.localdate()
+    counts = Counter()
+    bookings = Booking.objects.exclude(status='canceled').filter(end_date__gte=today).values_list(
+        'destination_id', 'start_date', 'end_date', 'guests',
+    )
+    for destination_id, start_date, end_date, guests in bookings.iterator():
+        day = max(start_date, today)
+        while day <= end_date:
+            counts[destination_id, day] += guests
+            day += timedelta(days=1)
+    DestinationAvailability.objects.bulk_create(
+        [DestinationAvailability(destination_id=destination_id, date=day, booked=booked)
+         for (destination_id, day), booked in counts.items()],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('destination', '0005_wallet_ledger'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='booking',
+            name='guests',
+            field=models.PositiveIntegerField(default=1, validators=[django.core.validators.MinValueValidator(1)]),
+        ),
+        migrations.AddField(
+            model_name='destination',
+            name='daily_capacity',
+            field=models.PositiveIntegerField(blank=True, help_text='Guests that can be booked per day. Leave empty for unlimited.', null=True),
+        ),
+        migrations.CreateModel(
+            name='DestinationAvailability',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('capacity', models.PositiveIntegerField(blank=True, null=True)),
+                ('booked', models.PositiveIntegerField(default=0)),
+                ('destination', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='availability', to='destination.destination')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['date', 'destination'], name='availability_date_idx')],
+                'constraints': [models.UniqueConstraint(fields=('destination', 'date'), name='unique_destination_day')],
+            },
+        ),
+        migrations.RunPython(fill_calendar, migrations.RunPython.noop),
+    ]
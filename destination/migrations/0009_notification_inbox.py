@@ -0,0 +1,38 @@
+# Generated by Django 5.1.15 on 2026-10-18 11:15
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Max, Q
+
+
+def create_inboxes(apps, schema_editor):
+    Notification = apps.get_model('destination', 'Notification')
+    NotificationInbox = apps.get_model('destination', 'NotificationInbox')
+    rows = Notification.objects.values('user_id').annotate(
+        latest_id=Max('id'), unread_count=Count('id', filter=Q(is_read=False)),
+    ).order_by()
+    NotificationInbox.objects.bulk_create(
+        [NotificationInbox(**row) for row in rows.iterator()], batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('destination', '0008_image_variants'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationInbox',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('read_up_to', models.PositiveBigIntegerField(default=0)),
+                ('latest_id', models.PositiveBigIntegerField(default=0)),
+                ('unread_count', models.PositiveIntegerField(default=0)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='notification_inbox', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.RunPython(create_inboxes, migrations.RunPython.noop),
+    ]
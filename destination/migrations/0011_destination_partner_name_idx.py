@@ -0,0 +1,24 @@
+# Generated by Django 5.1.15 on 2026-10-18 11:35
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('destination', '0010_composite_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='destination',
+            name='partner',
+            field=models.ForeignKey(db_index=False, limit_choices_to={'role': 'partner'}, on_delete=django.db.models.deletion.CASCADE, related_name='destinations', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='destination',
+            index=models.Index(fields=['partner', 'name'], name='destination_partner_name_idx'),
+        ),
+    ]
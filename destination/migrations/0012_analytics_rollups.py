@@ -0,0 +1,138 @@
+# Generated by Django 5.1.15 on 2026-10-18 11:57
+
+from collections import defaultdict
+from decimal import Decimal
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncDate
+
+STATUSES = ['pending', 'confirmed', 'canceled']
+PAYMENT_METHODS = ['cod', 'bank_transfer', 'wallet', 'online']
+COUNTERS = [f'bookings_{status}' for status in STATUSES] + ['guests'] + [
+    f'revenue_{method}' for method in PAYMENT_METHODS
+] + ['review_count', 'rating_sum']
+
+
+def create_rollups(apps, schema_editor):
+    Booking = apps.get_model('destination', 'Booking')
+    Review = apps.get_model('destination', 'Review')
+    DestinationStats = apps.get_model('destination', 'DestinationStats')
+    PartnerStats = apps.get_model('destination', 'PartnerStats')
+
+    live = ~Q(status='canceled')
+    bookings = Booking.objects.annotate(day=TruncDate('booking_date')).values('destination_id', 'day').annotate(
+        **{f'bookings_{status}': Count('id', filter=Q(status=status)) for status in STATUSES},
+        guests=Sum('guests', filter=live, default=0),
+        **{
+            f'revenue_{method}': Sum(
+                'total_price', filter=live & Q(payment_status='paid', payment_method=method), default=Decimal(0),
+            )
+            for method in PAYMENT_METHODS
+        },
+    ).order_by()
+    reviews = Review.objects.annotate(day=TruncDate('created_at')).values('destination_id', 'day').annotate(
+        review_count=Count('id'), rating_sum=Sum('rating', default=0),
+    ).order_by()
+    rows = defaultdict(dict)
+    for totals in (bookings, reviews):
+        for row in totals.iterator():
+            rows[row.pop('destination_id'), row.pop('day')].update(row)
+    DestinationStats.objects.bulk_create(
+        [DestinationStats(destination_id=destination_id, day=day, **counters)
+         for (destination_id, day), counters in rows.items()],
+        batch_size=1000,
+    )
+
+    partner_rows = DestinationStats.objects.values('destination__partner_id', 'day').annotate(
+        **{name: Sum(name) for name in COUNTERS}
+    ).order_by()
+    PartnerStats.objects.bulk_create(
+        [PartnerStats(partner_id=row.pop('destination__partner_id'), **row) for row in partner_rows.iterator()],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('destination', '0011_destination_partner_name_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DestinationStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('day', 'Day'), ('month', 'Month')], default='day', max_length=5)),
+                ('day', models.DateField(help_text='The day, or the first day of the month for monthly rows.')),
+                ('bookings_pending', models.IntegerField(default=0)),
+                ('bookings_confirmed', models.IntegerField(default=0)),
+                ('bookings_canceled', models.IntegerField(default=0)),
+                ('guests', models.IntegerField(default=0)),
+                ('revenue_cod', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('revenue_bank_transfer', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('revenue_wallet', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('revenue_online', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('review_count', models.IntegerField(default=0)),
+                ('rating_sum', models.IntegerField(default=0)),
+            ],
+            options={
+                'verbose_name_plural': 'destination stats',
+            },
+        ),
+        migrations.CreateModel(
+            name='PartnerStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('day', 'Day'), ('month', 'Month')], default='day', max_length=5)),
+                ('day', models.DateField(help_text='The day, or the first day of the month for monthly rows.')),
+                ('bookings_pending', models.IntegerField(default=0)),
+                ('bookings_confirmed', models.IntegerField(default=0)),
+                ('bookings_canceled', models.IntegerField(default=0)),
+                ('guests', models.IntegerField(default=0)),
+                ('revenue_cod', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('revenue_bank_transfer', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('revenue_wallet', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('revenue_online', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('review_count', models.IntegerField(default=0)),
+                ('rating_sum', models.IntegerField(default=0)),
+            ],
+            options={
+                'verbose_name_plural': 'partner stats',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['booking_date'], name='booking_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['created_at'], name='review_created_idx'),
+        ),
+        migrations.AddField(
+            model_name='destinationstats',
+            name='destination',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='stats', to='destination.destination'),
+        ),
+        migrations.AddField(
+            model_name='partnerstats',
+            name='partner',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='stats', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='destinationstats',
+            index=models.Index(fields=['period', 'day'], name='destination_stats_day_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='destinationstats',
+            constraint=models.UniqueConstraint(fields=('destination', 'period', 'day'), name='unique_destination_stats'),
+        ),
+        migrations.AddConstraint(
+            model_name='partnerstats',
+            constraint=models.UniqueConstraint(fields=('partner', 'period', 'day'), name='unique_partner_stats'),
+        ),
+        migrations.RunPython(create_rollups, migrations.RunPython.noop),
+    ]
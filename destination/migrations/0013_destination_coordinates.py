@@ -0,0 +1,62 @@
+# Generated by Django 5.1.15 on 2026-10-18 12:25
+
+import django.core.validators
+from django.db import migrations, models
+
+
+def create_geo_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    point = "NEW.id, NEW.latitude, NEW.latitude, NEW.longitude, NEW.longitude"
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS destination_geo USING rtree(id, min_lat, max_lat, min_lng, max_lng)"
+    )
+    schema_editor.execute(
+        "CREATE TRIGGER IF NOT EXISTS destination_geo_insert AFTER INSERT ON destination_destination "
+        "WHEN NEW.latitude IS NOT NULL AND NEW.longitude IS NOT NULL BEGIN "
+        f"INSERT INTO destination_geo VALUES ({point}); END"
+    )
+    schema_editor.execute(
+        "CREATE TRIGGER IF NOT EXISTS destination_geo_update "
+        "AFTER UPDATE OF id, latitude, longitude ON destination_destination BEGIN "
+        "DELETE FROM destination_geo WHERE id = OLD.id; "
+        f"INSERT INTO destination_geo SELECT {point} "
+        "WHERE NEW.latitude IS NOT NULL AND NEW.longitude IS NOT NULL; END"
+    )
+    schema_editor.execute(
+        "CREATE TRIGGER IF NOT EXISTS destination_geo_delete AFTER DELETE ON destination_destination BEGIN "
+        "DELETE FROM destination_geo WHERE id = OLD.id; END"
+    )
+
+
+def drop_geo_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for trigger in ('destination_geo_insert', 'destination_geo_update', 'destination_geo_delete'):
+        schema_editor.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    schema_editor.execute("DROP TABLE IF EXISTS destination_geo")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('destination', '0012_analytics_rollups'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='destination',
+            name='latitude',
+            field=models.FloatField(blank=True, null=True, validators=[django.core.validators.MinValueValidator(-90), django.core.validators.MaxValueValidator(90)]),
+        ),
+        migrations.AddField(
+            model_name='destination',
+            name='longitude',
+            field=models.FloatField(blank=True, null=True, validators=[django.core.validators.MinValueValidator(-180), django.core.validators.MaxValueValidator(180)]),
+        ),
+        migrations.AddIndex(
+            model_name='destination',
+            index=models.Index(fields=['latitude', 'longitude'], name='destination_coordinates_idx'),
+        ),
+        migrations.RunPython(create_geo_index, drop_geo_index),
+    ]
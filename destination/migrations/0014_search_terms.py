@@ -0,0 +1,29 @@
+from django.db import migrations
+
+
+def create_search_terms(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        "CREATE TABLE IF NOT EXISTS destination_search_terms (term TEXT PRIMARY KEY) WITHOUT ROWID"
+    )
+    schema_editor.execute(
+        "INSERT OR IGNORE INTO destination_search_terms (term) SELECT term FROM destination_search_vocab"
+    )
+
+
+def drop_search_terms(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute("DROP TABLE IF EXISTS destination_search_terms")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('destination', '0013_destination_coordinates'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_terms, drop_search_terms),
+    ]
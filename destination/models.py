@@ -1,19 +1,23 @@
 from django.contrib.auth.models import AbstractUser
-from django.db import models
+from django.db import models, transaction
 from django.utils import timezone
+from datetime import timedelta
 from decimal import Decimal
-import locale
-from django.db.models import Avg
+from django.db.models import F
 
 from django.core.validators import MinValueValidator, MaxValueValidator
 
+from .images import ResponsiveImage
+from .money import format_money
+from .notifications import notify
+
 
-locale.setlocale(locale.LC_ALL, '')  # Set the locale for currency formatting
 
 # Category Model
 class Category(models.Model):
     name = models.CharField(max_length=100, unique=True)
     description = models.TextField(blank=True, null=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.name
@@ -24,6 +28,7 @@ class Activity(models.Model):
     category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='activities')
     description = models.TextField()
     rating = models.DecimalField(max_digits=3, decimal_places=2, default=0.0)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f"{self.name} at {self.destination.name}"
@@ -40,6 +45,13 @@ class User(AbstractUser):
     preferred_budget = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True)
     preferred_activities = models.ManyToManyField(Activity, blank=True)
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Partner names are shown on cached destination cards.
+        instance._loaded_username = instance.__dict__.get('username')
+        return instance
+
     def is_partner(self):
         return self.role == 'partner'
 
@@ -57,11 +69,16 @@ class PartnerProfile(models.Model):
     website = models.URLField(blank=True, null=True)
     description = models.TextField(blank=True)
     logo = models.ImageField(upload_to='partner_logos/', blank=True, null=True)
+    logo_variants = models.JSONField(default=dict, blank=True, editable=False)
     joined_date = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
         return f"Partner Profile for {self.user.username}"
 
+    @property
+    def responsive_logo(self):
+        return ResponsiveImage(self.logo, self.logo_variants)
+
     
 # Destination Model
 class Destination(models.Model):
@@ -70,13 +87,97 @@ class Destination(models.Model):
     location = models.CharField(max_length=255)
     price = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     created_at = models.DateTimeField(default=timezone.now)
+    # Also bumped when images, categories or ratings change, see touch().
+    updated_at = models.DateTimeField(auto_now=True)
     categories = models.ManyToManyField(Category, related_name='destinations', blank=True)
-    partner = models.ForeignKey(User, related_name='destinations', on_delete=models.CASCADE, limit_choices_to={'role': 'partner'})
+    # Indexed by destination_partner_name_idx, which starts with partner.
+    partner = models.ForeignKey(
+        User, related_name='destinations', on_delete=models.CASCADE, limit_choices_to={'role': 'partner'},
+        db_index=False,
+    )
+    daily_capacity = models.PositiveIntegerField(
+        blank=True, null=True, help_text="Guests that can be booked per day. Leave empty for unlimited."
+    )
+    # WGS84 degrees, set by partners or `manage.py geocode_destinations`. On
+    # SQLite they are mirrored into an R-tree for "near me" queries; see geo.py.
+    latitude = models.FloatField(
+        blank=True, null=True, validators=[MinValueValidator(-90), MaxValueValidator(90)],
+    )
+    longitude = models.FloatField(
+        blank=True, null=True, validators=[MinValueValidator(-180), MaxValueValidator(180)],
+    )
+
+    # Denormalized review aggregates, kept in sync by the Review signals in
+    # destination/signals.py and rebuilt by `manage.py rebuild_ratings`.
+    rating_avg = models.FloatField(default=0)
+    rating_count = models.PositiveIntegerField(default=0)
+    rating_sum = models.PositiveIntegerField(default=0)
+    rating_1_count = models.PositiveIntegerField(default=0)
+    rating_2_count = models.PositiveIntegerField(default=0)
+    rating_3_count = models.PositiveIntegerField(default=0)
+    rating_4_count = models.PositiveIntegerField(default=0)
+    rating_5_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            # Listing pages seek on (created_at, id); see pagination.KeysetPaginator.
+            models.Index(fields=['created_at', 'id'], name='destination_created_idx'),
+            # Catalog imports match rows on (partner, name); see catalog.Destinations.
+            models.Index(fields=['partner', 'name'], name='destination_partner_name_idx'),
+            # Bounding-box queries on databases without the R-tree; see geo.DatabaseGeoBackend.
+            models.Index(fields=['latitude', 'longitude'], name='destination_coordinates_idx'),
+        ]
+
     def __str__(self):
         return self.name
 
     def average_rating(self):
-        return self.reviews.aggregate(Avg('rating'))['rating__avg'] or 0
+        return self.rating_avg
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Bookings show the destination's name in the API; see signals.py.
+        instance._loaded_name = instance.__dict__.get('name')
+        return instance
+
+    @classmethod
+    def touch(cls, destination_ids):
+        """Bump updated_at for destinations whose related data changed."""
+        return cls.objects.filter(pk__in=list(destination_ids)).update(updated_at=timezone.now())
+
+    def rating_histogram(self):
+        """Return the number of reviews per star, e.g. {1: 0, 2: 3, ..., 5: 12}."""
+        return {star: getattr(self, f'rating_{star}_count') for star in range(1, 6)}
+
+    @classmethod
+    def apply_rating_change(cls, destination_id, added=None, removed=None):
+        """
+        Fold one review rating into (or out of) the stored aggregates with a
+        single UPDATE, so the cost does not depend on the number of reviews.
+        """
+        count_delta = (added is not None) - (removed is not None)
+        sum_delta = (added or 0) - (removed or 0)
+        updates = {
+            'updated_at': timezone.now(),
+            'rating_count': F('rating_count') + count_delta,
+            'rating_sum': F('rating_sum') + sum_delta,
+        }
+        if added is not None:
+            updates[f'rating_{added}_count'] = F(f'rating_{added}_count') + 1
+        if removed is not None:
+            updates[f'rating_{removed}_count'] = updates.get(
+                f'rating_{removed}_count', F(f'rating_{removed}_count')
+            ) - 1
+        # The right-hand side of an UPDATE sees the old row, so the average
+        # is computed from the old sum/count plus the deltas.
+        new_count = F('rating_count') + count_delta
+        updates['rating_avg'] = models.Case(
+            models.When(condition=models.Q(rating_count__lte=-count_delta), then=models.Value(0.0)),
+            default=(F('rating_sum') + sum_delta) * 1.0 / new_count,
+            output_field=models.FloatField(),
+        )
+        return cls.objects.filter(pk=destination_id).update(**updates)
 
 
 
@@ -86,6 +187,7 @@ class Profile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='profile')
     bio = models.TextField(blank=True, help_text="A short description about the user.")
     profile_picture = models.ImageField(upload_to='profile_pictures/', blank=True, null=True)
+    profile_picture_variants = models.JSONField(default=dict, blank=True, editable=False)
     location = models.CharField(max_length=100, blank=True, help_text="City or location of the user.")
     
     # Additional fields for a more complete profile
@@ -109,6 +211,10 @@ class Profile(models.Model):
     def get_social_links(self):
         return self.social_links if self.social_links else {}
 
+    @property
+    def responsive_picture(self):
+        return ResponsiveImage(self.profile_picture, self.profile_picture_variants)
+
     def __str__(self):
         return f"Profile of {self.user.username}"
 
@@ -127,35 +233,83 @@ class Notification(models.Model):
     message = models.CharField(max_length=255)
     created_at = models.DateTimeField(auto_now_add=True)
     is_read = models.BooleanField(default=False)
-    
+
+    class Meta:
+        indexes = [
+            # Only unread rows: small, and usable for `is_read=False`, which
+            # SQLite compiles to NOT is_read and cannot seek a plain index on.
+            models.Index(
+                fields=['user', 'created_at'], condition=models.Q(is_read=False), name='notification_unread_idx',
+            ),
+        ]
+
     def __str__(self):
         return f"Notification for {self.user.username}: {self.message}"
 
     def mark_as_read(self):
-        self.is_read = True
-        self.save()
+        from .inbox import mark_one_read
+
+        mark_one_read(self)
 
     def formatted_message(self):
         return self.message
 
 
+class NotificationInbox(models.Model):
+    """
+    Read state of one user's notifications. Everything up to `read_up_to`
+    counts as read, so opening the inbox moves one number instead of
+    updating every row, and `unread_count` is kept up to date as
+    notifications are written and read. See destination/inbox.py.
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='notification_inbox')
+    read_up_to = models.PositiveBigIntegerField(default=0)
+    latest_id = models.PositiveBigIntegerField(default=0)
+    unread_count = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"Inbox of {self.user.username}: {self.unread_count} unread"
+
+
 
 # Destination Image Model
 class DestinationImage(models.Model):
     destination = models.ForeignKey(Destination, related_name='images', on_delete=models.CASCADE)
     image = models.ImageField(upload_to='destination_images/')
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
     created_at = models.DateTimeField(default=timezone.now)
 
     def __str__(self):
         return f"Image for {self.destination.name}"
 
+    @property
+    def responsive(self):
+        return ResponsiveImage(self.image, self.image_variants)
+
 # Review Model
 class Review(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
-    destination = models.ForeignKey(Destination, related_name='reviews', on_delete=models.CASCADE)
+    # Indexed by review_destination_created_idx, which starts with destination.
+    destination = models.ForeignKey(Destination, related_name='reviews', on_delete=models.CASCADE, db_index=False)
     content = models.TextField()
     rating = models.IntegerField(validators=[MinValueValidator(1), MaxValueValidator(5)])
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['destination', 'created_at', 'id'], name='review_destination_created_idx'),
+            # Day ranges recomputed by the analytics rollups
+            models.Index(fields=['created_at'], name='review_created_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember what was loaded so rating aggregates can be adjusted on edit
+        instance._loaded_rating = instance.__dict__.get('rating')
+        instance._loaded_destination_id = instance.__dict__.get('destination_id')
+        return instance
 
     def save(self, *args, **kwargs):
         # Trigger a notification when a new review is posted
@@ -166,11 +320,12 @@ class Review(models.Model):
 
     def create_review_notification(self):
         message = f"New review posted by {self.user.username} on {self.destination.name}: {self.content}"
-        notification = Notification.objects.create(
-            user=self.destination.user,
-            message=message
+        notify(
+            self.destination.partner_id,
+            message,
+            group=f'review:{self.destination_id}',
+            summary=f"{{count}} new reviews on {self.destination.name}",
         )
-        return  notification
 
     def __str__(self):
         return f"Review by {self.user.username} on {self.destination.name}"
@@ -181,22 +336,63 @@ class Wallet(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     balance = models.DecimalField(max_digits=100, decimal_places=2, default=0.00)
 
+    class Meta:
+        constraints = [
+            models.CheckConstraint(condition=models.Q(balance__gte=0), name='wallet_balance_non_negative'),
+        ]
+
     def __str__(self):
         return f"Wallet of {self.user.username}"
 
-    def add_funds(self, amount: Decimal):
-        self.balance += amount
-        self.save()
+    def add_funds(self, amount: Decimal, description=''):
+        """Credit the wallet and record it in the ledger."""
+        if amount <= 0:
+            raise ValueError("Amount must be positive")
+        with transaction.atomic():
+            Wallet.objects.filter(pk=self.pk).update(balance=F('balance') + amount)
+            self._record('credit', amount, description=description)
+        return True
+
+    def deduct_funds(self, amount: Decimal, booking=None, description=''):
+        """
+        Debit the wallet if it holds enough money. The balance check and the
+        debit are a single conditional UPDATE, so concurrent debits can never
+        take the balance below zero. Returns False when funds are insufficient.
+        """
+        if amount <= 0:
+            raise ValueError("Amount must be positive")
+        with transaction.atomic():
+            updated = Wallet.objects.filter(pk=self.pk, balance__gte=amount).update(
+                balance=F('balance') - amount
+            )
+            if not updated:
+                self.refresh_from_db(fields=['balance'])
+                return False
+            self._record('debit', amount, booking=booking, description=description)
+        return True
+
+    def _record(self, kind, amount, booking=None, description=''):
+        # Read back inside the same transaction: the UPDATE above holds the
+        # row lock, so this is the balance our own change produced.
+        self.refresh_from_db(fields=['balance'])
+        self._invalidate_owner()
+        return WalletTransaction.objects.create(
+            wallet=self,
+            kind=kind,
+            amount=amount,
+            balance_after=self.balance,
+            booking=booking,
+            description=description,
+        )
+
+    def _invalidate_owner(self):
+        # The balance changed with update(), which sends no post_save.
+        from .auth import invalidate_user
 
-    def deduct_funds(self, amount: Decimal):
-        if self.balance >= amount:
-            self.balance -= amount
-            self.save()
-            return True
-        return False
+        invalidate_user(self.user_id)
 
-    def formatted_balance(self):
-        return locale.currency(self.balance, grouping=True)
+    def formatted_balance(self, currency=None):
+        return format_money(self.balance, currency)
 
 
 # Booking Model
@@ -213,8 +409,9 @@ class Booking(models.Model):
         ('online', 'Online Payment'),
     ]
     
-    user = models.ForeignKey(User, on_delete=models.CASCADE)
-    destination = models.ForeignKey(Destination, on_delete=models.CASCADE)
+    # Both foreign keys are covered by the composite indexes in Meta.
+    user = models.ForeignKey(User, on_delete=models.CASCADE, db_index=False)
+    destination = models.ForeignKey(Destination, on_delete=models.CASCADE, db_index=False)
     booking_date = models.DateTimeField(default=timezone.now)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     total_price = models.DecimalField(max_digits=10, decimal_places=2)
@@ -222,32 +419,245 @@ class Booking(models.Model):
     end_date = models.DateField()
     payment_method = models.CharField(max_length=20, choices=PAYMENT_METHOD_CHOICES, default='cod')
     payment_status = models.CharField(max_length=20, choices=[('paid', 'Paid'), ('unpaid', 'Unpaid')], default='unpaid')
+    guests = models.PositiveIntegerField(default=1, validators=[MinValueValidator(1)])
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'booking_date', 'id'], name='booking_user_date_idx'),
+            models.Index(fields=['destination', 'start_date', 'end_date'], name='booking_destination_dates_idx'),
+            # Day ranges recomputed by the analytics rollups
+            models.Index(fields=['booking_date'], name='booking_date_idx'),
+        ]
+
+    # Fields whose change moves the booking in the availability calendar
+    CALENDAR_FIELDS = ('destination_id', 'start_date', 'end_date', 'guests', 'status')
+    # Fields counted by the analytics rollups
+    ROLLUP_FIELDS = (
+        'destination_id', 'booking_date', 'status', 'payment_status', 'payment_method', 'total_price', 'guests',
+    )
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_calendar = {field: instance.__dict__.get(field) for field in cls.CALENDAR_FIELDS}
+        instance._loaded_rollup = {field: instance.__dict__.get(field) for field in cls.ROLLUP_FIELDS}
+        return instance
 
     def save(self, *args, **kwargs):
         if not self.total_price:
             self.total_price = self.destination.price
 
-        if self.payment_method == 'wallet' and self.user.wallet.balance >= self.total_price:
-            if not self.user.wallet.deduct_funds(self.total_price):
-                raise ValueError("Insufficient balance in wallet")
-            self.payment_status = 'paid'
-            # Trigger a notification on successful payment
-            self.create_payment_notification()
-
-        super().save(*args, **kwargs)
+        # The booking, its calendar reservation, the wallet debit and the
+        # payment notification commit (or roll back) together.
+        with transaction.atomic():
+            self._update_calendar()
+            super().save(*args, **kwargs)
+            self._loaded_calendar = {field: getattr(self, field) for field in self.CALENDAR_FIELDS}
+
+            if self.payment_method == 'wallet' and self.payment_status != 'paid':
+                wallet = Wallet.objects.get(user_id=self.user_id)
+                if wallet.deduct_funds(self.total_price, booking=self, description=f"Booking #{self.pk}"):
+                    self.payment_status = 'paid'
+                    Booking.objects.filter(pk=self.pk).update(payment_status='paid', updated_at=timezone.now())
+                    # Trigger a notification on successful payment
+                    self.create_payment_notification()
+
+            self._update_rollups()
+
+    def _update_rollups(self):
+        from .analytics import record_booking
+
+        current = {field: getattr(self, field) for field in self.ROLLUP_FIELDS}
+        record_booking(getattr(self, '_loaded_rollup', None), current)
+        self._loaded_rollup = current
+
+    def _update_calendar(self):
+        current = {field: getattr(self, field) for field in self.CALENDAR_FIELDS}
+        previous = getattr(self, '_loaded_calendar', None)
+        if previous == current:
+            return
+        if previous is not None and None not in previous.values() and previous['status'] != 'canceled':
+            DestinationAvailability.release(
+                previous['destination_id'], previous['start_date'], previous['end_date'], previous['guests']
+            )
+        if current['status'] != 'canceled':
+            DestinationAvailability.reserve(self.destination_id, self.start_date, self.end_date, self.guests)
 
     def create_payment_notification(self):
         message = f"Your booking for {self.destination.name} has been successfully paid and confirmed!"
-        notification = Notification.objects.create(
-            user=self.user,
-            message=message
+        notify(
+            self.user_id,
+            message,
+            group='booking-paid',
+            summary="{count} of your bookings have been successfully paid and confirmed!",
         )
-        return   notification
 
     def __str__(self):
         return f"Booking by {self.user.username} for {self.destination.name} on {self.booking_date}"
 
 
+class BookingUnavailable(ValueError):
+    pass
+
+
+# Destination Availability Model (per-day capacity calendar)
+class DestinationAvailability(models.Model):
+    destination = models.ForeignKey(Destination, on_delete=models.CASCADE, related_name='availability')
+    date = models.DateField()
+    capacity = models.PositiveIntegerField(blank=True, null=True)
+    booked = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['destination', 'date'], name='unique_destination_day'),
+        ]
+        indexes = [
+            models.Index(fields=['date', 'destination'], name='availability_date_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.destination} on {self.date}: {self.booked}/{self.capacity or '∞'}"
+
+    @property
+    def free(self):
+        return None if self.capacity is None else self.capacity - self.booked
+
+    @staticmethod
+    def days(start_date, end_date):
+        """Days covered by a booking; both ends are inclusive."""
+        return [start_date + timedelta(days=i) for i in range((end_date - start_date).days + 1)]
+
+    @classmethod
+    def reserve(cls, destination_id, start_date, end_date, guests):
+        """
+        Book `guests` places on every day of the range, or raise
+        BookingUnavailable without changing anything.
+        """
+        if end_date < start_date:
+            raise BookingUnavailable("The end date is before the start date.")
+        days = cls.days(start_date, end_date)
+        capacity = Destination.objects.filter(pk=destination_id).values_list('daily_capacity', flat=True).get()
+        with transaction.atomic():
+            cls.objects.bulk_create(
+                [cls(destination_id=destination_id, date=day, capacity=capacity) for day in days],
+                ignore_conflicts=True,
+            )
+            # One conditional UPDATE for the whole range: a day without enough
+            # room is simply not updated, which the row count reveals.
+            updated = cls.objects.filter(
+                models.Q(capacity__isnull=True) | models.Q(capacity__gte=F('booked') + guests),
+                destination_id=destination_id,
+                date__range=(start_date, end_date),
+            ).update(booked=F('booked') + guests)
+            if updated != len(days):
+                raise BookingUnavailable("Not enough free places for the selected dates.")
+
+    @classmethod
+    def release(cls, destination_id, start_date, end_date, guests):
+        cls.objects.filter(
+            destination_id=destination_id,
+            date__range=(start_date, end_date),
+            booked__gte=guests,
+        ).update(booked=F('booked') - guests)
+
+
+# Analytics rollups (per-day counters, see destination/analytics.py)
+class StatsRollup(models.Model):
+    PERIOD_CHOICES = [
+        ('day', 'Day'),
+        ('month', 'Month'),
+    ]
+
+    period = models.CharField(max_length=5, choices=PERIOD_CHOICES, default='day')
+    day = models.DateField(help_text="The day, or the first day of the month for monthly rows.")
+    # Signed: the counters are adjusted by deltas, and a transient negative
+    # must not fail the booking that caused it. Compaction corrects drift.
+    bookings_pending = models.IntegerField(default=0)
+    bookings_confirmed = models.IntegerField(default=0)
+    bookings_canceled = models.IntegerField(default=0)
+    guests = models.IntegerField(default=0)
+    revenue_cod = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    revenue_bank_transfer = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    revenue_wallet = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    revenue_online = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    review_count = models.IntegerField(default=0)
+    rating_sum = models.IntegerField(default=0)
+
+    class Meta:
+        abstract = True
+
+    @property
+    def bookings(self):
+        return self.bookings_pending + self.bookings_confirmed + self.bookings_canceled
+
+    @property
+    def revenue(self):
+        return self.revenue_cod + self.revenue_bank_transfer + self.revenue_wallet + self.revenue_online
+
+    @property
+    def rating_avg(self):
+        return self.rating_sum / self.review_count if self.review_count else 0
+
+
+class DestinationStats(StatsRollup):
+    # Indexed by unique_destination_stats, which starts with destination.
+    destination = models.ForeignKey(Destination, on_delete=models.CASCADE, related_name='stats', db_index=False)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['destination', 'period', 'day'], name='unique_destination_stats'),
+        ]
+        indexes = [
+            # Day ranges: the dashboard window, refreshes and compaction
+            models.Index(fields=['period', 'day'], name='destination_stats_day_idx'),
+        ]
+        verbose_name_plural = 'destination stats'
+
+    def __str__(self):
+        return f"{self.destination} on {self.day} ({self.period})"
+
+
+class PartnerStats(StatsRollup):
+    # Indexed by unique_partner_stats, which starts with partner.
+    partner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='stats', db_index=False)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['partner', 'period', 'day'], name='unique_partner_stats'),
+        ]
+        verbose_name_plural = 'partner stats'
+
+    def __str__(self):
+        return f"{self.partner} on {self.day} ({self.period})"
+
+
+# Wallet Transaction Model (append-only ledger)
+class WalletTransaction(models.Model):
+    KIND_CHOICES = [
+        ('credit', 'Credit'),
+        ('debit', 'Debit'),
+    ]
+
+    wallet = models.ForeignKey(Wallet, on_delete=models.CASCADE, related_name='transactions')
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    amount = models.DecimalField(max_digits=100, decimal_places=2, validators=[MinValueValidator(Decimal('0.01'))])
+    balance_after = models.DecimalField(max_digits=100, decimal_places=2)
+    booking = models.ForeignKey(
+        'Booking', on_delete=models.SET_NULL, related_name='wallet_transactions', blank=True, null=True
+    )
+    description = models.CharField(max_length=255, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.get_kind_display()} of {self.amount} on {self.wallet}"
+
+    def save(self, *args, **kwargs):
+        if self.pk is not None:
+            raise ValueError("Wallet transactions are append-only")
+        super().save(*args, **kwargs)
+
+
 # AI Recommendation Model
 class AIRecommendation(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -264,13 +674,46 @@ class AIRecommendation(models.Model):
 
     def create_recommendation_notification(self):
         message = f"We recommend {self.recommended_destination.name} based on your preferences!"
-        notification = Notification.objects.create(
-            user=self.user,
-            message=message
+        notify(
+            self.user_id,
+            message,
+            group='recommendation',
+            summary="We have {count} new recommendations based on your preferences!",
         )
-        return notification 
 
     def __str__(self):
         return f"Recommendation for {self.user.username}: {self.recommended_destination.name}"
 
 
+
+
+# Background Job Model
+class Job(models.Model):
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+
+    task = models.CharField(max_length=255)
+    args = models.JSONField(default=list, blank=True)
+    kwargs = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued')
+    idempotency_key = models.CharField(max_length=255, unique=True, blank=True, null=True)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_at = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_at = models.DateTimeField(blank=True, null=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'run_at'], name='job_status_run_at_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.task} ({self.status})"
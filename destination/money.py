@@ -0,0 +1,122 @@
+"""
+Money formatting.
+
+`format_money(Decimal('1234.5'), 'USD')` gives '$1,234.50' in English and
+'1 234,50 $US' in French. It uses no process-wide state: the locale
+conventions are plain data below, and the active language comes from
+Django's per-request translation state. Formatting with
+`locale.currency()` does need process-wide state. It needs a
+`locale.setlocale()` that changes every thread at once, and it fails
+under the C locale most servers run with.
+
+Each (currency, locale) pair is compiled once into a MoneyFormatter. It
+holds the quantum, the separators and the symbol pattern. The formatters
+are kept in an LRU cache, so formatting an amount costs one quantize()
+and one format() call.
+"""
+from decimal import ROUND_HALF_UP, Decimal
+from functools import lru_cache
+from typing import NamedTuple
+
+from django.conf import settings
+from django.utils import translation
+
+NBSP = '\u00a0'
+NNBSP = '\u202f'
+
+
+class Currency(NamedTuple):
+    code: str
+    decimals: int
+    symbol: str
+
+
+class MoneyLocale(NamedTuple):
+    group: str
+    decimal: str
+    symbol_first: bool
+    # Symbols that differ from the currency's own in this locale
+    symbols: dict
+
+
+CURRENCIES = {
+    'BIF': Currency('BIF', 0, 'FBu'),
+    'USD': Currency('USD', 2, '$'),
+    'EUR': Currency('EUR', 2, '€'),
+}
+
+LOCALES = {
+    'en': MoneyLocale(group=',', decimal='.', symbol_first=True, symbols={}),
+    'fr': MoneyLocale(group=NNBSP, decimal=',', symbol_first=False, symbols={'USD': '$US'}),
+}
+# Kirundi amounts are written the French way.
+LOCALES['rn'] = LOCALES['fr']
+DEFAULT_LOCALE = 'en'
+
+
+class MoneyFormatter:
+    """Formats amounts of one currency in one locale. Immutable, so shared between threads."""
+
+    __slots__ = ('currency', 'quantum', 'spec', 'separators', 'prefix', 'suffix')
+
+    def __init__(self, currency, locale):
+        spec = CURRENCIES[currency]
+        conventions = LOCALES[locale]
+        symbol = conventions.symbols.get(currency, spec.symbol)
+        self.currency = currency
+        self.quantum = Decimal(1).scaleb(-spec.decimals)
+        # format() writes "1,234.50"; the separators are then swapped with
+        # str.replace(), which is faster than str.translate().
+        self.spec = f',.{spec.decimals}f'
+        if conventions.group == '.':
+            steps = [(',', '\0'), ('.', conventions.decimal), ('\0', '.')]
+        else:
+            steps = [(',', conventions.group), ('.', conventions.decimal)]
+        self.separators = [(old, new) for old, new in steps if old != new]
+        if conventions.symbol_first:
+            # "$5" but "FBu 5": a symbol made of letters needs a space.
+            self.prefix, self.suffix = symbol + (NBSP if symbol[-1].isalpha() else ''), ''
+        else:
+            self.prefix, self.suffix = '', NBSP + symbol
+
+    def format(self, amount):
+        if not isinstance(amount, Decimal):
+            amount = Decimal(str(amount))
+        amount = amount.quantize(self.quantum, rounding=ROUND_HALF_UP)
+        digits = format(amount.copy_abs(), self.spec)
+        for old, new in self.separators:
+            digits = digits.replace(old, new)
+        if amount < 0:
+            return '-' + self.prefix + digits + self.suffix
+        return self.prefix + digits + self.suffix
+
+
+@lru_cache(maxsize=64)
+def get_formatter(currency, locale):
+    return MoneyFormatter(currency, locale)
+
+
+@lru_cache(maxsize=64)
+def money_locale(language):
+    """The LOCALES entry for a language code such as 'fr-bi' or 'en-us'."""
+    language = (language or '').lower().replace('_', '-')
+    if language in LOCALES:
+        return language
+    return language.split('-')[0] if language.split('-')[0] in LOCALES else DEFAULT_LOCALE
+
+
+def default_currency():
+    return getattr(settings, 'MONEY_CURRENCY', 'USD')
+
+
+def format_money(amount, currency=None, locale=None):
+    """
+    Format `amount` (a Decimal, int or numeric string) in `currency`
+    (default settings.MONEY_CURRENCY) for `locale` (default: the active
+    language). Raises KeyError for an unknown currency and
+    decimal.InvalidOperation for an amount that is not a number.
+    """
+    return get_formatter(
+        (currency or default_currency()).upper(), money_locale(locale or translation.get_language()),
+    ).format(amount)
+
@@ -0,0 +1,159 @@
+"""
+Notification dispatch.
+
+Models and jobs call `notify()` instead of creating Notification rows
+directly. Notifications are handed to the `deliver_notifications`
+background task, which writes them with a single bulk_create. Outside of a
+batch each notification is its own delivery. Inside `batch()` they are
+collected, deduplicated and coalesced per user ("12 new reviews on X") and
+delivered together when the block exits. Inside `suppressed()` they are dropped, which is
+what bulk jobs that notify on their own terms want.
+
+    with notifications.batch():
+        for review in reviews:
+            review.save()
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.apps import apps
+from django.conf import settings
+from django.db import transaction
+from django.utils.text import Truncator
+
+MESSAGE_MAX_LENGTH = 255
+
+_current_batch = ContextVar('notification_batch', default=None)
+
+
+class PendingNotification:
+    __slots__ = ('user_id', 'message', 'group', 'summary')
+
+    def __init__(self, user_id, message, group=None, summary=None):
+        self.user_id = user_id
+        self.message = message
+        self.group = group
+        self.summary = summary
+
+
+class NotificationBatch:
+    def __init__(self, suppress=False):
+        self.suppress = suppress
+        self.pending = []
+
+    def add(self, pending):
+        if not self.suppress:
+            self.pending.append(pending)
+
+    def coalesce(self):
+        """
+        Collapse the pending notifications into the messages actually stored:
+        notifications sharing a group are merged into one summary line, and
+        exact duplicates of ungrouped ones are dropped.
+        """
+        seen = set()
+        groups = {}
+        messages = []
+        for pending in self.pending:
+            if pending.group is None:
+                if (pending.user_id, pending.message) not in seen:
+                    seen.add((pending.user_id, pending.message))
+                    messages.append((pending.user_id, pending.message))
+                continue
+            key = (pending.user_id, pending.group)
+            if key not in groups:
+                groups[key] = [pending, 0]
+                messages.append(key)
+            groups[key][1] += 1
+
+        result = []
+        for item in messages:
+            if item in groups:
+                first, count = groups[item]
+                message = first.message
+                if count > 1 and first.summary:
+                    message = first.summary.format(count=count)
+                result.append((first.user_id, message))
+            else:
+                result.append(item)
+        return result
+
+    def flush(self):
+        rows = self.coalesce()
+        self.pending = []
+        if rows:
+            deliver(rows)
+
+
+def write_notifications(rows):
+    """
+    Insert (user_id, message) pairs with one bulk_create and count them in
+    the recipients' inboxes, which also wakes their open streams.
+    """
+    from .inbox import record_delivered
+
+    Notification = apps.get_model('destination', 'Notification')
+    with transaction.atomic():
+        created = Notification.objects.bulk_create(
+            [
+                Notification(user_id=user_id, message=Truncator(message).chars(MESSAGE_MAX_LENGTH))
+                for user_id, message in rows
+            ],
+            batch_size=1000,
+        )
+        record_delivered(created)
+
+
+def deliver(rows):
+    from .tasks import deliver_notifications
+
+    deliver_notifications.delay([list(row) for row in rows])
+
+
+def notifications_enabled():
+    return getattr(settings, 'NOTIFICATIONS_ENABLED', True)
+
+
+def notify(user_id, message, group=None, summary=None):
+    """
+    Queue a notification for `user_id`.
+
+    `group` identifies notifications that may be merged when several end up
+    in the same batch, and `summary` is the message used for the merged
+    notification, with `{count}` replaced by the number merged.
+    """
+    if not notifications_enabled():
+        return
+    pending = PendingNotification(user_id, message, group, summary)
+    current = _current_batch.get()
+    if current is not None:
+        current.add(pending)
+        return
+    deliver([(pending.user_id, pending.message)])
+
+
+@contextmanager
+def batch():
+    """Collect notifications and write them coalesced when the block exits."""
+    outer = _current_batch.get()
+    if outer is not None:
+        # Nested batches fold into the outermost one.
+        yield outer
+        return
+    current = NotificationBatch()
+    token = _current_batch.set(current)
+    try:
+        yield current
+    finally:
+        _current_batch.reset(token)
+    current.flush()
+
+
+@contextmanager
+def suppressed():
+    """Drop every notification raised inside the block."""
+    token = _current_batch.set(NotificationBatch(suppress=True))
+    try:
+        yield
+    finally:
+        _current_batch.reset(token)
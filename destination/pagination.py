@@ -0,0 +1,85 @@
+import base64
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import aprefetch_related_objects, prefetch_related_objects
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+class KeysetPage:
+    def __init__(self, object_list, next_cursor):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+class KeysetPaginator:
+    """
+    Paginate a queryset by seeking past the last row of the previous page
+    on (field, pk) instead of using OFFSET, so every page costs the same no
+    matter how deep the client has scrolled. Rows are returned newest first.
+    """
+
+    def __init__(self, queryset, page_size=20, field='created_at', max_page_size=100):
+        self.queryset = queryset
+        self.page_size = max(1, min(int(page_size), max_page_size))
+        self.field = field
+        self.model_field = queryset.model._meta.get_field(field)
+
+    def encode_cursor(self, obj):
+        value = self.model_field.value_to_string(obj)
+        raw = json.dumps([value, obj.pk]).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            value, pk = json.loads(base64.urlsafe_b64decode(padded.encode()))
+            return self.model_field.to_python(value), int(pk)
+        except (ValueError, TypeError, ValidationError) as exc:
+            raise InvalidCursor("Invalid pagination cursor.") from exc
+
+    def _page_queryset(self, cursor):
+        queryset = self.queryset.order_by(f'-{self.field}', '-pk')
+        if cursor:
+            value, pk = self.decode_cursor(cursor)
+            queryset = queryset.filter(
+                **{f'{self.field}__lte': value}
+            ).exclude(
+                **{self.field: value, 'pk__gte': pk}
+            )
+        # Fetch one extra row to know whether there is a next page, and run
+        # the prefetches only for the rows actually on this page.
+        lookups = queryset._prefetch_related_lookups
+        return queryset.prefetch_related(None)[:self.page_size + 1], lookups
+
+    def _trim(self, rows):
+        if len(rows) > self.page_size:
+            rows = rows[:self.page_size]
+            return rows, self.encode_cursor(rows[-1])
+        return rows, None
+
+    def get_page(self, cursor=None):
+        queryset, lookups = self._page_queryset(cursor)
+        rows, next_cursor = self._trim(list(queryset))
+        prefetch_related_objects(rows, *lookups)
+        return KeysetPage(rows, next_cursor)
+
+    async def aget_page(self, cursor=None):
+        """Async version of get_page() for async views."""
+        queryset, lookups = self._page_queryset(cursor)
+        rows, next_cursor = self._trim([obj async for obj in queryset])
+        await aprefetch_related_objects(rows, *lookups)
+        return KeysetPage(rows, next_cursor)
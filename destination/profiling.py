@@ -0,0 +1,355 @@
+"""
+Request profiling.
+
+With settings.PROFILING_ENABLED, ProfilingMiddleware records for every
+request, labelled with its URL name ('home', 'destinations',
+'api:destination_list', ...):
+
+* wall time, as a histogram;
+* number and total time of database queries, on every connection and in
+  the threads async views run their queries in;
+* duplicate queries, i.e. the same SQL run more than once. A statement
+  repeated PROFILING_N_PLUS_ONE_THRESHOLD times or more is logged as a
+  likely N+1;
+* time spent rendering templates, including the queries they trigger.
+
+The totals are served in Prometheus text format by `metrics_view`, to
+local addresses only, and summarized in a Server-Timing header. Metrics
+live in the process that served the request, so scrape each worker (or
+run one) rather than a load balancer.
+
+With PROFILING_SAMPLE_RATE > 0, that fraction of requests also runs under
+cProfile (or pyinstrument, when PROFILING_PROFILER = 'pyinstrument' and it
+is installed), and requests slower than PROFILING_SLOW_MS are dumped to
+PROFILING_DUMP_DIR.
+
+When profiling is disabled the middleware removes itself at startup
+(MiddlewareNotUsed) and nothing is patched, so it costs nothing.
+"""
+import cProfile
+import logging
+import random
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import Http404, HttpResponse
+from django.template.backends.django import Template as BackendTemplate
+
+logger = logging.getLogger(__name__)
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+METRIC_PREFIX = 'toursim'
+
+_current = ContextVar('request_stats', default=None)
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+class RequestStats:
+    __slots__ = ('queries', 'query_time', 'statements', 'template_time')
+
+    def __init__(self):
+        self.queries = 0
+        self.query_time = 0.0
+        self.statements = Counter()
+        self.template_time = 0.0
+
+    @property
+    def duplicates(self):
+        return sum(count - 1 for count in self.statements.values() if count > 1)
+
+    def worst_repeat(self):
+        return self.statements.most_common(1)[0] if self.statements else ('', 0)
+
+
+# Instrumentation hooks. Both pass straight through outside a profiled request.
+
+def _record_query(execute, sql, params, many, context):
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.queries += 1
+        stats.query_time += time.perf_counter() - started
+        stats.statements[sql] += 1
+
+
+def _instrument_connection(sender, connection, **kwargs):
+    if _record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_record_query)
+
+
+_original_render = BackendTemplate.render
+
+
+def _timed_render(self, context=None, request=None):
+    stats = _current.get()
+    if stats is None:
+        return _original_render(self, context, request)
+    started = time.perf_counter()
+    try:
+        return _original_render(self, context, request)
+    finally:
+        stats.template_time += time.perf_counter() - started
+
+
+_installed = False
+_install_lock = threading.Lock()
+
+
+def install():
+    """Hook query and template timing into Django. Idempotent."""
+    global _installed
+    with _install_lock:
+        if _installed:
+            return
+        connection_created.connect(_instrument_connection, dispatch_uid='profiling')
+        for connection in connections.all(initialized_only=True):
+            _instrument_connection(None, connection)
+        # Only the top-level render of render()/render_to_string() is timed,
+        # so {% include %} is not counted twice.
+        BackendTemplate.render = _timed_render
+        _installed = True
+
+
+@contextmanager
+def capture():
+    """
+    Collect RequestStats for the code run in the block, with or without the
+    middleware. Used by the benchmark, which runs with PROFILING_ENABLED off
+    so that the middleware does not take the stats over.
+    """
+    install()
+    stats = RequestStats()
+    token = _current.set(stats)
+    try:
+        yield stats
+    finally:
+        _current.reset(token)
+
+
+# Metrics
+
+class ViewMetrics:
+    def __init__(self):
+        self.requests = Counter()  # (method, status) -> count
+        self.buckets = [0] * len(DURATION_BUCKETS)
+        self.duration_sum = 0.0
+        self.queries = 0
+        self.query_time = 0.0
+        self.duplicate_queries = 0
+        self.n_plus_one = 0
+        self.template_time = 0.0
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.views = defaultdict(ViewMetrics)
+
+    def observe(self, view, method, status, duration, stats, n_plus_one):
+        with self.lock:
+            metrics = self.views[view]
+            metrics.requests[(method, status)] += 1
+            for index, bound in enumerate(DURATION_BUCKETS):
+                if duration <= bound:
+                    metrics.buckets[index] += 1
+            metrics.duration_sum += duration
+            metrics.queries += stats.queries
+            metrics.query_time += stats.query_time
+            metrics.duplicate_queries += stats.duplicates
+            metrics.n_plus_one += n_plus_one
+            metrics.template_time += stats.template_time
+
+    def reset(self):
+        with self.lock:
+            self.views.clear()
+
+    def render(self):
+        """The metrics in the Prometheus text exposition format."""
+        with self.lock:
+            views = sorted(self.views.items())
+            lines = []
+
+            def family(name, kind, help_text):
+                lines.append(f'# HELP {METRIC_PREFIX}_{name} {help_text}')
+                lines.append(f'# TYPE {METRIC_PREFIX}_{name} {kind}')
+
+            def sample(name, labels, value):
+                rendered = ','.join(f'{key}="{_escape(value)}"' for key, value in labels.items())
+                lines.append(f'{METRIC_PREFIX}_{name}{{{rendered}}} {value}')
+
+            family('requests_total', 'counter', 'Requests served, by view, method and status.')
+            for view, metrics in views:
+                for (method, status), count in sorted(metrics.requests.items()):
+                    sample('requests_total', {'view': view, 'method': method, 'status': status}, count)
+
+            family('request_duration_seconds', 'histogram', 'Wall time of requests, by view.')
+            for view, metrics in views:
+                for bound, count in zip(DURATION_BUCKETS, metrics.buckets):
+                    sample('request_duration_seconds_bucket', {'view': view, 'le': bound}, count)
+                total = sum(metrics.requests.values())
+                sample('request_duration_seconds_bucket', {'view': view, 'le': '+Inf'}, total)
+                sample('request_duration_seconds_sum', {'view': view}, f'{metrics.duration_sum:.6f}')
+                sample('request_duration_seconds_count', {'view': view}, total)
+
+            for name, attribute, help_text, is_time in (
+                ('db_queries_total', 'queries', 'Database queries run, by view.', False),
+                ('db_query_seconds_total', 'query_time', 'Time spent in database queries, by view.', True),
+                ('db_duplicate_queries_total', 'duplicate_queries',
+                 'Queries that repeated an earlier statement of the same request, by view.', False),
+                ('n_plus_one_requests_total', 'n_plus_one',
+                 'Requests that repeated one statement PROFILING_N_PLUS_ONE_THRESHOLD times or more.', False),
+                ('template_render_seconds_total', 'template_time', 'Time spent rendering templates, by view.', True),
+            ):
+                family(name, 'counter', help_text)
+                for view, metrics in views:
+                    value = getattr(metrics, attribute)
+                    sample(name, {'view': view}, f'{value:.6f}' if is_time else value)
+            return '\n'.join(lines) + '\n'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+registry = MetricsRegistry()
+
+
+# Sampling profiler
+
+class _Sampler:
+    def __init__(self):
+        self.kind = _setting('PROFILING_PROFILER', 'cprofile')
+        self.profiler = None
+        if self.kind == 'pyinstrument':
+            try:
+                from pyinstrument import Profiler
+            except ImportError:
+                self.kind = 'cprofile'
+            else:
+                self.profiler = Profiler(async_mode='enabled')
+        if self.profiler is None:
+            self.profiler = cProfile.Profile()
+
+    def start(self):
+        if self.kind == 'pyinstrument':
+            self.profiler.start()
+        else:
+            self.profiler.enable()
+
+    def stop(self):
+        if self.kind == 'pyinstrument':
+            self.profiler.stop()
+        else:
+            self.profiler.disable()
+
+    def dump(self, view, duration):
+        directory = Path(_setting('PROFILING_DUMP_DIR', settings.BASE_DIR / 'profiles'))
+        directory.mkdir(parents=True, exist_ok=True)
+        stem = f"{view.replace(':', '-')}-{time.strftime('%Y%m%d-%H%M%S')}-{int(duration * 1000)}ms"
+        if self.kind == 'pyinstrument':
+            path = directory / f'{stem}.html'
+            path.write_text(self.profiler.output_html())
+        else:
+            path = directory / f'{stem}.prof'
+            self.profiler.dump_stats(path)
+        logger.info("Profile of slow %s request written to %s", view, path)
+
+
+# Middleware
+
+class ProfilingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not _setting('PROFILING_ENABLED', False):
+            raise MiddlewareNotUsed
+        install()
+        self.get_response = get_response
+        self.sample_rate = _setting('PROFILING_SAMPLE_RATE', 0.0)
+        self.slow = _setting('PROFILING_SLOW_MS', 500) / 1000
+        self.n_plus_one_threshold = _setting('PROFILING_N_PLUS_ONE_THRESHOLD', 5)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        stats, sampler, token, started = self._start()
+        try:
+            response = self.get_response(request)
+        finally:
+            duration = self._stop(sampler, token, started)
+        return self._finish(request, response, stats, sampler, duration)
+
+    async def __acall__(self, request):
+        stats, sampler, token, started = self._start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            duration = self._stop(sampler, token, started)
+        return self._finish(request, response, stats, sampler, duration)
+
+    def _start(self):
+        stats = RequestStats()
+        token = _current.set(stats)
+        sampler = None
+        if self.sample_rate and random.random() < self.sample_rate:
+            sampler = _Sampler()
+            sampler.start()
+        return stats, sampler, token, time.perf_counter()
+
+    def _stop(self, sampler, token, started):
+        duration = time.perf_counter() - started
+        if sampler is not None:
+            sampler.stop()
+        _current.reset(token)
+        return duration
+
+    def _finish(self, request, response, stats, sampler, duration):
+        match = request.resolver_match
+        view = match.view_name if match else 'unresolved'
+        if view == 'metrics':
+            return response
+
+        statement, repeats = stats.worst_repeat()
+        n_plus_one = repeats >= self.n_plus_one_threshold
+        if n_plus_one:
+            logger.warning(
+                "Possible N+1 in %s: %d queries, one statement ran %d times: %s",
+                view, stats.queries, repeats, statement[:300],
+            )
+        registry.observe(view, request.method, response.status_code, duration, stats, int(n_plus_one))
+        if sampler is not None and duration >= self.slow:
+            sampler.dump(view, duration)
+
+        response.headers['Server-Timing'] = ', '.join([
+            f'total;dur={duration * 1000:.1f}',
+            f'db;dur={stats.query_time * 1000:.1f};desc="{stats.queries} queries"',
+            f'tpl;dur={stats.template_time * 1000:.1f}',
+        ])
+        return response
+
+
+def metrics_view(request):
+    """Prometheus metrics, for local scrapers only (PROFILING_METRICS_ALLOWED_IPS)."""
+    allowed = _setting('PROFILING_METRICS_ALLOWED_IPS', ('127.0.0.1', '::1'))
+    if not _setting('PROFILING_ENABLED', False) or request.META.get('REMOTE_ADDR') not in allowed:
+        raise Http404
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
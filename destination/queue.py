@@ -0,0 +1,268 @@
+"""
+A small job queue that uses the Job table as its broker.
+
+Functions decorated with `@task` can be run later with `.delay()`. The job
+row is inserted in the caller's transaction, so a job is only ever seen by
+workers if the work that scheduled it committed. Workers started with
+`manage.py runworker` claim due jobs with a conditional UPDATE, run them,
+and reschedule failures with exponential backoff until `max_attempts`.
+While a job runs its worker refreshes the lock, so only the jobs of a
+worker that died are taken over after `lock_timeout`. Finished jobs are
+deleted after JOB_RETENTION_DAYS by the workers themselves.
+
+With settings.TASKS_ALWAYS_EAGER the task runs in-process when the
+surrounding transaction commits instead, which is handy for development
+and tests.
+"""
+import logging
+import os
+import random
+import socket
+import threading
+import time
+import traceback
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DatabaseError, IntegrityError, close_old_connections, connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+_registry = {}
+
+JOB_RETENTION_DAYS = getattr(settings, 'JOB_RETENTION_DAYS', 7)
+
+
+class Task:
+    def __init__(self, func, name=None, max_attempts=5, backoff=2.0, max_backoff=3600):
+        self.func = func
+        self.name = name or f'{func.__module__}.{func.__name__}'
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.__doc__ = func.__doc__
+
+    def __call__(self, *args, **kwargs):
+        return self.func(*args, **kwargs)
+
+    def delay(self, *args, **kwargs):
+        return self.apply_async(args, kwargs)
+
+    def apply_async(self, args=(), kwargs=None, idempotency_key=None, countdown=0):
+        """
+        Schedule the task. While a job with the same idempotency_key is still
+        queued, a second call returns it instead of queueing the work again.
+        Once that job has started, the key moves to a new job, since the
+        running one may already have read what the caller just changed.
+        """
+        kwargs = kwargs or {}
+        if getattr(settings, 'TASKS_ALWAYS_EAGER', False):
+            transaction.on_commit(lambda: self.func(*args, **kwargs))
+            return None
+
+        job = Job(
+            task=self.name,
+            args=list(args),
+            kwargs=kwargs,
+            idempotency_key=idempotency_key,
+            max_attempts=self.max_attempts,
+            run_at=timezone.now() + timedelta(seconds=countdown),
+        )
+        if idempotency_key is None:
+            job.save()
+            return job
+        for _ in range(3):
+            try:
+                with transaction.atomic():
+                    job.save()
+                return job
+            except IntegrityError:
+                existing = Job.objects.filter(idempotency_key=idempotency_key).first()
+                if existing is not None and existing.status == 'queued':
+                    return existing
+                Job.objects.filter(idempotency_key=idempotency_key).exclude(status='queued').update(
+                    idempotency_key=None,
+                )
+        return Job.objects.get(idempotency_key=idempotency_key)
+
+    def retry_delay(self, attempts):
+        delay = min(self.backoff ** attempts, self.max_backoff)
+        # Jitter so jobs that failed together do not retry together.
+        return delay * random.uniform(0.5, 1.5)
+
+
+def task(func=None, **options):
+    """Register a function as a background task: `@task` or `@task(max_attempts=3)`."""
+    def decorator(func):
+        registered = Task(func, **options)
+        _registry[registered.name] = registered
+        return registered
+
+    if func is not None:
+        return decorator(func)
+    return decorator
+
+
+def get_task(name):
+    return _registry[name]
+
+
+def purge_jobs(days=JOB_RETENTION_DAYS, batch_size=1000):
+    """Delete jobs that finished successfully more than `days` ago. Returns the number deleted."""
+    cutoff = timezone.now() - timedelta(days=days)
+    candidates = Job.objects.filter(status='done', finished_at__lt=cutoff).order_by('pk')
+    deleted = 0
+    while True:
+        batch = list(candidates.values_list('pk', flat=True)[:batch_size])
+        if not batch:
+            return deleted
+        deleted += Job.objects.filter(pk__in=batch).delete()[0]
+
+
+class Worker:
+    # Seconds between purges of old finished jobs
+    purge_interval = 3600
+
+    def __init__(self, name=None, poll_interval=1.0, batch_size=10, lock_timeout=600, heartbeat_interval=None):
+        self.name = name or f'{socket.gethostname()}:{os.getpid()}'
+        self.poll_interval = poll_interval
+        self.batch_size = batch_size
+        self.lock_timeout = lock_timeout
+        # Several beats fit in a lock_timeout, so one slow beat does not
+        # let another worker take the job over.
+        self.heartbeat_interval = heartbeat_interval or lock_timeout / 4
+        self.stopping = False
+        self.last_purge = None
+
+    def claim(self):
+        """
+        Claim up to batch_size due jobs. Each claim is a conditional UPDATE on
+        the job row, so two workers can never both claim the same job.
+        """
+        now = timezone.now()
+        stale = now - timedelta(seconds=self.lock_timeout)
+        candidates = list(
+            Job.objects.filter(status='queued', run_at__lte=now)
+            .order_by('run_at', 'pk')
+            .values_list('pk', flat=True)[:self.batch_size]
+        )
+        # Jobs whose worker died mid-run are picked up again after lock_timeout.
+        candidates += list(
+            Job.objects.filter(status='running', locked_at__lt=stale)
+            .values_list('pk', flat=True)[:self.batch_size]
+        )
+        claimed = []
+        for pk in candidates:
+            updated = Job.objects.filter(
+                Q(status='queued', run_at__lte=now) | Q(status='running', locked_at__lt=stale),
+                pk=pk,
+            ).update(status='running', locked_by=self.name, locked_at=now)
+            if updated:
+                claimed.append(pk)
+        return list(Job.objects.filter(pk__in=claimed, locked_by=self.name).order_by('run_at', 'pk'))
+
+    def execute(self, job):
+        try:
+            registered = get_task(job.task)
+        except KeyError:
+            self._fail(job, f"Unknown task {job.task!r}")
+            return
+
+        job.attempts += 1
+        try:
+            with self._heartbeat(job):
+                registered.func(*job.args, **job.kwargs)
+        except Exception:
+            error = traceback.format_exc()
+            logger.warning("Job %s (%s) failed on attempt %s", job.pk, job.task, job.attempts)
+            if job.attempts >= job.max_attempts:
+                self._fail(job, error)
+            else:
+                self._finish(
+                    job, status='queued', last_error=error, locked_by='', locked_at=None,
+                    run_at=timezone.now() + timedelta(seconds=registered.retry_delay(job.attempts)),
+                )
+            return
+
+        self._finish(job, status='done', finished_at=timezone.now())
+
+    def _fail(self, job, error):
+        self._finish(job, status='failed', last_error=error, finished_at=timezone.now())
+
+    def _finish(self, job, **fields):
+        """
+        Record the outcome of a run, unless another worker took the job over
+        in the meantime: then its outcome is the one that counts.
+        """
+        for name, value in fields.items():
+            setattr(job, name, value)
+        updated = Job.objects.filter(pk=job.pk, locked_by=self.name).update(attempts=job.attempts, **fields)
+        if not updated:
+            logger.warning("Job %s (%s) was taken over by another worker", job.pk, job.task)
+
+    def refresh_lock(self, job):
+        """Move the lock of a running job forward. False when another worker has taken it over."""
+        return bool(
+            Job.objects.filter(pk=job.pk, status='running', locked_by=self.name).update(locked_at=timezone.now())
+        )
+
+    @contextmanager
+    def _heartbeat(self, job):
+        """Refresh the job's lock from a side thread while the block runs."""
+        stop = threading.Event()
+
+        def beat():
+            try:
+                while not stop.wait(self.heartbeat_interval):
+                    try:
+                        if not self.refresh_lock(job):
+                            return
+                    except DatabaseError:
+                        logger.warning("Could not refresh the lock of job %s", job.pk, exc_info=True)
+            finally:
+                connection.close()
+
+        thread = threading.Thread(target=beat, name=f'job-{job.pk}-heartbeat', daemon=True)
+        thread.start()
+        try:
+            yield
+        finally:
+            stop.set()
+            thread.join()
+
+    def run_once(self):
+        """Run every job that is currently due. Returns the number run."""
+        processed = 0
+        while True:
+            jobs = self.claim()
+            if not jobs:
+                return processed
+            for job in jobs:
+                self.execute(job)
+                processed += 1
+
+    def purge_if_due(self):
+        if self.last_purge is None or time.monotonic() - self.last_purge >= self.purge_interval:
+            self.last_purge = time.monotonic()
+            try:
+                deleted = purge_jobs()
+            except DatabaseError:
+                logger.warning("Could not purge finished jobs", exc_info=True)
+            else:
+                if deleted:
+                    logger.info("Purged %s finished jobs", deleted)
+
+    def run(self):
+        logger.info("Worker %s started", self.name)
+        while not self.stopping:
+            close_old_connections()
+            self.purge_if_due()
+            if not self.run_once():
+                time.sleep(self.poll_interval)
+        connection.close()
+
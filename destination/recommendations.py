@@ -0,0 +1,271 @@
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from django.utils import timezone
+
+from . import notifications
+from .models import Activity, AIRecommendation, Booking, Destination, User
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - numpy is only needed for batch scoring
+    np = None
+
+
+class RecommendationEngine:
+    """
+    Batch scorer for every (user, destination) pair.
+
+    Destinations are turned into fixed feature matrices once (activities,
+    categories, price, rating). Users are then streamed in chunks: each chunk
+    becomes a small feature matrix, and all of its scores come out of a
+    couple of matrix products. Only the top-k per user is kept, so memory is
+    bounded by chunk_size x number of destinations regardless of user count.
+    """
+
+    activity_weight = 0.4
+    category_weight = 0.25
+    budget_weight = 0.2
+    rating_weight = 0.15
+    # Bayesian prior for ratings: destinations with few reviews are pulled
+    # towards an average rating.
+    rating_prior_mean = 3.0
+    rating_prior_weight = 5
+
+    def __init__(self, top_k=10, chunk_size=512, workers=None):
+        if np is None:
+            raise ImproperlyConfigured("The recommendation engine requires numpy.")
+        self.top_k = top_k
+        self.chunk_size = chunk_size
+        self.workers = workers
+        self._load_destinations()
+
+    # Destination side
+
+    def _load_destinations(self):
+        rows = list(
+            Destination.objects.order_by('pk').values_list('pk', 'price', 'rating_sum', 'rating_count')
+        )
+        self.destination_ids = np.array([row[0] for row in rows], dtype=np.int64)
+        self.destination_index = {pk: i for i, pk in enumerate(self.destination_ids.tolist())}
+        self.prices = np.array([float(row[1]) for row in rows], dtype=np.float32)
+        rating_sum = np.array([row[2] for row in rows], dtype=np.float32)
+        rating_count = np.array([row[3] for row in rows], dtype=np.float32)
+        self.quality = (
+            (rating_sum + self.rating_prior_mean * self.rating_prior_weight)
+            / (rating_count + self.rating_prior_weight)
+            / 5.0
+        )
+
+        activity_rows = list(Activity.objects.values_list('pk', 'category_id'))
+        self.activity_index = {pk: i for i, (pk, _) in enumerate(activity_rows)}
+        self.activity_category = {pk: category_id for pk, category_id in activity_rows}
+        category_ids = sorted({category_id for _, category_id in activity_rows} | set(
+            Destination.categories.through.objects.values_list('category_id', flat=True).distinct()
+        ))
+        self.category_index = {pk: i for i, pk in enumerate(category_ids)}
+
+        # Destination -> categories, and destination -> activities through
+        # the activities of its categories.
+        self.destination_activities = {}
+        category_activities = {}
+        for pk, category_id in activity_rows:
+            category_activities.setdefault(category_id, []).append(pk)
+        n = len(self.destination_ids)
+        category_matrix = np.zeros((n, len(self.category_index)), dtype=np.float32)
+        activity_matrix = np.zeros((n, len(self.activity_index)), dtype=np.float32)
+        links = Destination.categories.through.objects.values_list('destination_id', 'category_id')
+        for destination_id, category_id in links.iterator(chunk_size=10000):
+            row = self.destination_index.get(destination_id)
+            if row is None:
+                continue
+            category_matrix[row, self.category_index[category_id]] = 1
+            for activity_id in category_activities.get(category_id, ()):
+                activity_matrix[row, self.activity_index[activity_id]] = 1
+                self.destination_activities.setdefault(destination_id, set()).add(activity_id)
+
+        self.category_matrix = category_matrix
+        # Transposed once, normalized rows so the products are cosine scores.
+        self.category_matrix_t = _normalize_rows(category_matrix).T.copy()
+        self.activity_matrix_t = _normalize_rows(activity_matrix).T.copy()
+
+    # User side
+
+    def _user_chunks(self):
+        users = User.objects.filter(role='customer', is_active=True).order_by('pk').values_list('pk', 'preferred_budget').iterator(chunk_size=self.chunk_size)
+        while True:
+            chunk = list(islice(users, self.chunk_size))
+            if not chunk:
+                return
+            yield chunk
+
+    def _load_chunk(self, chunk):
+        user_ids = [pk for pk, _ in chunk]
+        preferences = {}
+        for user_id, activity_id in User.preferred_activities.through.objects.filter(
+            user_id__in=user_ids
+        ).values_list('user_id', 'activity_id'):
+            preferences.setdefault(user_id, set()).add(activity_id)
+        bookings = {}
+        for user_id, destination_id in Booking.objects.filter(user_id__in=user_ids).values_list(
+            'user_id', 'destination_id'
+        ):
+            bookings.setdefault(user_id, set()).add(destination_id)
+        return chunk, preferences, bookings
+
+    def score_chunk(self, chunk, preferences, bookings):
+        """
+        Return (user_ids, destination_rows, scores) for the top-k
+        destinations of each user in the chunk, best first.
+        """
+        b = len(chunk)
+        n = len(self.destination_ids)
+        user_activities = np.zeros((b, len(self.activity_index)), dtype=np.float32)
+        user_categories = np.zeros((b, len(self.category_index)), dtype=np.float32)
+        budgets = np.full(b, np.nan, dtype=np.float32)
+        booked_rows, booked_cols = [], []
+
+        for i, (user_id, budget) in enumerate(chunk):
+            if budget is not None:
+                budgets[i] = float(budget)
+            for activity_id in preferences.get(user_id, ()):
+                user_activities[i, self.activity_index[activity_id]] = 1
+                user_categories[i, self.category_index[self.activity_category[activity_id]]] += 1
+            for destination_id in bookings.get(user_id, ()):
+                row = self.destination_index.get(destination_id)
+                if row is None:
+                    continue
+                booked_rows.append(i)
+                booked_cols.append(row)
+        if booked_rows:
+            # Categories of past bookings count towards the user's taste.
+            np.add.at(user_categories, booked_rows, self.category_matrix[booked_cols])
+
+        scores = self.activity_weight * (_normalize_rows(user_activities) @ self.activity_matrix_t)
+        scores += self.category_weight * (_normalize_rows(user_categories) @ self.category_matrix_t)
+        scores += self.rating_weight * self.quality[np.newaxis, :]
+
+        has_budget = ~np.isnan(budgets)
+        if has_budget.any():
+            # weight * clip(1 - max(price - budget, 0) / budget, 0, 1), computed
+            # in place on one buffer to avoid a handful of b x n temporaries.
+            user_budgets = budgets[has_budget, np.newaxis]
+            fit = np.subtract(self.prices[np.newaxis, :], user_budgets)
+            np.maximum(fit, 0, out=fit)
+            fit *= -self.budget_weight / np.maximum(user_budgets, 1)
+            fit += self.budget_weight
+            np.maximum(fit, 0, out=fit)
+            scores[has_budget] += fit
+
+        # Never recommend something the user already booked.
+        if booked_rows:
+            scores[booked_rows, booked_cols] = -np.inf
+
+        k = min(self.top_k, n)
+        top = np.argpartition(scores, n - k, axis=1)[:, n - k:]
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        # Ties go to the lower destination id, so reruns order them the same way.
+        order = np.lexsort((top, -top_scores), axis=1)
+        top = np.take_along_axis(top, order, axis=1)
+        top_scores = np.take_along_axis(top_scores, order, axis=1)
+        return [user_id for user_id, _ in chunk], top, top_scores
+
+    # Writing
+
+    def _write_chunk(self, preferences, user_ids, top, top_scores):
+        """
+        Store the new top-k of each user whose list changed (other
+        destinations, or the same ones in another order) and notify them of
+        the destinations that are new to it. Users whose list is unchanged
+        are left alone. Returns the recommendations written.
+        """
+        now = timezone.now()
+        ranked = {}
+        for i, user_id in enumerate(user_ids):
+            ranked[user_id] = [
+                (int(self.destination_ids[row]), score)
+                for row, score in zip(top[i].tolist(), top_scores[i].tolist())
+                if score != -np.inf
+            ]
+        current = {}
+        for user_id, destination_id in (
+            AIRecommendation.objects.filter(user_id__in=user_ids)
+            .order_by('user_id', '-score', 'pk').values_list('user_id', 'recommended_destination_id')
+        ):
+            current.setdefault(user_id, []).append(destination_id)
+        changed = [
+            user_id for user_id in user_ids
+            if [destination_id for destination_id, _ in ranked[user_id]] != current.get(user_id, [])
+        ]
+        if not changed:
+            return []
+
+        recommendations = [
+            AIRecommendation(
+                user_id=user_id, recommended_destination_id=destination_id, score=score, created_at=now,
+            )
+            for user_id in changed
+            for destination_id, score in ranked[user_id]
+        ]
+        through = AIRecommendation.recommended_activities.through
+        with transaction.atomic():
+            AIRecommendation.objects.filter(user_id__in=changed).delete()
+            AIRecommendation.objects.bulk_create(recommendations, batch_size=1000)
+            links = []
+            for recommendation in recommendations:
+                matching = preferences.get(recommendation.user_id, set()) & self.destination_activities.get(
+                    recommendation.recommended_destination_id, set()
+                )
+                links.extend(
+                    through(airecommendation_id=recommendation.pk, activity_id=activity_id)
+                    for activity_id in matching
+                )
+            through.objects.bulk_create(links, batch_size=1000)
+
+            # bulk_create skips AIRecommendation.save(), so notify here: one
+            # coalesced notification per user for the whole chunk, and only
+            # about destinations that were not recommended to them already.
+            new = [
+                recommendation for recommendation in recommendations
+                if recommendation.recommended_destination_id not in current.get(recommendation.user_id, ())
+            ]
+            destinations = Destination.objects.only('name').in_bulk(
+                {recommendation.recommended_destination_id for recommendation in new}
+            )
+            with notifications.batch():
+                for recommendation in new:
+                    recommendation.recommended_destination = destinations[recommendation.recommended_destination_id]
+                    recommendation.create_recommendation_notification()
+        return recommendations
+
+    def run(self):
+        """Score every user and replace the stored recommendations that changed. Returns the count written."""
+        if not len(self.destination_ids):
+            return 0
+
+        workers = self.workers or os.cpu_count() or 1
+        written = 0
+        pending = deque()
+        # Chunks are read from the database on this thread and scored on the
+        # pool; numpy releases the GIL in the matrix products, so several
+        # chunks score in parallel while finished ones are written here.
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for chunk in self._user_chunks():
+                chunk, preferences, bookings = self._load_chunk(chunk)
+                pending.append((preferences, executor.submit(self.score_chunk, chunk, preferences, bookings)))
+                if len(pending) >= workers:
+                    preferences, future = pending.popleft()
+                    written += len(self._write_chunk(preferences, *future.result()))
+            while pending:
+                preferences, future = pending.popleft()
+                written += len(self._write_chunk(preferences, *future.result()))
+        return written
+
+def _normalize_rows(matrix):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return matrix / norms
@@ -0,0 +1,75 @@
+"""
+Read-replica routing for listing reads.
+
+Only code running under `read_from_replica` (a view decorator or context
+manager) reads from a replica, and then only the catalogue models, which
+can tolerate a little replication lag. Everything else, including
+sessions, users and bookings, keeps reading the primary, so users always
+see their own writes. Without replicas configured everything uses 'default'.
+"""
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+_use_replica = ContextVar('use_replica', default=False)
+
+REPLICA_MODELS = {
+    'destination.destination',
+    'destination.destination_categories',
+    'destination.destinationimage',
+    'destination.category',
+    'destination.activity',
+    'destination.review',
+}
+
+
+def replica_aliases():
+    return [alias for alias in settings.DATABASES if alias.startswith('replica_')]
+
+
+@contextmanager
+def replica_reads():
+    token = _use_replica.set(True)
+    try:
+        yield
+    finally:
+        _use_replica.reset(token)
+
+
+def read_from_replica(view):
+    """Send the catalogue reads of `view` (sync or async) to a replica."""
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def async_wrapper(request, *args, **kwargs):
+            with replica_reads():
+                return await view(request, *args, **kwargs)
+        return markcoroutinefunction(async_wrapper)
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        with replica_reads():
+            return view(request, *args, **kwargs)
+    return wrapper
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if not _use_replica.get() or model._meta.label_lower not in REPLICA_MODELS:
+            return None
+        replicas = replica_aliases()
+        return random.choice(replicas) if replicas else None
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get their schema through replication.
+        return db == 'default'
@@ -0,0 +1,305 @@
+import difflib
+import re
+import unicodedata
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils.html import escape
+from django.utils.module_loading import import_string
+
+from .models import Destination
+
+SEARCH_TABLE = 'destination_search'
+SEARCH_VOCAB_TABLE = 'destination_search_vocab'
+# Every term ever indexed, for typo correction. Terms of removed
+# destinations stay behind; a correction to one just matches nothing.
+SEARCH_TERMS_TABLE = 'destination_search_terms'
+
+# Markers put around matches by the database; they are swapped for <mark>
+# tags only after the surrounding text has been HTML-escaped.
+_HL_START = '\x02'
+_HL_END = '\x03'
+
+_TERM_RE = re.compile(r'\w+', re.UNICODE)
+
+
+@dataclass
+class SearchHit:
+    destination_id: int
+    rank: float
+    name: str
+    snippet: str
+
+
+@dataclass
+class SearchResult:
+    destination: Destination
+    rank: float
+    name: str
+    snippet: str
+
+
+def normalize_term(term):
+    """Lowercase and strip diacritics, the same way the FTS5 tokenizer does."""
+    decomposed = unicodedata.normalize('NFKD', term)
+    return ''.join(ch for ch in decomposed if not unicodedata.combining(ch)).lower()
+
+
+def query_terms(query):
+    return [normalize_term(term) for term in _TERM_RE.findall(query or '')]
+
+
+def _render_highlight(text):
+    return escape(text or '').replace(_HL_START, '<mark>').replace(_HL_END, '</mark>')
+
+
+def destination_document(destination):
+    """
+    Text indexed for one destination. Expects `categories__activities` to be
+    prefetched when called in bulk.
+    """
+    categories = list(destination.categories.all())
+    activities = [activity for category in categories for activity in category.activities.all()]
+    return {
+        'name': destination.name,
+        'description': destination.description,
+        'location': destination.location,
+        'categories': ' '.join(category.name for category in categories),
+        'activities': ' '.join(activity.name for activity in activities),
+    }
+
+
+class BaseSearchBackend:
+    def index(self, destinations):
+        raise NotImplementedError
+
+    def remove(self, destination_ids):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    def search(self, query, limit=20):
+        """Return a ranked list of SearchHit, best match first."""
+        raise NotImplementedError
+
+
+class DatabaseSearchBackend(BaseSearchBackend):
+    """
+    Portable fallback that needs no index: plain icontains filters ordered by
+    rating. Slow on large catalogs, but works on every database.
+    """
+
+    def index(self, destinations):
+        pass
+
+    def remove(self, destination_ids):
+        pass
+
+    def clear(self):
+        pass
+
+    def search(self, query, limit=20):
+        terms = _TERM_RE.findall(query or '')
+        if not terms:
+            return []
+        condition = Q()
+        for term in terms:
+            condition &= (
+                Q(name__icontains=term)
+                | Q(description__icontains=term)
+                | Q(location__icontains=term)
+                | Q(categories__name__icontains=term)
+                | Q(categories__activities__name__icontains=term)
+            )
+        destinations = (
+            Destination.objects.filter(condition)
+            .distinct()
+            .order_by('-rating_avg', '-created_at')
+            .only('id', 'name', 'description')[:limit]
+        )
+        return [
+            SearchHit(destination.pk, 0.0, escape(destination.name), escape(destination.description[:200]))
+            for destination in destinations
+        ]
+
+
+class SQLiteFTS5Backend(BaseSearchBackend):
+    """
+    Search through an FTS5 virtual table keyed by destination id, ranked with
+    bm25. Misspelled terms are corrected against the index vocabulary;
+    unknown terms too short to correct are ignored.
+
+    Scoring costs about 2 µs per matching row, so a term found in every
+    destination of a 100k catalog would take 200 ms to rank. A query that
+    matches more than `max_candidates` destinations therefore only ranks the
+    newest `max_candidates` of them: older matches are left out of its
+    results however well they score. Narrower queries, the usual case, are
+    ranked over every match. settings.SEARCH_MAX_CANDIDATES = None ranks
+    everything, whatever it costs.
+    """
+
+    # bm25 column weights: name, description, location, categories, activities
+    weights = (10.0, 1.0, 5.0, 3.0, 3.0)
+    fuzzy_cutoff = 0.75
+    fuzzy_candidates = 3
+    # Unknown terms this short ("of", "la") are dropped rather than corrected.
+    min_fuzzy_length = 3
+    max_candidates = getattr(settings, 'SEARCH_MAX_CANDIDATES', 2000)
+
+    def index(self, destinations):
+        rows = []
+        for destination in destinations:
+            doc = destination_document(destination)
+            rows.append((destination.pk, doc['name'], doc['description'], doc['location'],
+                         doc['categories'], doc['activities']))
+        if not rows:
+            return
+        with connection.cursor() as cursor:
+            cursor.executemany(f'DELETE FROM {SEARCH_TABLE} WHERE rowid = %s', [(row[0],) for row in rows])
+            cursor.executemany(
+                f'INSERT INTO {SEARCH_TABLE} (rowid, name, description, location, categories, activities) '
+                'VALUES (%s, %s, %s, %s, %s, %s)',
+                rows,
+            )
+            cursor.executemany(
+                f'INSERT OR IGNORE INTO {SEARCH_TERMS_TABLE} (term) VALUES (%s)',
+                [(term,) for term in {term for row in rows for text in row[1:] for term in query_terms(text)}],
+            )
+
+    def remove(self, destination_ids):
+        with connection.cursor() as cursor:
+            cursor.executemany(f'DELETE FROM {SEARCH_TABLE} WHERE rowid = %s', [(pk,) for pk in destination_ids])
+
+    def clear(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {SEARCH_TABLE}')
+            cursor.execute(f'DELETE FROM {SEARCH_TERMS_TABLE}')
+
+    def _known(self, cursor, term):
+        cursor.execute(
+            f'SELECT 1 FROM {SEARCH_VOCAB_TABLE} WHERE term >= %s AND term < %s LIMIT 1',
+            [term, term + '\uffff'],
+        )
+        return cursor.fetchone() is not None
+
+    def _corrections(self, cursor, term):
+        # Only terms sharing the first letter and within two characters of
+        # the length are considered. They are read from the plain terms
+        # table: the fts5vocab table counts every term's documents as it
+        # goes, which costs tens of milliseconds on a large index.
+        cursor.execute(
+            f'SELECT term FROM {SEARCH_TERMS_TABLE} '
+            'WHERE term >= %s AND term < %s AND length(term) BETWEEN %s AND %s',
+            [term[0], term[0] + '\uffff', len(term) - 2, len(term) + 2],
+        )
+        vocabulary = [row[0] for row in cursor.fetchall()]
+        return difflib.get_close_matches(term, vocabulary, n=self.fuzzy_candidates, cutoff=self.fuzzy_cutoff)
+
+    def build_match(self, cursor, query):
+        clauses = []
+        for term in query_terms(query):
+            if self._known(cursor, term):
+                clauses.append(f'"{term}"*')
+                continue
+            if len(term) < self.min_fuzzy_length:
+                continue
+            corrections = self._corrections(cursor, term)
+            if not corrections:
+                return None
+            clauses.append('(' + ' OR '.join(f'"{word}"' for word in corrections) + ')')
+        return ' AND '.join(clauses) or None
+
+    def _candidate_floor(self, cursor, match):
+        """
+        Lowest rowid among the newest `max_candidates` matches, or None when
+        there are fewer matches than that (or no cap).
+        """
+        if self.max_candidates is None:
+            return None
+        cursor.execute(
+            f'SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s '
+            'ORDER BY rowid DESC LIMIT 1 OFFSET %s',
+            [match, self.max_candidates - 1],
+        )
+        row = cursor.fetchone()
+        return row[0] if row else None
+
+    def search(self, query, limit=20):
+        with connection.cursor() as cursor:
+            match = self.build_match(cursor, query)
+            if match is None:
+                return []
+            floor = self._candidate_floor(cursor, match)
+            weights = ', '.join(str(weight) for weight in self.weights)
+            cursor.execute(
+                f"SELECT rowid, bm25({SEARCH_TABLE}, {weights}) AS rank, "
+                f"highlight({SEARCH_TABLE}, 0, %s, %s), "
+                f"snippet({SEARCH_TABLE}, 1, %s, %s, '…', 24) "
+                f"FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s AND rowid >= %s "
+                "ORDER BY rank LIMIT %s",
+                [_HL_START, _HL_END, _HL_START, _HL_END, match, floor or 0, limit],
+            )
+            return [
+                SearchHit(rowid, rank, _render_highlight(name), _render_highlight(snippet))
+                for rowid, rank, name, snippet in cursor.fetchall()
+            ]
+
+
+_backend = None
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        path = getattr(settings, 'SEARCH_BACKEND', None)
+        if path is None:
+            path = (
+                'destination.search.SQLiteFTS5Backend'
+                if connection.vendor == 'sqlite'
+                else 'destination.search.DatabaseSearchBackend'
+            )
+        _backend = import_string(path)()
+    return _backend
+
+
+def index_destinations(destination_ids):
+    destinations = Destination.objects.filter(pk__in=list(destination_ids)).prefetch_related('categories__activities')
+    get_backend().index(destinations)
+
+
+@transaction.atomic
+def rebuild_index(batch_size=1000):
+    backend = get_backend()
+    backend.clear()
+    queryset = Destination.objects.prefetch_related('categories__activities').order_by('pk')
+    count = 0
+    for destination_batch in _batched(queryset.iterator(chunk_size=batch_size), batch_size):
+        backend.index(destination_batch)
+        count += len(destination_batch)
+    return count
+
+
+def _batched(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def search_destinations(query, limit=20):
+    """Ranked search results with HTML-safe highlighted name and snippet."""
+    hits = get_backend().search(query, limit=limit)
+    destinations = Destination.objects.select_related('partner').in_bulk([hit.destination_id for hit in hits])
+    return [
+        SearchResult(destinations[hit.destination_id], hit.rank, hit.name, hit.snippet)
+        for hit in hits
+        if hit.destination_id in destinations
+    ]
+
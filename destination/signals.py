@@ -0,0 +1,305 @@
+from django.apps import apps
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models.signals import m2m_changed, post_delete, post_migrate, post_save, pre_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import analytics, caching, geo, search, tasks
+from .auth import invalidate_user
+from .images import IMAGE_FIELDS, needs_variants, variants_field
+from .models import (
+    Activity, Booking, Category, Destination, DestinationAvailability, DestinationImage, PartnerProfile, Profile,
+    Review, User, Wallet,
+)
+
+
+@receiver(post_save, sender=Review)
+def update_rating_on_review_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+
+    current = (instance.destination_id, instance.created_at, instance.rating)
+    if created:
+        Destination.apply_rating_change(instance.destination_id, added=instance.rating)
+        analytics.record_review(None, current)
+    else:
+        old_rating = getattr(instance, '_loaded_rating', None)
+        old_destination_id = getattr(instance, '_loaded_destination_id', None)
+        if old_destination_id is None or old_rating is None:
+            # Instance was not loaded from the database; nothing to compare with.
+            return
+        if old_destination_id != instance.destination_id:
+            Destination.apply_rating_change(old_destination_id, removed=old_rating)
+            Destination.apply_rating_change(instance.destination_id, added=instance.rating)
+        elif old_rating != instance.rating:
+            Destination.apply_rating_change(
+                instance.destination_id, added=instance.rating, removed=old_rating
+            )
+        if old_destination_id != instance.destination_id or old_rating != instance.rating:
+            analytics.record_review((old_destination_id, instance.created_at, old_rating), current)
+
+    instance._loaded_rating = instance.rating
+    instance._loaded_destination_id = instance.destination_id
+
+
+@receiver(post_delete, sender=Review)
+def update_rating_on_review_delete(sender, instance, origin=None, **kwargs):
+    rating = getattr(instance, '_loaded_rating', instance.rating)
+    destination_id = getattr(instance, '_loaded_destination_id', instance.destination_id)
+    Destination.apply_rating_change(destination_id, removed=rating)
+    analytics.record_review(
+        (destination_id, instance.created_at, rating), None, create=not _cascaded(origin, Review),
+    )
+
+
+def _cascaded(origin, model):
+    """Whether a deletion of `model` rows was started by deleting something else."""
+    return not isinstance(origin, model) and getattr(origin, 'model', None) is not model
+
+
+# Search index
+
+# Up to this many destinations are reindexed in the writer's transaction, so
+# they are searchable as soon as it commits, worker or not. Larger fan-outs
+# (renaming a busy category) go through the job queue.
+INLINE_INDEX_LIMIT = 100
+
+
+def _reindex(destination_ids):
+    destination_ids = list(destination_ids)
+    if len(destination_ids) > INLINE_INDEX_LIMIT:
+        tasks.index_destinations.delay(destination_ids)
+    elif destination_ids:
+        search.index_destinations(destination_ids)
+
+
+@receiver(post_save, sender=Destination)
+def index_destination_on_save(sender, instance, raw=False, **kwargs):
+    if not raw:
+        _reindex([instance.pk])
+
+
+@receiver(post_delete, sender=Destination)
+def remove_destination_from_index(sender, instance, **kwargs):
+    search.get_backend().remove([instance.pk])
+
+
+@receiver(m2m_changed, sender=Destination.categories.through)
+def index_destination_on_categories_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            _reindex([instance.pk])
+    elif action in ('post_add', 'post_remove'):
+        _reindex(pk_set)
+    elif action == 'pre_clear':
+        # category.destinations.clear(): collect the rows before they go.
+        instance._unindexed_destination_ids = list(instance.destinations.values_list('pk', flat=True))
+    elif action == 'post_clear':
+        _reindex(instance.__dict__.pop('_unindexed_destination_ids', []))
+
+
+@receiver(post_save, sender=Category)
+def index_destinations_on_category_save(sender, instance, created, raw=False, **kwargs):
+    if not raw and not created:
+        _reindex(instance.destinations.values_list('pk', flat=True))
+
+
+@receiver(pre_delete, sender=Category)
+def collect_destinations_on_category_delete(sender, instance, **kwargs):
+    # Collected before the delete removes the m2m rows, indexed after.
+    instance._unindexed_destination_ids = list(instance.destinations.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Category)
+def index_destinations_on_category_delete(sender, instance, **kwargs):
+    _reindex(instance.__dict__.pop('_unindexed_destination_ids', []))
+
+
+@receiver(post_save, sender=Activity)
+@receiver(post_delete, sender=Activity)
+def index_destinations_on_activity_change(sender, instance, raw=False, **kwargs):
+    if not raw:
+        _reindex(Destination.objects.filter(categories__id=instance.category_id).values_list('pk', flat=True))
+
+
+# Spatial index
+
+@receiver(post_migrate)
+def repair_geo_index(sender, using=DEFAULT_DB_ALIAS, **kwargs):
+    # Triggers keep the R-tree in sync; SQLite drops them whenever a
+    # migration rebuilds the destination table.
+    if sender.name == 'destination' and using == DEFAULT_DB_ALIAS:
+        geo.get_backend().install()
+
+
+# Availability calendar
+
+@receiver(post_delete, sender=Booking)
+def release_capacity_on_booking_delete(sender, instance, **kwargs):
+    values = getattr(instance, '_loaded_calendar', None) or {
+        field: getattr(instance, field) for field in Booking.CALENDAR_FIELDS
+    }
+    if values['status'] != 'canceled':
+        DestinationAvailability.release(
+            values['destination_id'], values['start_date'], values['end_date'], values['guests']
+        )
+
+
+# Analytics rollups (Booking.save() records changes itself)
+
+@receiver(post_delete, sender=Booking)
+def remove_booking_from_rollups(sender, instance, origin=None, **kwargs):
+    analytics.record_booking(
+        getattr(instance, '_loaded_rollup', None)
+        or {field: getattr(instance, field) for field in Booking.ROLLUP_FIELDS},
+        None,
+        create=not _cascaded(origin, Booking),
+    )
+
+
+@receiver(post_save, sender=Destination)
+def sync_calendar_capacity(sender, instance, created, raw=False, **kwargs):
+    # Only upcoming days follow a capacity change; past days keep theirs.
+    if not raw and not created:
+        DestinationAvailability.objects.filter(
+            destination=instance, date__gte=timezone.localdate(),
+        ).exclude(capacity=instance.daily_capacity).update(capacity=instance.daily_capacity)
+
+
+# Page and fragment cache invalidation
+
+def _invalidate_destinations(destination_ids):
+    destination_ids = list(destination_ids)
+    transaction.on_commit(lambda: (
+        caching.invalidate_destination_cards(destination_ids),
+        caching.bump_generation('destinations'),
+    ))
+
+
+@receiver(post_save, sender=Destination)
+@receiver(post_delete, sender=Destination)
+def invalidate_destination_cache(sender, instance, raw=False, **kwargs):
+    if not raw:
+        _invalidate_destinations([instance.pk])
+
+
+@receiver(post_save, sender=DestinationImage)
+@receiver(post_delete, sender=DestinationImage)
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def invalidate_destination_cache_for_child(sender, instance, raw=False, **kwargs):
+    if not raw:
+        _invalidate_destinations([instance.destination_id])
+
+
+@receiver(m2m_changed, sender=Destination.categories.through)
+def invalidate_destination_cache_on_categories_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if reverse:
+        # Cards vary on the category generation, so bumping it covers them.
+        transaction.on_commit(lambda: caching.bump_generation('categories', 'destinations'))
+    else:
+        _invalidate_destinations([instance.pk])
+
+
+@receiver(post_save, sender=User)
+def refresh_rows_showing_username(sender, instance, created, raw=False, **kwargs):
+    # Destination cards and API rows show the partner's name, reviews their author's.
+    loaded = getattr(instance, '_loaded_username', None)
+    if not raw and not created and loaded is not None and loaded != instance.username:
+        destination_ids = list(instance.destinations.values_list('pk', flat=True))
+        Destination.touch(destination_ids)
+        _invalidate_destinations(destination_ids)
+        Review.objects.filter(user=instance).update(updated_at=timezone.now())
+    instance._loaded_username = instance.username
+
+
+@receiver(post_save, sender=Activity)
+@receiver(post_delete, sender=Activity)
+def invalidate_destination_cache_on_activity_change(sender, instance, raw=False, **kwargs):
+    if not raw:
+        _invalidate_destinations(
+            Destination.objects.filter(categories__id=instance.category_id).values_list('pk', flat=True)
+        )
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_category_cache(sender, instance, raw=False, **kwargs):
+    if not raw:
+        transaction.on_commit(lambda: caching.bump_generation('categories', 'destinations'))
+
+
+# Keep Destination.updated_at (API ETag/Last-Modified) in step with related data
+
+@receiver(post_save, sender=DestinationImage)
+@receiver(post_delete, sender=DestinationImage)
+def touch_destination_on_image_change(sender, instance, raw=False, **kwargs):
+    if not raw:
+        Destination.touch([instance.destination_id])
+
+
+@receiver(m2m_changed, sender=Destination.categories.through)
+def touch_destination_on_categories_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            Destination.touch([instance.pk])
+    elif action in ('post_add', 'post_remove'):
+        Destination.touch(pk_set)
+    elif action == 'pre_clear':
+        Destination.touch(instance.destinations.values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=Destination)
+def touch_bookings_on_destination_rename(sender, instance, created, raw=False, **kwargs):
+    # API bookings show the destination's name; their ETags must change with it.
+    loaded = getattr(instance, '_loaded_name', None)
+    if not raw and not created and loaded is not None and loaded != instance.name:
+        Booking.objects.filter(destination=instance).update(updated_at=timezone.now())
+    instance._loaded_name = instance.name
+
+
+@receiver(post_save, sender=Category)
+@receiver(pre_delete, sender=Category)
+def touch_destinations_on_category_change(sender, instance, raw=False, **kwargs):
+    if not raw and instance.pk:
+        Destination.touch(instance.destinations.values_list('pk', flat=True))
+
+
+# Responsive image variants
+
+def _queue_image_variants(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    for field_name in _image_fields[sender]:
+        if needs_variants(getattr(instance, field_name), getattr(instance, variants_field(field_name))):
+            tasks.queue_image_variants(sender._meta.label, instance.pk, field_name)
+
+
+_image_fields = {}
+for _label, _field_name in IMAGE_FIELDS:
+    _model = apps.get_model(_label)
+    _image_fields.setdefault(_model, []).append(_field_name)
+    post_save.connect(_queue_image_variants, sender=_model, dispatch_uid=f'image_variants:{_label}')
+
+
+# Cached request.user (destination/auth.py)
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_user(sender, instance, raw=False, **kwargs):
+    if not raw:
+        invalidate_user(instance.pk)
+
+
+@receiver(post_save, sender=Profile)
+@receiver(post_delete, sender=Profile)
+@receiver(post_save, sender=Wallet)
+@receiver(post_delete, sender=Wallet)
+@receiver(post_save, sender=PartnerProfile)
+@receiver(post_delete, sender=PartnerProfile)
+def invalidate_cached_user_for_related(sender, instance, raw=False, **kwargs):
+    if not raw:
+        invalidate_user(instance.user_id)
+
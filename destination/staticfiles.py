@@ -0,0 +1,322 @@
+"""
+Static assets for production.
+
+`manage.py collectstatic` with PipelineStorage (settings.STORAGES):
+
+1. concatenates the STATIC_BUNDLES members into one file per bundle;
+2. minifies every CSS and JS file it collects;
+3. gives each file a content-hashed name, 'css/site.3f1c0e2a9b4d.css', and
+   records it in the staticfiles.json manifest, as ManifestStaticFilesStorage
+   does;
+4. writes gzip (and, with the `brotli` package installed, brotli) copies next
+   to every text file that compresses well: 'css/site.3f1c0e2a9b4d.css.gz'.
+
+StaticFilesMiddleware serves STATIC_ROOT from the app server. It picks the
+precompressed copy the client accepts, answers conditional and single-range
+requests, and marks hashed names immutable for a year. A hashed URL changes
+whenever its content does, so a browser never revalidates it, and a repeat
+page load fetches no static bytes at all. Templates link bundles with
+`{% bundle %}` (templatetags/assets.py).
+"""
+import gzip
+import mimetypes
+import os
+import posixpath
+import re
+from urllib.parse import unquote, urlsplit
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage, staticfiles_storage
+from django.core.exceptions import MiddlewareNotUsed, SuspiciousFileOperation
+from django.core.files.base import ContentFile
+from django.http import FileResponse, HttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE = ('.css', '.js', '.json', '.map', '.svg', '.txt', '.xml', '.html')
+# A compressed copy is only kept when it saves at least this fraction.
+MIN_SAVING = 0.05
+# Content-Encoding and file suffix, in order of preference.
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+# 'site.3f1c0e2a9b4d.css', as named by ManifestStaticFilesStorage.
+HASHED_NAME = re.compile(r'\.[0-9a-f]{12}\.[^./]+$')
+IMMUTABLE = 'public, max-age=31536000, immutable'
+# Unhashed names change content on the next deploy.
+REVALIDATE = 'public, max-age=60, must-revalidate'
+# Larger files are streamed; smaller ones are read whole, which async servers
+# can send without iterating a file in a thread.
+MAX_BUFFERED_SIZE = 1024 * 1024
+RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def bundles():
+    """settings.STATIC_BUNDLES: bundle name -> the files concatenated into it, in order."""
+    return getattr(settings, 'STATIC_BUNDLES', {})
+
+
+# Minification. Both minifiers are conservative: they only drop what cannot
+# change the meaning of the file.
+
+_CSS_TOKENS = re.compile(r'''("(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*')|/\*.*?\*/|\s+''', re.S)
+# Whitespace next to these characters is insignificant in CSS.
+_CSS_TIGHT = frozenset('{};,>')
+
+
+def minify_css(text):
+    """Drop comments and collapse whitespace, leaving strings alone."""
+    def replace(match):
+        if match.group(1):
+            return match.group(1)
+        if match.group().startswith('/*'):
+            return ''
+        before, after = text[match.start() - 1:match.start()], text[match.end():match.end() + 1]
+        if not before or not after or before in _CSS_TIGHT or after in _CSS_TIGHT or before == ':':
+            return ''
+        return ' '
+
+    return _CSS_TOKENS.sub(replace, text).replace(';}', '}').strip()
+
+
+def minify_js(text):
+    """
+    Strip indentation, blank lines and whole-line // comments. Line breaks
+    are kept, so automatic semicolon insertion is unaffected, and lines
+    inside a multi-line template literal are left as they are.
+    """
+    lines = []
+    in_template = False
+    for line in text.splitlines():
+        if in_template:
+            lines.append(line)
+        else:
+            stripped = line.strip()
+            if stripped and not stripped.startswith('//'):
+                lines.append(stripped)
+        if len(re.findall(r'(?<!\\)`', line)) % 2:
+            in_template = not in_template
+    return '\n'.join(lines) + '\n'
+
+
+MINIFIERS = {'.css': minify_css, '.js': minify_js}
+
+
+def compress(content):
+    """{suffix: compressed bytes} for the encodings that make `content` meaningfully smaller."""
+    variants = {'.gz': gzip.compress(content, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants['.br'] = brotli.compress(content, quality=11)
+    limit = len(content) * (1 - MIN_SAVING)
+    return {suffix: data for suffix, data in variants.items() if len(data) < limit}
+
+
+class PipelineStorage(ManifestStaticFilesStorage):
+    """ManifestStaticFilesStorage that also bundles, minifies and precompresses (see the module docstring)."""
+
+    # Before collectstatic has run (a fresh checkout, the test suite) {% static %}
+    # links the unhashed name instead of failing.
+    manifest_strict = False
+
+    def stored_name(self, name):
+        try:
+            return super().stored_name(name)
+        except ValueError:
+            return name
+
+    def post_process(self, paths, dry_run=False, **options):
+        if dry_run:
+            yield from super().post_process(paths, dry_run, **options)
+            return
+        for name, members in bundles().items():
+            contents = []
+            for member in members:
+                storage, path = paths[member]
+                with storage.open(path) as source:
+                    contents.append(source.read().decode())
+            self._replace(name, '\n'.join(contents))
+            paths[name] = (self, name)
+        for name, (storage, path) in list(paths.items()):
+            minify = MINIFIERS.get(posixpath.splitext(name)[1])
+            if minify is not None:
+                with storage.open(path) as source:
+                    self._replace(name, minify(source.read().decode()))
+                paths[name] = (self, name)
+
+        names = set(paths)
+        for name, hashed_name, processed in super().post_process(paths, dry_run, **options):
+            if hashed_name and not isinstance(processed, Exception):
+                names.add(hashed_name)
+            yield name, hashed_name, processed
+        for name in sorted(names):
+            if name.endswith(COMPRESSIBLE):
+                with self.open(name) as source:
+                    variants = compress(source.read())
+                for suffix, data in variants.items():
+                    self._replace(name + suffix, data)
+
+    def _replace(self, name, content):
+        if self.exists(name):
+            self.delete(name)
+        self._save(name, ContentFile(content.encode() if isinstance(content, str) else content))
+
+
+def _accepts(header, encoding):
+    for part in header.split(','):
+        token, _, params = part.partition(';')
+        if token.strip().lower() in (encoding, '*'):
+            quality = params.strip().lower()
+            return quality not in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000')
+    return False
+
+
+def _byte_range(header, size):
+    """
+    (start, end) inclusive for a single satisfiable range, None to ignore
+    the header (it is malformed or asks for several ranges), or () when
+    the range cannot be satisfied.
+    """
+    match = RANGE.match(header.replace(' ', ''))
+    if match is None:
+        return None
+    first, last = match.groups()
+    if not first:
+        if not last:
+            return None
+        # The last N bytes.
+        length = int(last)
+        return (max(size - length, 0), size - 1) if length and size else ()
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if last and int(last) < start:
+        return None
+    return (start, end) if start < size else ()
+
+
+class StaticFilesMiddleware:
+    """
+    Serves files under STATIC_URL from STATIC_ROOT before any other
+    middleware touches the request; anything else passes through.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.STATIC_ROOT:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.prefix = '/' + urlsplit(settings.STATIC_URL).path.lstrip('/')
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        response = self.serve(request)
+        return self.get_response(request) if response is None else response
+
+    async def __acall__(self, request):
+        response = self.serve(request)
+        return await self.get_response(request) if response is None else response
+
+    def serve(self, request):
+        """The response for a static file, or None when the request is not for one."""
+        if request.method not in ('GET', 'HEAD') or not request.path_info.startswith(self.prefix):
+            return None
+        name = unquote(request.path_info[len(self.prefix):])
+        try:
+            path = safe_join(settings.STATIC_ROOT, name)
+        except SuspiciousFileOperation:
+            return None
+        try:
+            stat = os.stat(path)
+        except (OSError, ValueError):
+            return None
+        if not os.path.isfile(path):
+            return None
+
+        content_type, _ = mimetypes.guess_type(name)
+        content_type = content_type or 'application/octet-stream'
+        if content_type.startswith('text/') or content_type in ('application/javascript', 'application/json'):
+            content_type += '; charset=utf-8'
+        headers = {
+            'Cache-Control': IMMUTABLE if HASHED_NAME.search(name) else REVALIDATE,
+            'Accept-Ranges': 'bytes',
+            'Last-Modified': http_date(stat.st_mtime),
+        }
+        if name.endswith(COMPRESSIBLE):
+            headers['Vary'] = 'Accept-Encoding'
+
+        # Ranges refer to the identity encoding, so only whole responses are compressed.
+        encoding = None
+        range_header = request.META.get('HTTP_RANGE')
+        if not range_header:
+            accept_encoding = request.META.get('HTTP_ACCEPT_ENCODING', '')
+            for candidate, suffix in ENCODINGS:
+                if _accepts(accept_encoding, candidate):
+                    try:
+                        stat, path, encoding = os.stat(path + suffix), path + suffix, candidate
+                    except OSError:
+                        continue
+                    break
+        etag = f'"{int(stat.st_mtime):x}-{stat.st_size:x}{"-" + encoding if encoding else ""}"'
+        headers['ETag'] = etag
+
+        response = get_conditional_response(request, etag=etag, last_modified=int(stat.st_mtime))
+        if response is not None:
+            for header, value in headers.items():
+                response[header] = value
+            return response
+
+        size = stat.st_size
+        byte_range = None
+        if range_header and self._if_range(request, etag, stat.st_mtime):
+            byte_range = _byte_range(range_header, size)
+        if byte_range == ():
+            response = HttpResponse(status=416, headers=headers)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+
+        head = request.method == 'HEAD'
+        if byte_range:
+            start, end = byte_range
+            with open(path, 'rb') as file:
+                file.seek(start)
+                content = b'' if head else file.read(end - start + 1)
+            response = HttpResponse(content, status=206, content_type=content_type, headers=headers)
+            response['Content-Range'] = f'bytes {start}-{end}/{size}'
+            response['Content-Length'] = end - start + 1
+            return response
+
+        if head:
+            response = HttpResponse(content_type=content_type, headers=headers)
+        elif size > MAX_BUFFERED_SIZE:
+            response = FileResponse(open(path, 'rb'), content_type=content_type, headers=headers)
+        else:
+            with open(path, 'rb') as file:
+                response = HttpResponse(file.read(), content_type=content_type, headers=headers)
+        if encoding:
+            response['Content-Encoding'] = encoding
+        response['Content-Length'] = size
+        return response
+
+    @staticmethod
+    def _if_range(request, etag, mtime):
+        """Whether a Range header applies: always, unless an If-Range names another version."""
+        validator = request.META.get('HTTP_IF_RANGE')
+        if not validator:
+            return True
+        if validator.startswith(('"', 'W/')):
+            return validator == etag
+        return parse_http_date_safe(validator) == int(mtime)
+
+
+def bundle_collected(name):
+    """Whether collectstatic has built bundle `name`, so pages can link it instead of its members."""
+    return not settings.DEBUG and name in getattr(staticfiles_storage, 'hashed_files', {})
@@ -0,0 +1,217 @@
+from django.apps import apps
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+
+from . import analytics, caching, notifications, search
+from .images import delete_variants, generate_variants, needs_variants, variants_field
+from .models import Booking, Destination, DestinationAvailability, DestinationImage, Notification, Review
+from .notifications import write_notifications
+from .queue import task
+
+
+@task
+def deliver_notifications(rows):
+    """Write a list of [user_id, message] pairs as Notification rows."""
+    write_notifications(rows)
+
+
+@task
+def index_destinations(destination_ids):
+    search.index_destinations(destination_ids)
+
+
+@task
+def remove_destinations_from_index(destination_ids):
+    search.get_backend().remove(destination_ids)
+
+
+@task(max_attempts=3)
+def rebuild_search_index(batch_size=1000):
+    return search.rebuild_index(batch_size=batch_size)
+
+
+@task(max_attempts=3)
+def rebuild_rating_aggregates(batch_size=1000):
+    """
+    Recompute the stored rating aggregates of every destination. Only the
+    destinations whose aggregates were wrong are written, and their cached
+    cards dropped. Returns the number updated.
+    """
+    fields = ['rating_avg', 'rating_count', 'rating_sum'] + [
+        f'rating_{star}_count' for star in range(1, 6)
+    ]
+    now = timezone.now()
+
+    # One grouped aggregate over the whole review table.
+    rows = Review.objects.values('destination_id').annotate(
+        count=Count('id'),
+        total=Sum('rating'),
+        **{f'star_{star}': Count('id', filter=Q(rating=star)) for star in range(1, 6)},
+    ).order_by()
+    aggregates = {row['destination_id']: row for row in rows}
+
+    changed = []
+    batch = []
+    with transaction.atomic():
+        for destination in Destination.objects.only('id', *fields).iterator(chunk_size=batch_size):
+            row = aggregates.get(destination.pk)
+            count = row['count'] if row else 0
+            total = row['total'] if row else 0
+            values = {
+                'rating_count': count,
+                'rating_sum': total,
+                'rating_avg': total / count if count else 0,
+                **{f'rating_{star}_count': row[f'star_{star}'] if row else 0 for star in range(1, 6)},
+            }
+            if all(getattr(destination, field) == value for field, value in values.items()):
+                continue
+            for field, value in values.items():
+                setattr(destination, field, value)
+            # bulk_update() skips auto_now; the API validators need the bump.
+            destination.updated_at = now
+            batch.append(destination)
+            if len(batch) >= batch_size:
+                Destination.objects.bulk_update(batch, fields + ['updated_at'])
+                changed.extend(destination.pk for destination in batch)
+                batch = []
+        if batch:
+            Destination.objects.bulk_update(batch, fields + ['updated_at'])
+            changed.extend(destination.pk for destination in batch)
+        if changed:
+            # bulk_update() sends no signals, so the cards are dropped here.
+            transaction.on_commit(lambda: (
+                caching.invalidate_destination_cards(changed),
+                caching.bump_generation('destinations'),
+            ))
+    return len(changed)
+
+
+@task(max_attempts=3)
+def refresh_recommendations(top_k=10, chunk_size=512, workers=None):
+    """Recompute AIRecommendation rows for every customer. Returns the number written."""
+    from .recommendations import RecommendationEngine
+
+    return RecommendationEngine(top_k=top_k, chunk_size=chunk_size, workers=workers).run()
+
+
+def queue_image_variants(model_label, pk, field_name, force=False):
+    """Queue generate_image_variants, once per image while a job for it is still waiting."""
+    return generate_image_variants.apply_async(
+        (model_label, pk, field_name, force), idempotency_key=f'image-variants:{model_label}:{pk}:{field_name}',
+    )
+
+
+@task(max_attempts=3)
+def generate_image_variants(model_label, pk, field_name, force=False):
+    """
+    Write the responsive variants of one image field. Does nothing when the
+    variants are already current, so duplicate jobs are harmless.
+    """
+    model = apps.get_model(model_label)
+    field = variants_field(field_name)
+    instance = model.objects.filter(pk=pk).only('pk', field_name, field).first()
+    if instance is None:
+        return
+    field_file = getattr(instance, field_name)
+    old_variants = getattr(instance, field)
+    if not field_file or not (force or needs_variants(field_file, old_variants)):
+        return
+
+    variants = generate_variants(field_file)
+    # Only store them if the image was not replaced while we worked.
+    updated = model.objects.filter(pk=pk, **{field_name: field_file.name}).update(**{field: variants})
+    if not updated:
+        if variants['formats'] != (old_variants or {}).get('formats'):
+            delete_variants(field_file.storage, variants)
+        return
+    if old_variants and old_variants.get('source') != field_file.name:
+        delete_variants(field_file.storage, old_variants)
+
+    if model is DestinationImage:
+        destination_id = model.objects.values_list('destination_id', flat=True).get(pk=pk)
+        Destination.touch([destination_id])
+        caching.invalidate_destination_cards([destination_id])
+        caching.bump_generation('destinations')
+
+
+@task(max_attempts=3)
+def purge_notifications(days=None, batch_size=1000):
+    """Delete old read notifications. Returns the number deleted."""
+    from .inbox import RETENTION_DAYS, purge_read
+
+    return purge_read(days=RETENTION_DAYS if days is None else days, batch_size=batch_size)
+
+
+@task(max_attempts=3)
+def compact_rollups(retention_days=None, reconcile_days=None, batch_size=1000):
+    """Reconcile recent analytics rollups and fold old daily rows into months. Returns (days, rows folded)."""
+    from . import analytics
+
+    return analytics.compact(
+        retention_days=analytics.DAILY_RETENTION_DAYS if retention_days is None else retention_days,
+        reconcile_days=analytics.RECONCILE_DAYS if reconcile_days is None else reconcile_days,
+        batch_size=batch_size,
+    )
+
+
+# Admin bulk actions: the values they set and the bookings they apply to.
+BOOKING_ACTIONS = {
+    'confirm': ({'status': 'confirmed'}, Q(status='pending')),
+    'cancel': ({'status': 'canceled'}, ~Q(status='canceled')),
+    'pay': ({'payment_status': 'paid'}, ~Q(payment_status='paid')),
+}
+
+
+@task(max_attempts=3)
+def update_bookings(booking_ids, action, batch_size=500):
+    """
+    Apply an admin bulk action ('confirm', 'cancel' or 'pay') to bookings,
+    batch_size at a time. Each chunk is one UPDATE whose side effects (the
+    calendar places released, the rollups, the payment notifications,
+    coalesced per user) are applied together. Returns the number changed.
+    """
+    values, applies = BOOKING_ACTIONS[action]
+    changed = 0
+    for offset in range(0, len(booking_ids), batch_size):
+        chunk = booking_ids[offset:offset + batch_size]
+        with transaction.atomic(), notifications.batch():
+            bookings = list(
+                Booking.objects.filter(applies, pk__in=chunk).select_related('destination')
+                .select_for_update(of=('self',))
+            )
+            if not bookings:
+                continue
+            Booking.objects.filter(pk__in=[booking.pk for booking in bookings]).update(
+                **values, updated_at=timezone.now(),
+            )
+            changes = []
+            for booking in bookings:
+                previous = {field: getattr(booking, field) for field in Booking.ROLLUP_FIELDS}
+                if action == 'cancel':
+                    DestinationAvailability.release(
+                        booking.destination_id, booking.start_date, booking.end_date, booking.guests,
+                    )
+                for field, value in values.items():
+                    setattr(booking, field, value)
+                changes.append((previous, {field: getattr(booking, field) for field in Booking.ROLLUP_FIELDS}))
+                if action == 'pay':
+                    booking.create_payment_notification()
+            analytics.record_bookings(changes)
+            changed += len(bookings)
+    return changed
+
+
+@task(max_attempts=3)
+def mark_notifications_read(notification_ids, batch_size=1000):
+    """Mark notifications read, batch_size at a time, recounting each chunk's inboxes once. Returns the number changed."""
+    from .inbox import recount
+
+    changed = 0
+    for offset in range(0, len(notification_ids), batch_size):
+        unread = Notification.objects.filter(pk__in=notification_ids[offset:offset + batch_size], is_read=False)
+        with transaction.atomic():
+            user_ids = set(unread.values_list('user_id', flat=True))
+            changed += unread.update(is_read=True)
+            recount(user_ids)
+    return changed
@@ -0,0 +1,24 @@
+from django import template
+from django.templatetags.static import static
+from django.utils.html import format_html_join
+
+from ..staticfiles import bundle_collected, bundles
+
+register = template.Library()
+
+TAGS = {
+    '.css': '<link rel="stylesheet" href="{}">',
+    '.js': '<script src="{}"></script>',
+}
+
+
+@register.simple_tag
+def bundle(name):
+    """
+    `{% bundle 'css/site.css' %}` links the bundle built by collectstatic,
+    or each of its STATIC_BUNDLES members in turn when it has not been
+    built (DEBUG, or before the first collectstatic).
+    """
+    names = [name] if bundle_collected(name) else bundles()[name]
+    tag = TAGS[name[name.rindex('.'):]]
+    return format_html_join('\n    ', tag, ((static(member),) for member in names))
@@ -0,0 +1,33 @@
+from decimal import InvalidOperation
+
+from django import template
+from django.utils import translation
+
+from ..money import format_money, money_locale
+
+register = template.Library()
+
+
+@register.filter
+def money(amount, currency=None):
+    """
+    `{{ destination.price|money }}` in settings.MONEY_CURRENCY, or
+    `{{ wallet.balance|money:"BIF" }}`, formatted for the active language.
+    Empty values render as nothing, and values that are not amounts
+    render unchanged.
+    """
+    if amount is None or amount == '':
+        return ''
+    try:
+        return format_money(amount, currency)
+    except (InvalidOperation, KeyError, TypeError, ValueError):
+        return amount
+
+
+@register.simple_tag(name='money_locale')
+def current_money_locale():
+    """
+    `{% money_locale as locale %}`: the money locale of the active language,
+    for cache keys of fragments that format amounts.
+    """
+    return money_locale(translation.get_language())
@@ -0,0 +1,13 @@
+from django import template
+
+register = template.Library()
+
+
+@register.inclusion_tag('partials/picture.html')
+def picture(image, alt='', sizes='100vw', css_class=''):
+    """
+    Render a ResponsiveImage (e.g. `destination_image.responsive`) as a lazy
+    <picture> with one <source> per generated format and the placeholder as
+    background until the image arrives.
+    """
+    return {'image': image, 'alt': alt, 'sizes': sizes, 'css_class': css_class}
@@ -1,7 +1,8 @@
 from django.conf import settings
 from django.conf.urls.static import static
-from django.urls import path
+from django.urls import include, path
 from . import views
+from .profiling import metrics_view
 
 urlpatterns = [
      path('', views.home, name='home'),
@@ -9,14 +10,22 @@ urlpatterns = [
     path('signup/', views.register, name='register'),
     path('logout/', views.user_logout, name='logout'),
     path('destinations/', views.destinations_view, name='destinations'),
+    path('search/', views.search_view, name='search'),
+    path('availability/', views.availability_view, name='availability'),
+    path('destinations/<int:pk>/availability/', views.destination_availability_view, name='destination_availability'),
     path('about/', views.about_view, name='about'),
     path('contact/', views.contact_view, name='contact'),
     path('profile/', views.profile_view, name='profile'),
     path('notifications/', views.notifications_view, name='notifications'),
+    path('notifications/read/', views.notifications_mark_read, name='notifications_mark_read'),
+    path('notifications/poll/', views.notifications_poll, name='notifications_poll'),
+    path('notifications/stream/', views.notification_stream, name='notification_stream'),
     path('bookings/', views.bookings_view, name='bookings'),
+    path('dashboard/', views.partner_dashboard, name='partner_dashboard'),
+    path('api/v1/', include('destination.api.urls')),
+    path('metrics/', metrics_view, name='metrics'),
 ]
 
-# Serve static and media files in development
-
-urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
+# Serve media files in development. Static files are served by
+# destination.staticfiles.StaticFilesMiddleware.
 urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
@@ -1,12 +1,47 @@
-from django.shortcuts import render, redirect
+import json
+import time
+
+from asgiref.sync import sync_to_async
+from django.shortcuts import get_object_or_404, render, redirect
 from django.contrib.auth import login, logout
 from django.contrib.auth import login, logout, authenticate
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
-from .models import Destination, Notification, Profile, Wallet
+from django.db import transaction
+from django.http import HttpResponseBadRequest, HttpResponseForbidden, JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_POST
+from .models import Booking, Category, Destination, Notification, Profile, Wallet
+
+from . import analytics, inbox as inbox_service
+from .availability import available_destinations, destination_calendar
+from .caching import aget_generation, cache_anonymous_page
+from .forms import AvailabilityForm, DestinationFilterForm, RegistrationForm
+from .pagination import InvalidCursor, KeysetPaginator
+from .routers import read_from_replica
+from .search import search_destinations
+
+DESTINATIONS_PAGE_SIZE = 20
+NOTIFICATIONS_PAGE_SIZE = 20
+BOOKINGS_PAGE_SIZE = 20
 
-from .forms import RegistrationForm
+# Notification stream (server-sent events) and long-poll
+STREAM_POLL_INTERVAL = 1      # seconds between checks of the user's notification generation
+STREAM_RECHECK_INTERVAL = 30  # query the database at least this often, whatever the cache says
+STREAM_HEARTBEAT = 15         # keep-alive comment so proxies do not drop idle streams
+STREAM_MAX_DURATION = 300     # close after this long; EventSource reconnects with Last-Event-ID
+STREAM_RETRY_MS = 3000
+STREAM_BATCH_SIZE = 100
+LONG_POLL_TIMEOUT = 25
+
+
+async def _arender(request, template_name, context):
+    """
+    render() for async views. Templates and context processors may still
+    read the session or lazy relations, which must happen off the event loop.
+    """
+    return await sync_to_async(render)(request, template_name, context)
 
+@cache_anonymous_page()
 def home(request):
     return render(request, 'index.html')
 
@@ -15,18 +50,14 @@ def register(request):
     if request.method == 'POST':
         form = RegistrationForm(request.POST)
         if form.is_valid():
-            # Save the user
-            user = form.save(commit=False)
-            user.set_password(form.cleaned_data['password'])  # Hash the password
-            user.save()
-
-            # Create a profile for the user
-            profile = Profile.objects.create(user=user)
-            profile.save() 
-
-            # Create a wallet for the user
-            wallet = Wallet.objects.create(user=user)
-            wallet.save() 
+            # The user, profile and wallet are created together: the
+            # profile and wallet pages rely on both rows existing.
+            with transaction.atomic():
+                user = form.save(commit=False)
+                user.set_password(form.cleaned_data['password'])  # Hash the password
+                user.save()
+                Profile.objects.create(user=user)
+                Wallet.objects.create(user=user)
 
             # Log the user in
             login(request, user)
@@ -64,13 +95,103 @@ def user_logout(request):
     messages.success(request, "You have been logged out.")
     return redirect('home')
 
-def destinations_view(request):
-    destinations = Destination.objects.all()
-    return render(request, 'destinations.html', {'destinations': destinations})
+@cache_anonymous_page('destinations', 'categories')
+@read_from_replica
+async def destinations_view(request):
+    """
+    Destination listing: keyset-paginated on (created_at, id), with the
+    images, categories and partner of the page loaded in three extra queries.
+    """
+    form = DestinationFilterForm(request.GET)
+    if not form.is_valid():
+        return HttpResponseBadRequest("Invalid filter parameters.")
+
+    destinations = form.filter(Destination.objects.all())
+    destinations = destinations.select_related('partner').prefetch_related('images', 'categories')
+    paginator = KeysetPaginator(
+        destinations,
+        page_size=form.cleaned_data.get('page_size') or DESTINATIONS_PAGE_SIZE,
+    )
+    try:
+        page = await paginator.aget_page(form.cleaned_data.get('cursor'))
+    except InvalidCursor:
+        return HttpResponseBadRequest("Invalid pagination cursor.")
+
+    # Keep the active filters on the "next page" link.
+    next_query = request.GET.copy()
+    next_query.pop('cursor', None)
+    if page.has_next:
+        next_query['cursor'] = page.next_cursor
+
+    return await _arender(request, 'destinations.html', {
+        'destinations': page.object_list,
+        'page': page,
+        'next_query': next_query.urlencode(),
+        'filter_form': form,
+        'categories': [category async for category in Category.objects.order_by('name')],
+        'card_generation': await aget_generation('categories'),
+    })
+
+@cache_anonymous_page('destinations')
+async def search_view(request):
+    """
+    Full-text destination search, ranked best match first, with the matching
+    terms highlighted in the name and a description snippet.
+    """
+    query = request.GET.get('q', '').strip()
+    # The search backends use raw cursors, which the async ORM does not cover.
+    results = await sync_to_async(search_destinations)(query, limit=DESTINATIONS_PAGE_SIZE) if query else []
+    return await _arender(request, 'search.html', {'query': query, 'results': results})
+
+def availability_view(request):
+    """
+    JSON list of destinations with at least `slots` free places on every day
+    between `start` and `end`, keyset-paginated like the listing.
+    """
+    form = AvailabilityForm(request.GET)
+    if not form.is_valid():
+        return JsonResponse({'errors': form.errors}, status=400)
+
+    data = form.cleaned_data
+    destinations = available_destinations(data['start'], data['end'], data.get('slots') or 1)
+    paginator = KeysetPaginator(destinations.only('id', 'name', 'location', 'price', 'daily_capacity', 'created_at'))
+    try:
+        page = paginator.get_page(data.get('cursor'))
+    except InvalidCursor:
+        return JsonResponse({'errors': {'cursor': ["Invalid pagination cursor."]}}, status=400)
+
+    return JsonResponse({
+        'results': [
+            {
+                'id': destination.pk,
+                'name': destination.name,
+                'location': destination.location,
+                'price': str(destination.price),
+                'daily_capacity': destination.daily_capacity,
+            }
+            for destination in page
+        ],
+        'next_cursor': page.next_cursor,
+    })
+
+def destination_availability_view(request, pk):
+    """JSON calendar of free places per day for one destination."""
+    destination = get_object_or_404(Destination.objects.only('id', 'daily_capacity'), pk=pk)
+    form = AvailabilityForm(request.GET)
+    if not form.is_valid():
+        return JsonResponse({'errors': form.errors}, status=400)
 
+    calendar = destination_calendar(destination, form.cleaned_data['start'], form.cleaned_data['end'])
+    return JsonResponse({
+        'destination': destination.pk,
+        'days': [{'date': day.isoformat(), 'free': free} for day, free in calendar],
+    })
+
+@cache_anonymous_page()
 def about_view(request):
     return render(request, 'dasb.html')
 
+@cache_anonymous_page()
 def contact_view(request):
     return render(request, 'contact.html')
 
@@ -79,13 +200,166 @@ def profile_view(request):
     return render(request, 'auth/profile.html', {'user': request.user})
 
 @login_required
-def notifications_view(request):
-    notifications = Notification.objects.filter(user=request.user).order_by('-created_at')
-    # Mark notifications as read
-    notifications.update(is_read=True)
-    return render(request, 'notifications.html', {'notifications': notifications})
+async def notifications_view(request):
+    """
+    The user's notifications, newest first, keyset-paginated. Opening the
+    first page marks everything up to the newest notification as read by
+    moving the inbox high-water mark; no notification rows are updated.
+    """
+    user = await request.auser()
+    inbox = await sync_to_async(inbox_service.get_inbox)(user.pk)
+    paginator = KeysetPaginator(
+        Notification.objects.filter(user=user).only('pk', 'message', 'created_at', 'is_read'),
+        page_size=NOTIFICATIONS_PAGE_SIZE,
+        field='id',
+    )
+    cursor = request.GET.get('cursor')
+    try:
+        page = await paginator.aget_page(cursor)
+    except InvalidCursor:
+        return HttpResponseBadRequest("Invalid pagination cursor.")
+
+    for notification in page:
+        notification.unread = inbox_service.is_unread(notification, inbox.read_up_to)
+    if not cursor and page.object_list:
+        await inbox_service.amark_read(user.pk, page.object_list[0].pk)
+    return await _arender(request, 'notifications.html', {
+        'notifications': page.object_list,
+        'page': page,
+        'last_id': page.object_list[0].pk if page.object_list and not cursor else inbox.latest_id,
+    })
+
+@login_required
+@require_POST
+async def notifications_mark_read(request):
+    """Mark notifications up to the `up_to` id (default: all) as read. Returns the unread count."""
+    user = await request.auser()
+    up_to = request.POST.get('up_to')
+    if up_to is not None and not up_to.isdigit():
+        return JsonResponse({'errors': {'up_to': ["Must be a notification id."]}}, status=400)
+    unread = await inbox_service.amark_read(user.pk, int(up_to) if up_to is not None else None)
+    return JsonResponse({'unread_count': unread})
+
+def _notification_data(notification):
+    return {
+        'id': notification.pk,
+        'message': notification.message,
+        'created_at': notification.created_at.isoformat(),
+    }
+
+def _last_event_id(request):
+    last_id = request.headers.get('Last-Event-ID') or request.GET.get('after')
+    return int(last_id) if last_id and last_id.isdigit() else None
+
+@login_required
+async def notifications_poll(request):
+    """
+    Long-poll fallback for clients without EventSource. Answers as soon as
+    the user has notifications newer than `after`, or with an empty list
+    after LONG_POLL_TIMEOUT seconds.
+    """
+    user = await request.auser()
+    after = _last_event_id(request)
+    if after is None:
+        after = (await sync_to_async(inbox_service.get_inbox)(user.pk)).latest_id
+    generation = await aget_generation(inbox_service.generation_namespace(user.pk))
+    deadline = time.monotonic() + LONG_POLL_TIMEOUT
+    while True:
+        new = await inbox_service.anew_notifications(user.pk, after, STREAM_BATCH_SIZE)
+        remaining = deadline - time.monotonic()
+        if new or remaining <= 0:
+            break
+        generation = await inbox_service.await_change(
+            user.pk, generation, min(remaining, STREAM_RECHECK_INTERVAL), STREAM_POLL_INTERVAL,
+        )
+    return JsonResponse({
+        'notifications': [_notification_data(notification) for notification in new],
+        'last_id': new[-1].pk if new else after,
+        'unread_count': await inbox_service.aunread_count(user.pk),
+    })
+
+@login_required
+async def notification_stream(request):
+    """
+    Server-sent events with the user's new notifications ("notification"
+    events) and unread count ("unread" events), replacing client polling.
+    Inbox changes bump a per-user cache generation; the stream only queries
+    the database when it changes, or every STREAM_RECHECK_INTERVAL seconds
+    in case the cache is not shared between processes.
+    """
+    user = await request.auser()
+    last_id = _last_event_id(request)
+    if last_id is None:
+        # A fresh connection only streams what arrives from now on.
+        last_id = (await sync_to_async(inbox_service.get_inbox)(user.pk)).latest_id
+
+    async def events():
+        nonlocal last_id
+        yield f'retry: {STREAM_RETRY_MS}\n\n'
+        generation = await aget_generation(inbox_service.generation_namespace(user.pk))
+        unread = None
+        started = last_write = time.monotonic()
+        while time.monotonic() - started < STREAM_MAX_DURATION:
+            while True:
+                new = await inbox_service.anew_notifications(user.pk, last_id, STREAM_BATCH_SIZE)
+                for notification in new:
+                    data = json.dumps(_notification_data(notification))
+                    yield f'id: {notification.pk}\nevent: notification\ndata: {data}\n\n'
+                    last_id = notification.pk
+                    last_write = time.monotonic()
+                if len(new) < STREAM_BATCH_SIZE:
+                    break
+            current = await inbox_service.aunread_count(user.pk)
+            if current != unread:
+                unread = current
+                yield f'event: unread\ndata: {json.dumps({"unread_count": unread})}\n\n'
+                last_write = time.monotonic()
+
+            # Sleep until the inbox changes or it is time to recheck anyway,
+            # sending keep-alive comments in between.
+            recheck_at = min(time.monotonic() + STREAM_RECHECK_INTERVAL, started + STREAM_MAX_DURATION)
+            while True:
+                timeout = recheck_at - time.monotonic()
+                wait = min(timeout, last_write + STREAM_HEARTBEAT - time.monotonic())
+                changed = await inbox_service.await_change(user.pk, generation, max(wait, 0), STREAM_POLL_INTERVAL)
+                if changed != generation or wait >= timeout:
+                    generation = changed
+                    break
+                yield ': keep-alive\n\n'
+                last_write = time.monotonic()
+
+    response = StreamingHttpResponse(events(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Stop nginx and similar proxies from buffering the stream.
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+@login_required
+async def bookings_view(request):
+    """The user's bookings, newest first, keyset-paginated on (booking_date, id)."""
+    user = await request.auser()
+    paginator = KeysetPaginator(
+        Booking.objects.filter(user=user).select_related('destination'),
+        page_size=BOOKINGS_PAGE_SIZE,
+        field='booking_date',
+    )
+    try:
+        page = await paginator.aget_page(request.GET.get('cursor'))
+    except InvalidCursor:
+        return HttpResponseBadRequest("Invalid pagination cursor.")
+    return await _arender(request, 'bookings.html', {'bookings': page.object_list, 'page': page})
+
 
 @login_required
-def bookings_view(request):
-    bookings = request.user.booking_set.all()  # Assuming User has related bookings
-    return render(request, 'bookings.html', {'bookings': bookings})
+async def partner_dashboard(request):
+    user = await request.auser()
+    if not user.is_partner():
+        return HttpResponseForbidden("Only partners have a dashboard.")
+    try:
+        days = int(request.GET.get('days', 30))
+    except ValueError:
+        days = 30
+    if days not in analytics.WINDOWS:
+        days = 30
+    summary = await sync_to_async(analytics.partner_summary)(user.pk, days)
+    return await _arender(request, 'partner_dashboard.html', {'summary': summary, 'windows': analytics.WINDOWS})
@@ -1,7 +1,10 @@
 
 
+import os
 from pathlib import Path
 
+from .database import databases
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -31,7 +34,11 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, so it measures everything below it; removes itself unless PROFILING_ENABLED.
+    'destination.profiling.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    # Answers /static/ requests before sessions or auth are touched.
+    'destination.staticfiles.StaticFilesMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -46,13 +53,21 @@ TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [ BASE_DIR / 'destination/templates',],
-        'APP_DIRS': True,
         'OPTIONS': {
+            # Compile each template once per process, in development too: the
+            # autoreloader empties the cache when a template file changes.
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
             'context_processors': [
                 'django.template.context_processors.debug',
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'destination.context_processors.notifications',
             ],
         },
     },
@@ -64,12 +79,66 @@ WSGI_APPLICATION = 'toursim.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# Configured from DATABASE_URL and friends; see toursim/database.py.
+DATABASES = databases(BASE_DIR / 'db.sqlite3')
+
+# Listing reads marked with @read_from_replica go to a replica when one is configured.
+DATABASE_ROUTERS = ['destination.routers.ReplicaRouter']
+
+
+# Cache
+# Redis when REDIS_URL is set, a shared file cache when CACHE_DIR is set, and
+# per-process local memory otherwise. Invalidation (destination/caching.py)
+# only reaches every worker process with the first two.
+
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        }
     }
-}
+elif os.environ.get('CACHE_DIR'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.environ['CACHE_DIR'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'toursim',
+            'OPTIONS': {'MAX_ENTRIES': 10000},
+        }
+    }
+
+# Seconds an anonymous page stays cached if nothing invalidates it first
+PAGE_CACHE_TIMEOUT = 300
+
+
+# Request profiling (destination/profiling.py). Metrics are served at /metrics/
+# to PROFILING_METRICS_ALLOWED_IPS. A PROFILING_SAMPLE_RATE fraction of requests
+# is profiled, and those slower than PROFILING_SLOW_MS are dumped to PROFILING_DUMP_DIR.
+PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', '') == '1'
+PROFILING_SAMPLE_RATE = float(os.environ.get('PROFILING_SAMPLE_RATE', 0))
+PROFILING_SLOW_MS = 500
+PROFILING_DUMP_DIR = BASE_DIR / 'profiles'
+PROFILING_PROFILER = 'cprofile'  # or 'pyinstrument', if installed
+PROFILING_N_PLUS_ONE_THRESHOLD = 5
+PROFILING_METRICS_ALLOWED_IPS = ['127.0.0.1', '::1']
+
+# Results `manage.py benchmark` compares against (and --update-baseline writes).
+BENCHMARK_BASELINE = BASE_DIR / 'benchmarks' / 'baseline.json'
+
+
+# Sessions and request.user come from the cache (destination/auth.py); the
+# database is only read on a miss. USER_CACHE_TIMEOUT bounds how stale a
+# cached user can get if it is changed without sending post_save.
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+AUTHENTICATION_BACKENDS = ['destination.auth.CachedModelBackend']
+USER_CACHE_TIMEOUT = 300
 
 
 # Password validation
@@ -111,6 +180,17 @@ STATICFILES_DIRS = [
     BASE_DIR / 'destination/static',  # Directory where your static files (like CSS) are stored
 ]
 STATIC_ROOT = BASE_DIR / 'staticfiles'
+# collectstatic bundles, minifies, hashes and precompresses (destination/staticfiles.py).
+# Each bundle concatenates its files in order; templates link it with {% bundle %}.
+STATIC_BUNDLES = {
+    'css/site.css': ['css/styles.css'],
+    'js/site.js': ['js/scripts.js'],
+}
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'destination.staticfiles.PipelineStorage'},
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
@@ -120,3 +200,29 @@ AUTH_USER_MODEL = 'destination.User'
 
 MEDIA_URL = '/media/'  # URL to access media files
 MEDIA_ROOT = BASE_DIR / 'media'  # The directory to store uploaded files
+
+# Currency of prices, balances and totals, formatted for the active language
+# by destination/money.py (the |money template filter). BIF, USD or EUR.
+MONEY_CURRENCY = 'USD'
+
+# "Near me" queries (destination/geo.py) use an R-tree on SQLite; set GEO_BACKEND
+# to a dotted path to override. `manage.py geocode_destinations` matches
+# locations against GAZETTEER_PATH: CSV (name,latitude,longitude,alternate_names)
+# or a GeoNames dump.
+GAZETTEER_PATH = BASE_DIR / 'destination' / 'data' / 'gazetteer.csv'
+
+# Set to False to stop creating Notification rows entirely (e.g. during data migrations).
+NOTIFICATIONS_ENABLED = True
+
+# Read notifications older than this are deleted by `manage.py purge_notifications`.
+NOTIFICATION_RETENTION_DAYS = 90
+
+# Partner analytics rollups (destination/analytics.py). `manage.py compact_rollups`
+# recomputes the last ANALYTICS_RECONCILE_DAYS days and folds daily rows older
+# than ANALYTICS_DAILY_RETENTION_DAYS into monthly ones.
+ANALYTICS_DAILY_RETENTION_DAYS = 400
+ANALYTICS_RECONCILE_DAYS = 3
+
+# Background jobs (destination/queue.py). Jobs are stored in the Job table and
+# processed by `manage.py runworker`; set to True to run them in-process on commit.
+TASKS_ALWAYS_EAGER = False